@@ -4,8 +4,10 @@ ASGI config for config project.
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# Как django.core.asgi.get_asgi_application, но загрузка в /api/convert/ не пишется
+# на диск дважды (converter/asgi.py)
+from converter.asgi import get_asgi_application  # noqa: E402
+
 application = get_asgi_application()
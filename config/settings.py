@@ -113,6 +113,129 @@ MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 # Папка для временных файлов конвертации (автоочистка)
 CONVERT_TEMP_DIR = BASE_DIR / 'media' / 'convert_temp'
 
+# Кеш результатов конвертации (ключ — SHA-256 исходника + формат + версия конвертера)
+CONVERT_CACHE_ENABLED = os.environ.get('CONVERT_CACHE_ENABLED', 'True').lower() == 'true'
+CONVERT_CACHE_DIR = Path(os.environ.get('CONVERT_CACHE_DIR', BASE_DIR / 'media' / 'convert_cache'))
+CONVERT_CACHE_MAX_BYTES = int(os.environ.get('CONVERT_CACHE_MAX_MB', 2048)) * 1024 * 1024
+# Кеш ffprobe (converter.media_probe) — отдельно от результатов: не входит в их бюджет
+# и не вытесняет их; хранится не больше CONVERT_PROBE_CACHE_MAX_ENTRIES записей (LRU)
+CONVERT_PROBE_CACHE_DIR = Path(os.environ.get('CONVERT_PROBE_CACHE_DIR', BASE_DIR / 'media' / 'convert_probe'))
+CONVERT_PROBE_CACHE_MAX_ENTRIES = int(os.environ.get('CONVERT_PROBE_CACHE_MAX_ENTRIES', 20000))
+
+# Пулы процессов-конвертеров, по одному на категорию (converter.pools).
+# Размер — на хост, сколько бы ни было HTTP-воркеров: столько конвертаций категории идёт
+# одновременно (CONVERT_POOL_WORKERS_IMAGE, CONVERT_POOL_WORKERS_DOCUMENT и т.д.).
+# Слоты — flock-файлы в CONVERT_SLOTS_DIR: папка должна быть локальной для хоста
+# (не общий том нескольких серверов). Процессы пула воркера запускаются по требованию
+# и останавливаются после CONVERT_POOL_IDLE_TIMEOUT сек простоя (0 — не останавливаются)
+CONVERT_SLOTS_DIR = Path(os.environ.get('CONVERT_SLOTS_DIR', BASE_DIR / 'media' / 'convert_slots'))
+CONVERT_POOL_IDLE_TIMEOUT = int(os.environ.get('CONVERT_POOL_IDLE_TIMEOUT', 300))
+CONVERT_POOL_ENABLED = os.environ.get('CONVERT_POOL_ENABLED', 'True').lower() == 'true'
+_POOL_WORKERS_DEFAULT = max(2, (os.cpu_count() or 2) // 2)
+CONVERT_POOL_WORKERS = {
+    category: int(os.environ.get(f'CONVERT_POOL_WORKERS_{category.upper()}', _POOL_WORKERS_DEFAULT))
+    for category in ('image', 'audio', 'video', 'document', 'archive')
+}
+# Сколько задача ждёт свободный слот категории (сек); дольше — 503 «сервер перегружен»
+CONVERT_POOL_WAIT_TIMEOUT = int(os.environ.get('CONVERT_POOL_WAIT_TIMEOUT', 120))
+# Процесс пула перезапускается после стольких задач (утечки памяти в нативных библиотеках)
+CONVERT_POOL_MAX_TASKS = int(os.environ.get('CONVERT_POOL_MAX_TASKS', 100))
+
+# Потоки фоновых задач (mode=job и пакетная конвертация) — они только ждут пулы конвертеров
+CONVERT_JOB_WORKERS = int(os.environ.get('CONVERT_JOB_WORKERS', max(4, os.cpu_count() or 4)))
+
+# Потоки видеокодека (-threads): по умолчанию ядра делятся между процессами видеопула
+CONVERT_VIDEO_THREADS = int(os.environ.get(
+    'CONVERT_VIDEO_THREADS', max(1, (os.cpu_count() or 2) // CONVERT_POOL_WORKERS['video']),
+))
+
+# Параллельное кодирование по сегментам для видео длиннее порога (сек, 0 — выключено)
+CONVERT_VIDEO_PARALLEL_MIN_SECONDS = int(os.environ.get('CONVERT_VIDEO_PARALLEL_MIN_SECONDS', 120))
+CONVERT_VIDEO_SEGMENTS = int(os.environ.get(
+    'CONVERT_VIDEO_SEGMENTS', max(2, (os.cpu_count() or 2) // CONVERT_POOL_WORKERS['video']),
+))
+
+# Потоки deflate при TAR -> ZIP (zlib отпускает GIL): ядра делятся между процессами пула архивов
+CONVERT_ARCHIVE_THREADS = int(os.environ.get(
+    'CONVERT_ARCHIVE_THREADS', max(1, (os.cpu_count() or 2) // CONVERT_POOL_WORKERS['archive']),
+))
+
+# Предел размера изображения (пикселей), проверяется по заголовку до декодирования.
+# Тариф может ограничить сильнее: Plan.limits['max_image_megapixels']
+CONVERT_MAX_IMAGE_PIXELS = int(os.environ.get('CONVERT_MAX_IMAGE_MEGAPIXELS', 200)) * 1_000_000
+
+# PDF -> DOCX: документ от CONVERT_PDF_PARALLEL_MIN_PAGES страниц разбирается кусками
+# в CONVERT_PDF_PAGE_WORKERS процессах (по умолчанию ядра делятся между процессами пула документов).
+# Процессы-помощники запускаются один раз и живут вместе с процессом пула документов
+CONVERT_PDF_PAGE_WORKERS = int(os.environ.get(
+    'CONVERT_PDF_PAGE_WORKERS', max(1, (os.cpu_count() or 2) // CONVERT_POOL_WORKERS['document']),
+))
+CONVERT_PDF_PARALLEL_MIN_PAGES = int(os.environ.get('CONVERT_PDF_PARALLEL_MIN_PAGES', 16))
+
+# Папка с TTF для PDF из TXT/DOCX (ищется раньше системных). По умолчанию —
+# DejaVu Sans из fonts-dejavu-core; без TTF PDF пишется Helvetica (без кириллицы)
+CONVERT_PDF_FONT_DIR = os.environ.get('CONVERT_PDF_FONT_DIR', '')
+
+# DOCX -> PDF через LibreOffice (converter/converters/office.py): на хосте работают до
+# CONVERT_OFFICE_INSTANCES soffice, процессы пула документов всех воркеров берут их на время
+# документа. Без soffice или модуля uno (python3-uno) — собственная раскладка
+CONVERT_OFFICE_ENABLED = os.environ.get('CONVERT_OFFICE_ENABLED', 'True').lower() == 'true'
+CONVERT_OFFICE_BINARY = os.environ.get('CONVERT_OFFICE_BINARY', 'soffice')
+CONVERT_OFFICE_INSTANCES = int(os.environ.get(
+    'CONVERT_OFFICE_INSTANCES', min(2, CONVERT_POOL_WORKERS['document']),
+))
+# soffice перезапускается после стольких документов (утечки памяти) и если конвертация дольше таймаута
+CONVERT_OFFICE_MAX_JOBS = int(os.environ.get('CONVERT_OFFICE_MAX_JOBS', 50))
+CONVERT_OFFICE_TIMEOUT = int(os.environ.get('CONVERT_OFFICE_TIMEOUT', 120))
+CONVERT_OFFICE_START_TIMEOUT = int(os.environ.get('CONVERT_OFFICE_START_TIMEOUT', 60))
+
+# HTML -> PDF: ресурсы (картинки, CSS, шрифты) — data: URI и файлы из CONVERT_HTML_ASSET_DIRS
+# (пути через os.pathsep; /fonts/a.ttf ищется как <папка>/fonts/a.ttf). Сеть — только явно
+CONVERT_HTML_ALLOW_REMOTE = os.environ.get('CONVERT_HTML_ALLOW_REMOTE', 'False').lower() == 'true'
+CONVERT_HTML_ASSET_DIRS = [
+    Path(p) for p in os.environ.get('CONVERT_HTML_ASSET_DIRS', '').split(os.pathsep) if p
+]
+# Бюджет ресурсов одного документа: байт и секунд; сверх него ресурсы пропускаются
+CONVERT_HTML_RESOURCE_MAX_BYTES = int(os.environ.get('CONVERT_HTML_RESOURCE_MAX_MB', 20)) * 1024 * 1024
+CONVERT_HTML_RESOURCE_TIMEOUT = int(os.environ.get('CONVERT_HTML_RESOURCE_TIMEOUT', 10))
+# LRU-кеш декодированных/загруженных ресурсов в каждом процессе пула документов
+CONVERT_HTML_CACHE_MAX_BYTES = int(os.environ.get('CONVERT_HTML_CACHE_MAX_MB', 64)) * 1024 * 1024
+
+# Временные папки конвертаций (converter/storage.py). Задачи с оценкой объёма
+# (размер загрузки × CONVERT_TEMP_SIZE_FACTOR) до CONVERT_TEMP_RAM_MAX_MB — в CONVERT_TEMP_RAM_DIR
+# (tmpfs, по умолчанию выключено), остальные — в CONVERT_TEMP_DIR. Запрос получает 503,
+# сразу, если после него свободного места останется меньше CONVERT_TEMP_MIN_FREE_MB.
+# Незавершённые загрузки частями держат резерв на диске до объявленного размера
+CONVERT_TEMP_RAM_DIR = os.environ.get('CONVERT_TEMP_RAM_DIR', '')
+CONVERT_TEMP_RAM_MAX_BYTES = int(os.environ.get('CONVERT_TEMP_RAM_MAX_MB', 32)) * 1024 * 1024
+CONVERT_TEMP_RAM_MIN_FREE_BYTES = int(os.environ.get('CONVERT_TEMP_RAM_MIN_FREE_MB', 64)) * 1024 * 1024
+CONVERT_TEMP_MIN_FREE_BYTES = int(os.environ.get('CONVERT_TEMP_MIN_FREE_MB', 1024)) * 1024 * 1024
+CONVERT_TEMP_SIZE_FACTOR = float(os.environ.get('CONVERT_TEMP_SIZE_FACTOR', 3))
+# Уборщик брошенных папок (процесс-владелец убит): раз в CONVERT_TEMP_JANITOR_INTERVAL сек
+# (0 — только manage.py cleanup_temp). Папка без владельца моложе CONVERT_TEMP_ORPHAN_GRACE сек
+# не трогается, результат задачи ждёт скачивания CONVERT_TEMP_RESULT_TTL сек,
+# незавершённая загрузка частями — CONVERT_TEMP_MAX_AGE сек
+CONVERT_TEMP_JANITOR_INTERVAL = int(os.environ.get('CONVERT_TEMP_JANITOR_INTERVAL', 300))
+CONVERT_TEMP_ORPHAN_GRACE = int(os.environ.get('CONVERT_TEMP_ORPHAN_GRACE', 60))
+CONVERT_TEMP_RESULT_TTL = int(os.environ.get('CONVERT_TEMP_RESULT_TTL', 3600))
+CONVERT_TEMP_MAX_AGE = int(os.environ.get('CONVERT_TEMP_MAX_AGE', 86400))
+
+# Асинхронные views (converter/async_views.py) для /api/convert/, /api/detect/ и выдачи задач —
+# только под ASGI (entrypoint.sh: APP_SERVER=asgi): ffmpeg/ffprobe ожидаются без занятого воркера.
+# CONVERT_ASYNC_FFMPEG_LIMIT — сколько процессов ffmpeg одновременно на процесс сервера
+CONVERT_ASYNC_VIEWS = os.environ.get('CONVERT_ASYNC_VIEWS', 'False').lower() == 'true'
+CONVERT_ASYNC_FFMPEG_LIMIT = int(os.environ.get('CONVERT_ASYNC_FFMPEG_LIMIT', 200))
+
+# Как долго (сек) кешируется опрос ffmpeg/ffprobe и кодеков (converter.toolchain)
+TOOLCHAIN_PROBE_TTL = int(os.environ.get('TOOLCHAIN_PROBE_TTL', 300))
+
+# Возобновляемая загрузка частями: размер одной части
+CONVERT_UPLOAD_CHUNK_SIZE = int(os.environ.get('CONVERT_UPLOAD_CHUNK_SIZE_MB', 8)) * 1024 * 1024
+
+# Пакетная конвертация: максимум файлов в одном запросе
+CONVERT_BATCH_MAX_FILES = int(os.environ.get('CONVERT_BATCH_MAX_FILES', 200))
+DATA_UPLOAD_MAX_NUMBER_FILES = CONVERT_BATCH_MAX_FILES
+
 # Auth
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
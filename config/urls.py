@@ -8,10 +8,25 @@ from django.conf.urls.static import serve
 
 from converter import views
 
+# Под ASGI — асинхронные варианты: ожидание ffmpeg не занимает воркер
+if settings.CONVERT_ASYNC_VIEWS:
+    from converter import async_views as convert_views
+else:
+    convert_views = views
+
 urlpatterns = [
     path('', views.index, name='index'),
-    path('api/detect/', views.detect_format, name='detect_format'),
-    path('api/convert/', views.convert_file_view, name='convert'),
+    path('api/health/', views.health_view, name='health'),
+    path('api/detect/', convert_views.detect_format, name='detect_format'),
+    path('api/convert/', convert_views.convert_file_view, name='convert'),
+    path('api/convert/batch/', views.convert_batch_view, name='convert_batch'),
+    path('api/uploads/', views.upload_init_view, name='upload_init'),
+    path('api/uploads/<uuid:upload_id>/', views.upload_status_view, name='upload_status'),
+    path('api/uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk_view, name='upload_chunk'),
+    path('api/uploads/<uuid:upload_id>/complete/', views.upload_complete_view, name='upload_complete'),
+    path('api/jobs/<uuid:job_id>/', views.job_status_view, name='job_status'),
+    path('api/jobs/<uuid:job_id>/download/', convert_views.job_download_view, name='job_download'),
+    path('api/jobs/<uuid:job_id>/cancel/', views.job_cancel_view, name='job_cancel'),
     path('', include('accounts.urls')),
     path('', include('plans.urls')),
 ]
@@ -0,0 +1,108 @@
+"""
+ASGI-приложение, которое отдаёт тело загрузки конвертеру потоком.
+Стандартный ASGIHandler сначала читает всё тело запроса во временный файл
+(SpooledTemporaryFile) и только потом создаёт запрос — под ASGI загрузка попадала
+на диск дважды. Для views с пометкой stream_upload_body тело читается по мере разбора
+multipart: ConvertUploadHandler пишет файл сразу в папку конвертации, как под WSGI.
+Разбор идёт в потоке (async_views._parse_upload), куски тела ждутся в цикле событий.
+Рассчитано на ASGIHandler Django 4.2: он не читает receive параллельно с view.
+"""
+
+import asyncio
+import contextvars
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import Resolver404, resolve
+
+# scope текущего запроса: read_body получает только receive
+_scope = contextvars.ContextVar('converter_asgi_scope', default=None)
+
+
+class ASGIBodyReader:
+    """
+    Файлоподобное тело запроса поверх ASGI receive. read() вызывается из потока разбора
+    загрузки и ждёт следующее сообщение http.request в цикле событий.
+    Обрыв соединения — OSError, как у wsgi.input (HttpRequest.read -> UnreadablePostError).
+    """
+
+    def __init__(self, receive, loop: asyncio.AbstractEventLoop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = bytearray()
+        self.finished = False
+
+    def _receive_more(self) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            # Ожидание из самого цикла событий заблокировало бы его навсегда
+            raise RuntimeError('Тело запроса читается потоком — только вне цикла событий')
+        message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+        if message['type'] == 'http.disconnect':
+            self.finished = True
+            raise OSError('Клиент разорвал соединение во время загрузки')
+        self.buffer += message.get('body', b'')
+        if not message.get('more_body', False):
+            self.finished = True
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            self._receive_more()
+        if size < 0 or size >= len(self.buffer):
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        else:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        # HttpRequest.__iter__ (дочитывание тела после разбора multipart)
+        while not self.finished and b'\n' not in self.buffer and (size < 0 or len(self.buffer) < size):
+            self._receive_more()
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        return self.read(end if size < 0 else min(end, size))
+
+    def close(self) -> None:
+        self.buffer.clear()
+
+
+def _streams_body(scope) -> bool:
+    """Отдаётся ли тело запроса view потоком (пометка stream_upload_body)."""
+    if scope.get('method', '').upper() != 'POST':
+        return False
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return False
+    return getattr(match.func, 'stream_upload_body', False)
+
+
+class StreamingUploadASGIHandler(ASGIHandler):
+    """ASGIHandler, который не читает тело заранее для views с stream_upload_body."""
+
+    async def handle(self, scope, receive, send):
+        token = _scope.set(scope)
+        try:
+            await super().handle(scope, receive, send)
+        finally:
+            _scope.reset(token)
+
+    async def read_body(self, receive):
+        scope = _scope.get()
+        if scope is not None and _streams_body(scope):
+            return ASGIBodyReader(receive, asyncio.get_running_loop())
+        return await super().read_body(receive)
+
+
+def get_asgi_application() -> StreamingUploadASGIHandler:
+    """Как django.core.asgi.get_asgi_application, но с потоковым телом загрузок."""
+    django.setup(set_prefix=False)
+    return StreamingUploadASGIHandler()
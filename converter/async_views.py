@@ -0,0 +1,161 @@
+"""
+Асинхронные views для ASGI (CONVERT_ASYNC_VIEWS): конвертация, определение формата
+и выдача результата задачи. Пока ffmpeg/ffprobe кодируют, воркер не занят: процессы
+ожидаются через asyncio, Pillow и документы — в пулах процессов (asyncio.wrap_future),
+файловые операции и запросы к БД — в потоках. Проверки и ответы — те же, что в views.
+Тело загрузки convert_file_view (stream_upload_body) не читается заранее во временный файл:
+converter.asgi отдаёт его разбору multipart по мере прихода, и ConvertUploadHandler пишет
+файл на диск один раз — прямо в папку конвертации, как под WSGI.
+"""
+
+import asyncio
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware, get_token
+
+from converter import jobs, storage, views
+from converter.cache import aconvert_cached
+from converter.converters.base import ConversionBusy, ConversionError
+from converter.formats import get_extension, strip_extension
+from converter.responses import AsyncTempDirFileResponse
+from converter.uploads import ConvertUploadHandler
+
+# Декораторы csrf_protect/require_POST в Django 4.2 не умеют async-views: CSRF проверяется
+# этим экземпляром middleware после подмены обработчика загрузки
+_csrf = CsrfViewMiddleware(lambda request: None)
+
+
+async def detect_format(request: HttpRequest) -> HttpResponse:
+    """Асинхронный views.detect_format (с той же выдачей CSRF-cookie)."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    get_token(request)  # как ensure_csrf_cookie: cookie выставит CsrfViewMiddleware
+    return views._detect_response(request)
+
+
+async def convert_file_view(request: HttpRequest) -> HttpResponse:
+    """Асинхронный views.convert_file_view: те же поля, проверки и ответы."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    error_response = await asyncio.to_thread(views._storage_error, views._content_length(request))
+    if error_response is not None:
+        return error_response
+    handler = ConvertUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    try:
+        return await _convert_file_view(request)
+    finally:
+        handler.discard_unclaimed()
+
+
+convert_file_view.csrf_exempt = True
+# Тело запроса — потоком из converter.asgi, разбор — в _parse_upload (в потоке)
+convert_file_view.stream_upload_body = True
+
+
+async def job_download_view(request: HttpRequest, job_id) -> HttpResponse:
+    """Асинхронный views.job_download_view: файл отдаётся без чтения в память целиком."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return await sync_to_async(views._job_download)(request, job_id, AsyncTempDirFileResponse)
+
+
+def _parse_upload(request: HttpRequest) -> HttpResponse | None:
+    """
+    Разбор multipart (файл пишет на диск ConvertUploadHandler) и проверка CSRF; ответ — отказ.
+    Тело читается из converter.asgi.ASGIBodyReader: только в потоке, не в цикле событий.
+    """
+    rejected = _csrf.process_view(request, None, (), {})
+    request.FILES
+    return rejected
+
+
+async def _video_limits_error(request: HttpRequest, source_path, source_ext: str, size: int, source_hash):
+    from plans.utils import aget_video_duration_seconds
+
+    if not views._is_category(source_ext, 'video'):
+        return None
+    duration = await aget_video_duration_seconds(str(source_path), source_hash)
+    return await sync_to_async(views._duration_error)(request, size, duration)
+
+
+async def _image_pixels_error(request: HttpRequest, source_path, source_ext: str) -> str | None:
+    from plans.utils import get_image_pixels
+
+    if not views._is_category(source_ext, 'image'):
+        return None
+    pixels = await asyncio.to_thread(get_image_pixels, str(source_path))
+    return await sync_to_async(views._pixels_error)(request, pixels)
+
+
+async def _convert_file_view(request: HttpRequest) -> HttpResponse:
+    # Разбор тела блокирующий — в отдельном потоке, не в общем потоке запросов к БД
+    rejected = await sync_to_async(_parse_upload, thread_sensitive=False)(request)
+    if rejected is not None:
+        return rejected
+    if 'file' not in request.FILES:
+        return JsonResponse({'error': 'Файл не загружен'}, status=400)
+
+    from plans.utils import increment_conversion_count
+
+    uploaded = request.FILES['file']
+    target_ext = request.POST.get('target', '').strip().lower()
+    source_ext = get_extension(uploaded.name)
+    source_hash = getattr(uploaded, 'sha256', None)
+
+    temp_dir, source_path = await asyncio.to_thread(views._place_upload, uploaded)
+    job_mode = request.POST.get('mode', '').strip().lower() == 'job'
+    keep_temp = False
+
+    try:
+        error_response = await sync_to_async(views._request_error)(request, uploaded.size, source_ext, target_ext)
+        if error_response is not None:
+            return error_response
+        params = await sync_to_async(views._conversion_params)(request, source_ext)
+
+        error_response = await _video_limits_error(request, source_path, source_ext, uploaded.size, source_hash)
+        if error_response is not None:
+            return error_response
+        err_msg = await _image_pixels_error(request, source_path, source_ext)
+        if err_msg:
+            return JsonResponse({'error': err_msg, 'limit_exceeded': True}, status=400)
+
+        if job_mode:
+            job_id = await sync_to_async(jobs.submit_job)(
+                temp_dir, str(source_path), source_ext, target_ext,
+                source_hash=source_hash, params=params,
+            )
+            keep_temp = True
+            return views._job_accepted(job_id)
+
+        result_path = await aconvert_cached(
+            str(source_path), source_ext, target_ext, temp_dir,
+            source_hash=source_hash, params=params,
+        )
+        if not result_path or not await asyncio.to_thread(Path(result_path).exists):
+            raise ConversionError('Результирующий файл не создан')
+
+        await sync_to_async(increment_conversion_count)(request)
+
+        response = AsyncTempDirFileResponse(
+            open(result_path, 'rb'),
+            as_attachment=True,
+            filename=strip_extension(source_path) + '.' + target_ext,
+            content_type='application/octet-stream',
+            cleanup_dir=temp_dir,
+        )
+        keep_temp = True
+        return response
+
+    except ConversionBusy as e:
+        return views._busy_response(e)
+    except ConversionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Ошибка сервера: {e}'}, status=500)
+    finally:
+        uploaded.close()
+        if not keep_temp:
+            storage.remove(temp_dir)
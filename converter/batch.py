@@ -0,0 +1,121 @@
+"""
+Пакетная конвертация: файлы конвертируются параллельно (пул задач -> пулы конвертеров),
+результаты отдаются одним ZIP-потоком по мере готовности.
+В конец архива пишется manifest.json со статусом каждого файла.
+"""
+
+import json
+import zipfile
+from concurrent.futures import as_completed
+from pathlib import Path
+
+from converter import jobs, storage
+from converter.converters.base import ConversionError
+from converter.formats import split_extension, strip_extension
+
+COPY_CHUNK_SIZE = 256 * 1024
+MANIFEST_NAME = 'manifest.json'
+
+
+class _ZipStream:
+    """Неперематываемый приёмник для ZipFile: копит байты до следующего yield."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _convert_one(source_path: str, source_ext: str, target_ext: str, output_dir: str,
+                 source_hash: str | None, params: dict | None = None) -> str:
+    """Выполняется в потоке пула задач."""
+    from converter.cache import convert_cached
+
+    result_path = convert_cached(
+        source_path, source_ext, target_ext, Path(output_dir), source_hash=source_hash, params=params,
+    )
+    if not result_path or not Path(result_path).exists():
+        raise ConversionError('Результирующий файл не создан')
+    return result_path
+
+
+def _unique_name(name: str, used: set) -> str:
+    stem, ext = split_extension(name)
+    suffix = f'.{ext}' if ext else ''
+    candidate, n = name, 2
+    while candidate in used:
+        candidate = f'{stem} ({n}){suffix}'
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def stream_batch_zip(items: list[dict]):
+    """
+    Генератор ZIP-архива с результатами.
+    items: dict с ключами name, source_path, source_ext, target, temp_dir, source_hash, params
+    и необязательным error (файл отклонён ещё при проверке).
+    Временные папки удаляются, когда поток дочитан или клиент отключился.
+    """
+    stream = _ZipStream()
+    # Результаты — в основном уже сжатые форматы (jpg, mp4, docx), поэтому STORED
+    zf = zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED)
+    manifest = []
+    used_names = {MANIFEST_NAME}
+    futures = {}
+
+    try:
+        for item in items:
+            if item.get('error'):
+                manifest.append({'file': item['name'], 'target': item['target'],
+                                 'status': 'error', 'error': item['error']})
+                continue
+            future = jobs.submit(
+                _convert_one, str(item['source_path']), item['source_ext'],
+                item['target'], str(item['temp_dir']), item.get('source_hash'), item.get('params'),
+            )
+            futures[future] = item
+
+        for future in as_completed(futures):
+            item = futures[future]
+            entry = {'file': item['name'], 'target': item['target']}
+            try:
+                result_path = Path(future.result())
+            except ConversionError as e:
+                manifest.append({**entry, 'status': 'error', 'error': str(e)})
+                continue
+            except Exception as e:
+                manifest.append({**entry, 'status': 'error', 'error': f'Ошибка сервера: {e}'})
+                continue
+
+            arcname = _unique_name(f'{strip_extension(item["name"])}.{item["target"]}', used_names)
+            zinfo = zipfile.ZipInfo.from_file(result_path, arcname)
+            with open(result_path, 'rb') as src, zf.open(zinfo, 'w') as dst:
+                for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                    dst.write(chunk)
+                    data = stream.drain()
+                    if data:
+                        yield data
+            manifest.append({**entry, 'status': 'ok', 'output': arcname})
+            # Результат уже в архиве — папку можно освободить сразу
+            storage.remove(item['temp_dir'])
+
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+        zf.close()
+        yield stream.drain()
+    finally:
+        for future in futures:
+            future.cancel()
+        for item in items:
+            if item.get('temp_dir'):
+                storage.remove(item['temp_dir'])
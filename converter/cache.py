@@ -0,0 +1,413 @@
+"""
+Кеш результатов конвертации на диске.
+Ключ — (SHA-256 исходника, исходный и целевой формат, версия конвертера, параметры).
+Размер ограничен CONVERT_CACHE_MAX_BYTES, вытеснение — LRU по mtime. Текущий размер
+ведётся в stats.json (size_bytes): кеш сканируется, только когда он превысил бюджет,
+и раз в EVICT_SCAN_INTERVAL — сверить счётчик с диском.
+Одинаковые одновременные запросы ждут одну конвертацию (блокировка по ключу: свой файл
+на ключ, владелец удаляет его при освобождении; разные ключи друг друга не ждут).
+aconvert_cached — то же для асинхронных views; ждущий опрашивает блокировку, не занимая поток.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки только внутри процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Как часто асинхронный запрос проверяет, не освободилась ли блокировка ключа (сек)
+LOCK_POLL_INTERVAL = 0.05
+# Как часто размер кеша пересчитывается по диску (сек): записи, удалённые или
+# оставленные упавшим процессом мимо счётчика
+EVICT_SCAN_INTERVAL = 600
+
+_local_locks = {}  # имя -> [threading.Lock, число владельцев и ждущих]
+_local_locks_guard = threading.Lock()
+
+
+def _cache_dir() -> Path:
+    p = Path(settings.CONVERT_CACHE_DIR)
+    (p / 'locks').mkdir(parents=True, exist_ok=True)
+    return p
+
+
+def file_sha256(path) -> str:
+    """SHA-256 файла (если хеш не посчитан при загрузке)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(source_hash: str, source_key: str, target_key: str, version, params: dict | None = None) -> str:
+    # Исходный формат обязателен: одни и те же байты как .txt и как .html дают разный PDF
+    raw = json.dumps([source_hash, source_key, target_key, version, params or {}], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _key_lock(key: str) -> str:
+    """Имя блокировки ключа: свой файл на ключ, удаляется при освобождении."""
+    return f'key-{key}'
+
+
+def _forget_local(name: str, holder: list) -> None:
+    with _local_locks_guard:
+        holder[1] -= 1
+        if not holder[1]:
+            _local_locks.pop(name, None)
+
+
+def _try_local(name: str, blocking: bool):
+    with _local_locks_guard:
+        holder = _local_locks.setdefault(name, [threading.Lock(), 0])
+        holder[1] += 1
+    if not holder[0].acquire(blocking=blocking):
+        _forget_local(name, holder)
+        return None
+
+    def release():
+        holder[0].release()
+        _forget_local(name, holder)
+    return release
+
+
+def _try_flock(name: str, blocking: bool, remove: bool):
+    path = _cache_dir() / 'locks' / f'{name}.lock'
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, flags)
+            # Пока ждали, прежний владелец мог удалить файл: блокировка удалённого
+            # файла ничего не защищает, берём заново на новом
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            held = os.fstat(fd)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except BaseException:
+            os.close(fd)
+            raise
+        if current is not None and (current.st_dev, current.st_ino) == (held.st_dev, held.st_ino):
+            break
+        os.close(fd)
+
+    def release():
+        try:
+            if remove:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+        finally:
+            os.close(fd)  # блокировка снимается вместе с дескриптором
+    return release
+
+
+def _try_acquire(name: str, blocking: bool = False, remove: bool = False):
+    """
+    Межпроцессная блокировка (flock) по имени; без fcntl — только потоковая.
+    remove — удалить файл блокировки при освобождении (блокировки ключей).
+    Возвращает функцию освобождения (её можно вызвать из другого потока) или None,
+    если блокировка занята и blocking=False.
+    """
+    if fcntl is None:
+        return _try_local(name, blocking)
+    return _try_flock(name, blocking, remove)
+
+
+def _acquire(name: str, remove: bool = False):
+    return _try_acquire(name, blocking=True, remove=remove)
+
+
+def _release_later(future) -> None:
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result()()
+
+
+async def _aacquire(name: str, remove: bool = False):
+    """
+    _acquire без блокировки цикла событий: опрос без ожидания, поток занимается
+    только на одну попытку. Ждущие не держат потоки executor'а, нужные владельцу.
+    """
+    while True:
+        attempt = asyncio.ensure_future(asyncio.to_thread(_try_acquire, name, False, remove))
+        try:
+            release = await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            # Запрос отменён, а попытка могла взять блокировку — освобождаем её сразу
+            attempt.add_done_callback(_release_later)
+            raise
+        if release is not None:
+            return release
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+
+@contextlib.contextmanager
+def _locked(name: str, remove: bool = False):
+    release = _acquire(name, remove)
+    try:
+        yield
+    finally:
+        release()
+
+
+def _entry_path(key: str, target_key: str) -> Path:
+    return _cache_dir() / key[:2] / f'{key}.{target_key}'
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _read_stats() -> dict:
+    try:
+        with open(_cache_dir() / 'stats.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_stats(values: dict | None = None, **deltas) -> dict:
+    """
+    Прибавляет deltas к счётчикам stats.json, values записывает как есть.
+    Возвращает статистику после изменения.
+    """
+    with _locked('stats'):
+        path = _cache_dir() / 'stats.json'
+        stats = _read_stats()
+        for name, value in deltas.items():
+            stats[name] = stats.get(name, 0) + value
+        stats.update(values or {})
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, path)
+    return stats
+
+
+def _iter_entries():
+    for sub in _cache_dir().iterdir():
+        if not sub.is_dir() or sub.name == 'locks':
+            continue
+        for entry in os.scandir(sub):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                yield entry
+
+
+def _evict() -> None:
+    """
+    Удаляет самые давно использованные записи, пока кеш не влезет в бюджет, и
+    записывает размер кеша по диску. Уже вытесняет другой запрос — ничего не делает.
+    """
+    budget = settings.CONVERT_CACHE_MAX_BYTES
+    release = _try_acquire('evict')
+    if release is None:
+        return
+    try:
+        entries = []
+        for e in _iter_entries():
+            with contextlib.suppress(FileNotFoundError):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        evicted = evicted_bytes = 0
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+                evicted += 1
+                evicted_bytes += size
+            total -= size
+        # Записи, сохранённые во время сканирования, попадут в счётчик при следующем
+        _update_stats(
+            {'size_bytes': total, 'scanned_at': time.time()},
+            evictions=evicted, evicted_bytes=evicted_bytes,
+        )
+    finally:
+        release()
+    if evicted:
+        logger.info('convert cache: evicted %d entries (%d bytes)', evicted, evicted_bytes)
+
+
+def _hit(entry: Path, out_path: Path) -> str:
+    os.utime(entry)  # LRU: отмечаем использование
+    _link_or_copy(entry, out_path)
+    size = out_path.stat().st_size
+    logger.info('convert cache: hit %s (%d bytes)', entry.name, size)
+    _update_stats(hits=1, bytes_saved=size)
+    return str(out_path)
+
+
+def _try_hit(entry: Path, out_path: Path) -> str | None:
+    if entry.exists():
+        with contextlib.suppress(FileNotFoundError):
+            return _hit(entry, out_path)
+    return None
+
+
+def _store(result_path, entry: Path) -> int:
+    """Сохраняет результат в кеш; возвращает, на сколько байт вырос кеш."""
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp_entry = entry.with_name(f'{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    _link_or_copy(Path(result_path), tmp_entry)
+    added = tmp_entry.stat().st_size
+    with contextlib.suppress(FileNotFoundError):
+        added -= entry.stat().st_size  # запись заменяется
+    os.replace(tmp_entry, entry)
+    return added
+
+
+def _after_miss(added: int) -> None:
+    stats = _update_stats(misses=1, size_bytes=added)
+    overflow = stats['size_bytes'] > settings.CONVERT_CACHE_MAX_BYTES
+    if overflow or time.time() - stats.get('scanned_at', 0) > EVICT_SCAN_INTERVAL:
+        _evict()
+
+
+def _plan(source_path, source_ext: str, target_ext: str, output_dir, source_hash, params, job_dir):
+    """
+    (options конвертера, (ключ, запись кеша, путь результата)) или (options, None),
+    если результат не кешируется.
+    """
+    from converter.converters import CONVERTER_VERSIONS
+    from converter.formats import get_category, normalize_format, strip_extension
+
+    options = {'source_hash': source_hash, 'job_dir': job_dir, **(params or {})}
+    if not settings.CONVERT_CACHE_ENABLED:
+        return options, None
+
+    source_key = normalize_format(source_ext)
+    target_key = normalize_format(target_ext)
+    category = get_category(source_key) if source_key else None
+    if not target_key or category not in CONVERTER_VERSIONS:
+        return options, None
+
+    source_hash = source_hash or file_sha256(source_path)
+    options['source_hash'] = source_hash
+    key = make_key(source_hash, source_key, target_key, CONVERTER_VERSIONS[category], params)
+    out_path = Path(output_dir) / f'{strip_extension(source_path)}.{target_key}'
+    return options, (key, _entry_path(key, target_key), out_path)
+
+
+def convert_cached(
+    source_path,
+    source_ext: str,
+    target_ext: str,
+    output_dir,
+    source_hash: str | None = None,
+    params: dict | None = None,
+    job_dir: str | None = None,
+) -> str:
+    """
+    Обёртка над convert_file с кешем результатов.
+    params — параметры, влияющие на результат: входят в ключ и передаются конвертеру.
+    job_dir — папка фоновой задачи (прогресс и отмена), в ключ не входит.
+    При попадании Pillow/ffmpeg/pdf2docx не вызываются вовсе.
+    """
+    from converter.converters import convert_file
+
+    options, cached = _plan(source_path, source_ext, target_ext, output_dir, source_hash, params, job_dir)
+    if cached is None:
+        return convert_file(source_path, source_ext, target_ext, output_dir, options=options)
+    key, entry, out_path = cached
+
+    hit = _try_hit(entry, out_path)
+    if hit is not None:
+        return hit
+
+    with _locked(_key_lock(key), remove=True):
+        # Пока ждали блокировку, ту же конвертацию мог выполнить другой запрос
+        hit = _try_hit(entry, out_path)
+        if hit is not None:
+            return hit
+        result_path = convert_file(source_path, source_ext, target_ext, output_dir, options=options)
+        added = _store(result_path, entry)
+
+    _after_miss(added)
+    return result_path
+
+
+async def aconvert_cached(
+    source_path,
+    source_ext: str,
+    target_ext: str,
+    output_dir,
+    source_hash: str | None = None,
+    params: dict | None = None,
+    job_dir: str | None = None,
+) -> str:
+    """
+    convert_cached для асинхронного кода: конвертация — aconvert_file, работа с диском
+    кеша и ожидание блокировки ключа — в потоках.
+    """
+    from converter.converters import aconvert_file
+
+    options, cached = await asyncio.to_thread(
+        _plan, source_path, source_ext, target_ext, output_dir, source_hash, params, job_dir,
+    )
+    if cached is None:
+        return await aconvert_file(source_path, source_ext, target_ext, output_dir, options=options)
+    key, entry, out_path = cached
+
+    hit = await asyncio.to_thread(_try_hit, entry, out_path)
+    if hit is not None:
+        return hit
+
+    release = await _aacquire(_key_lock(key), remove=True)
+    try:
+        hit = await asyncio.to_thread(_try_hit, entry, out_path)
+        if hit is not None:
+            return hit
+        result_path = await aconvert_file(source_path, source_ext, target_ext, output_dir, options=options)
+        added = await asyncio.to_thread(_store, result_path, entry)
+    finally:
+        release()
+
+    await asyncio.to_thread(_after_miss, added)
+    return result_path
+
+
+def get_stats() -> dict:
+    """Статистика кеша: попадания, промахи, сэкономленные байты, вытеснения."""
+    stats = _read_stats()
+    hits = stats.get('hits', 0)
+    misses = stats.get('misses', 0)
+    entries = list(_iter_entries())
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'bytes_saved': stats.get('bytes_saved', 0),
+        'evictions': stats.get('evictions', 0),
+        'evicted_bytes': stats.get('evicted_bytes', 0),
+        'entries': len(entries),
+        'size_bytes': sum(e.stat().st_size for e in entries),
+        'max_bytes': settings.CONVERT_CACHE_MAX_BYTES,
+    }
+
+
+def clear() -> None:
+    """Полностью очищает кеш (вместе со статистикой)."""
+    shutil.rmtree(settings.CONVERT_CACHE_DIR, ignore_errors=True)
@@ -1,29 +1,146 @@
 """
 Модули конвертации по категориям.
+convert_file выполняет конвертацию в пуле процессов категории (converter.pools).
+Модуль категории (а с ним Pillow, pdf2docx/PyMuPDF, reportlab, xhtml2pdf) импортируется
+при первой конвертации этой категории — в процессе пула, а не в каждом воркере gunicorn.
+aconvert_file — то же для асинхронных views.
 """
 
+import asyncio
+import importlib
+from types import ModuleType
+
 from .base import ConversionError
-from .images import convert_image
-from .audio import convert_audio
-from .video import convert_video
-from .documents import convert_document
-from .archives import convert_archive
 
+# Категория -> (модуль, функция конвертации)
 CONVERTERS = {
-    'image': convert_image,
-    'audio': convert_audio,
-    'video': convert_video,
-    'document': convert_document,
-    'archive': convert_archive,
+    'image': ('converter.converters.images', 'convert_image'),
+    'audio': ('converter.converters.audio', 'convert_audio'),
+    'video': ('converter.converters.video', 'convert_video'),
+    'document': ('converter.converters.documents', 'convert_document'),
+    'archive': ('converter.converters.archives', 'convert_archive'),
+}
+
+# Категории с асинхронной функцией конвертации (в том же модуле): работа — во внешнем
+# процессе ffmpeg, его и ждёт цикл событий; пул процессов для них не нужен
+ASYNC_CONVERTERS = {
+    'audio': 'aconvert_audio',
+    'video': 'aconvert_video',
+}
+
+# Без чего категория не работает вовсе (достаточно одного): флаг из
+# toolchain.PYTHON_BACKENDS или 'ffmpeg'; пусто — только стандартная библиотека
+CATEGORY_REQUIREMENTS = {
+    'image': ('PILLOW_AVAILABLE',),
+    'audio': ('ffmpeg',),
+    'video': ('ffmpeg',),
+    'document': ('PDF2DOCX_AVAILABLE', 'DOCX_AVAILABLE', 'REPORTLAB_AVAILABLE', 'XHTML2PDF_AVAILABLE'),
+    'archive': (),
+}
+
+# Версии конвертеров входят в ключ кеша результатов (converter.cache):
+# при изменении логики/параметров категории увеличьте её версию.
+CONVERTER_VERSIONS = {
+    'image': 3,
+    'audio': 3,
+    'video': 4,
+    'document': 7,
+    'archive': 5,
 }
 
 
-def convert_file(source_path, source_ext: str, target_ext: str, output_dir) -> str:
+def load_module(category: str) -> ModuleType:
+    """Модуль конвертера категории; импортируется при первом обращении."""
+    return importlib.import_module(CONVERTERS[category][0])
+
+
+def get_converter(category: str):
+    return getattr(load_module(category), CONVERTERS[category][1])
+
+
+def is_available(category: str) -> bool:
+    """
+    Есть ли чем конвертировать категорию — по кешу toolchain, без импорта самих библиотек.
+    Устаревший кеш запускает `ffmpeg -version`: из асинхронного кода — через asyncio.to_thread.
+    """
+    from converter import toolchain
+
+    requirements = CATEGORY_REQUIREMENTS.get(category)
+    if requirements is None:
+        return False
+    if not requirements:
+        return True
+    tools = toolchain.get_toolchain()
+    found = {**tools['backends'], 'ffmpeg': tools['ffmpeg']['available']}
+    return any(found.get(name) for name in requirements)
+
+
+def convert_file(source_path, source_ext: str, target_ext: str, output_dir, options: dict | None = None) -> str:
     """
     Выбирает подходящий конвертер и выполняет конвертацию.
+    options — параметры запроса (source_hash и др.), передаются конвертеру как есть.
+    При CONVERT_POOL_ENABLED конвертация уходит в пул процессов категории.
     Возвращает путь к результирующему файлу.
     """
+    from django.conf import settings
+
+    from converter import pools
     from converter.formats import get_category, normalize_format
+    from converter.progress import get_progress
+
+    if settings.CONVERT_POOL_ENABLED and not pools.in_pool_worker():
+        category = get_category(normalize_format(source_ext) or '')
+        if category in CONVERTERS:
+            return pools.run_in_pool(
+                category, convert_file_local, str(source_path), source_ext, target_ext,
+                str(output_dir), options, progress=get_progress(options),
+            )
+    return convert_file_local(source_path, source_ext, target_ext, output_dir, options)
+
+
+async def aconvert_file(source_path, source_ext: str, target_ext: str, output_dir, options: dict | None = None) -> str:
+    """
+    convert_file для асинхронного кода: цикл событий не блокируется.
+    Аудио и видео — ffmpeg через asyncio, но в тех же слотах хоста, что и пул категории;
+    остальное (Pillow, документы, архивы) — в пуле процессов категории или, при
+    выключенных пулах, в потоке.
+    """
+    from pathlib import Path
+
+    from django.conf import settings
+
+    from converter import pools
+    from converter.formats import get_category, normalize_format
+    from converter.progress import get_progress
+
+    category = get_category(normalize_format(source_ext) or '')
+    progress = get_progress(options)
+    if category in ASYNC_CONVERTERS and normalize_format(target_ext):
+        converter_fn = getattr(load_module(category), ASYNC_CONVERTERS[category])
+        # ffmpeg запускается из цикла событий, а не в пуле, — лимит хоста тот же
+        release = await pools.aacquire_slot(category, progress)
+        try:
+            return await converter_fn(
+                str(source_path), normalize_format(source_ext), normalize_format(target_ext),
+                Path(output_dir), options=options,
+            )
+        finally:
+            release()
+    if settings.CONVERT_POOL_ENABLED and category in CONVERTERS:
+        return await pools.arun_in_pool(
+            category, convert_file_local, str(source_path), source_ext, target_ext,
+            str(output_dir), options, progress=progress,
+        )
+    return await asyncio.to_thread(convert_file_local, source_path, source_ext, target_ext, output_dir, options)
+
+
+def convert_file_local(source_path, source_ext: str, target_ext: str, output_dir, options: dict | None = None) -> str:
+    """Конвертация в текущем процессе (в процессе пула или при выключенных пулах)."""
+    from pathlib import Path
+
+    from converter.formats import get_category, normalize_format
+
+    output_dir = Path(output_dir)
 
     source_key = normalize_format(source_ext)
     target_key = normalize_format(target_ext)
@@ -34,5 +151,5 @@ def convert_file(source_path, source_ext: str, target_ext: str, output_dir) -> s
     if not category or category not in CONVERTERS:
         raise ConversionError(f'Конвертация из {source_ext} не поддерживается')
 
-    converter_fn = CONVERTERS[category]
-    return converter_fn(source_path, source_key, target_key, output_dir)
+    converter_fn = get_converter(category)
+    return converter_fn(source_path, source_key, target_key, output_dir, options=options)
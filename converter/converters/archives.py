@@ -1,52 +1,191 @@
 """
-Конвертация архивов: ZIP <-> TAR.
+Конвертация архивов: ZIP <-> TAR (tar, tar.gz, tar.xz, tar.zst) и между вариантами TAR.
+Элементы копируются потоком через буфер фиксированного размера — память не зависит
+ни от размера элементов, ни от их количества. Сохраняются mtime, права и каталоги.
+ZIP -> TAR только распаковывает; TAR -> ZIP не сжимает повторно уже сжатые элементы
+(политика в compression.py), остальные сжимает параллельно. Сжатые TAR пишутся
+блочно-параллельно в CONVERT_ARCHIVE_THREADS потоков.
 """
 
-import io
+import contextlib
+import stat
 import tarfile
+import time
 import zipfile
 from pathlib import Path
 
+from django.conf import settings
+
+from converter.formats import strip_extension
+
 from .base import ConversionError
+from .compression import (
+    SAMPLE_SIZE, ParallelZipWriter, is_incompressible, open_reader, open_writer,
+)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+ZIP_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Формат TAR -> сжатие потока
+TAR_CODECS = {
+    'tar': None,
+    'tar.gz': 'gz',
+    'tar.xz': 'xz',
+    'tar.zst': 'zst',
+}
 
 
-def convert_archive(source_path: str, source_fmt: str, target_fmt: str, output_dir: Path) -> str:
+def convert_archive(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
     """
-    ZIP -> TAR или TAR -> ZIP.
+    ZIP -> TAR*, TAR* -> ZIP или TAR* -> TAR* (смена сжатия).
     """
-    base = Path(source_path).stem
+    base = strip_extension(source_path)
     out_path = output_dir / f'{base}.{target_fmt}'
 
-    if source_fmt == 'zip' and target_fmt == 'tar':
-        return _zip_to_tar(source_path, str(out_path))
-    if source_fmt == 'tar' and target_fmt == 'zip':
-        return _tar_to_zip(source_path, str(out_path))
+    if source_fmt == 'zip' and target_fmt in TAR_CODECS:
+        return _zip_to_tar(source_path, str(out_path), target_fmt)
+    if source_fmt in TAR_CODECS and target_fmt == 'zip':
+        return _tar_to_zip(source_path, str(out_path), source_fmt)
+    if source_fmt in TAR_CODECS and target_fmt in TAR_CODECS and source_fmt != target_fmt:
+        return _tar_to_tar(source_path, str(out_path), source_fmt, target_fmt)
 
     raise ConversionError(f'Конвертация {source_fmt} -> {target_fmt} не поддерживается')
 
 
-def _zip_to_tar(zip_path: str, tar_path: str) -> str:
+@contextlib.contextmanager
+def _open_tar_read(tar_path: str, tar_fmt: str):
+    """
+    TAR в потоковом режиме (r|): без перемотки и без getmembers().
+    Для plain tar — r|*, как и раньше: сжатие распознаётся по содержимому.
+    """
+    codec = TAR_CODECS[tar_fmt]
+    if codec is None:
+        with tarfile.open(tar_path, 'r|*') as tf:
+            yield tf
+        return
+    with open(tar_path, 'rb') as raw, open_reader(raw, codec) as src, \
+            tarfile.open(fileobj=src, mode='r|') as tf:
+        yield tf
+
+
+@contextlib.contextmanager
+def _open_tar_write(tar_path: str, tar_fmt: str):
+    with open(tar_path, 'wb') as raw, \
+            open_writer(raw, TAR_CODECS[tar_fmt], settings.CONVERT_ARCHIVE_THREADS) as dst, \
+            tarfile.open(fileobj=dst, mode='w', format=tarfile.PAX_FORMAT, copybufsize=COPY_BUFFER_SIZE) as tf:
+        yield tf
+
+
+def _iter_members(tf: tarfile.TarFile):
+    """Элементы потокового TAR; tf.members сбрасывается — иначе TarFile копит их все."""
+    while True:
+        member = tf.next()
+        if member is None:
+            return
+        tf.members = []
+        yield member
+
+
+def _zip_mtime(info: zipfile.ZipInfo) -> float:
+    try:
+        return time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0.0
+
+
+def _zip_date_time(mtime: float) -> tuple:
+    """ZIP хранит локальное время с 1980 года."""
+    return max(time.localtime(mtime)[:6], ZIP_MIN_DATE_TIME)
+
+
+def _zip_to_tar(zip_path: str, tar_path: str, tar_fmt: str = 'tar') -> str:
+    """
+    Элементы копируются потоком через буфер COPY_BUFFER_SIZE.
+    Список элементов ZIP — это центральный каталог, который ZipFile читает при открытии;
+    лишних копий (namelist) не строим.
+    """
     try:
         with zipfile.ZipFile(zip_path, 'r') as zf:
-            with tarfile.open(tar_path, 'w') as tf:
-                for name in zf.namelist():
-                    data = zf.read(name)
-                    ti = tarfile.TarInfo(name=name)
-                    ti.size = len(data)
-                    tf.addfile(ti, io.BytesIO(data))
+            with _open_tar_write(tar_path, tar_fmt) as tf:
+                for info in zf.infolist():
+                    unix_mode = info.external_attr >> 16
+                    ti = tarfile.TarInfo(name=info.filename.rstrip('/') if info.is_dir() else info.filename)
+                    ti.mtime = _zip_mtime(info)
+                    if info.is_dir():
+                        ti.type = tarfile.DIRTYPE
+                        ti.mode = stat.S_IMODE(unix_mode) or 0o755
+                        tf.addfile(ti)
+                    elif stat.S_ISLNK(unix_mode):
+                        ti.type = tarfile.SYMTYPE
+                        ti.linkname = zf.read(info).decode('utf-8')
+                        ti.mode = stat.S_IMODE(unix_mode) or 0o777
+                        tf.addfile(ti)
+                    else:
+                        ti.size = info.file_size
+                        ti.mode = stat.S_IMODE(unix_mode) or 0o644
+                        with zf.open(info) as src:
+                            tf.addfile(ti, src)
         return tar_path
     except Exception as e:
         raise ConversionError(f'Ошибка ZIP->TAR: {e}')
 
 
-def _tar_to_zip(tar_path: str, zip_path: str) -> str:
+def _tar_to_zip(tar_path: str, zip_path: str, tar_fmt: str = 'tar') -> str:
+    """
+    Жёсткие ссылки и устройства пропускаются (как и раньше — в ZIP для них нет типа).
+    Уже сжатые элементы пишутся как ZIP_STORED, крупные сжимаемые — deflate
+    кусками в CONVERT_ARCHIVE_THREADS потоков, мелкие — в одном потоке.
+    """
     try:
-        with tarfile.open(tar_path, 'r') as tf:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for member in tf.getmembers():
-                    if member.isfile():
-                        data = tf.extractfile(member).read()
-                        zf.writestr(member.name, data)
+        with _open_tar_read(tar_path, tar_fmt) as tf, open(zip_path, 'wb') as out, \
+                ParallelZipWriter(out, settings.CONVERT_ARCHIVE_THREADS) as zw:
+            for member in _iter_members(tf):
+                zinfo = zipfile.ZipInfo(member.name, date_time=_zip_date_time(member.mtime))
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                if member.isdir():
+                    zinfo.filename = member.name.rstrip('/') + '/'
+                    zinfo.external_attr = (stat.S_IFDIR | member.mode) << 16 | 0x10
+                    zinfo.compress_type = zipfile.ZIP_STORED
+                    zw.write(zinfo, b'')
+                elif member.issym():
+                    zinfo.external_attr = (stat.S_IFLNK | 0o777) << 16
+                    linkname = member.linkname.encode('utf-8')
+                    zinfo.file_size = len(linkname)
+                    zw.write(zinfo, linkname)
+                elif member.isfile():
+                    zinfo.external_attr = (stat.S_IFREG | member.mode) << 16
+                    # Размер заранее — по нему включается ZIP64 для элементов > 2 ГБ
+                    zinfo.file_size = member.size
+                    with tf.extractfile(member) as src:
+                        head = src.read(SAMPLE_SIZE)
+                        if is_incompressible(member.name, head):
+                            zinfo.compress_type = zipfile.ZIP_STORED
+                        zw.write(zinfo, head, src)
         return zip_path
     except Exception as e:
         raise ConversionError(f'Ошибка TAR->ZIP: {e}')
+
+
+def _tar_to_tar(source_path: str, dest_path: str, source_fmt: str, target_fmt: str) -> str:
+    """
+    Смена сжатия TAR. Элементы перекладываются через tarfile, а не копируются
+    байтами: так битый или чужой файл даёт ошибку, а не «успешный» архив.
+    Все типы элементов (жёсткие ссылки, устройства) сохраняются.
+    """
+    try:
+        with _open_tar_read(source_path, source_fmt) as src_tf, _open_tar_write(dest_path, target_fmt) as dst_tf:
+            for member in _iter_members(src_tf):
+                if member.isfile():
+                    with src_tf.extractfile(member) as src:
+                        dst_tf.addfile(member, src)
+                else:
+                    dst_tf.addfile(member)
+        return dest_path
+    except Exception as e:
+        raise ConversionError(f'Ошибка {source_fmt.upper()}->{target_fmt.upper()}: {e}')
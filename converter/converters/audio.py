@@ -1,66 +1,107 @@
 """
 Конвертация аудио: MP3, WAV, OGG, AAC, FLAC.
-Использует pydub (требует ffmpeg в системе).
+Один процесс ffmpeg (декодирование -> кодирование), без буфера PCM в памяти Python.
+aconvert_audio — то же для асинхронных views: ffmpeg ожидается без занятого потока.
 """
 
-import os
-import subprocess
+import asyncio
 from pathlib import Path
 
-from .base import ConversionError
+from converter import toolchain
+from converter.media_probe import aprobe_media, probe_media, first_stream
+from converter.progress import get_progress
 
-# Проверка наличия pydub
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except ImportError:
-    PYDUB_AVAILABLE = False
+from .base import ConversionError
+from .ffmpeg import arun_ffmpeg, run_ffmpeg
 
+# Целевой формат -> (кодек ffmpeg, битрейт, muxer)
+AUDIO_TARGETS = {
+    'mp3': ('libmp3lame', '192k', 'mp3'),
+    'wav': ('pcm_s16le', None, 'wav'),
+    'ogg': ('libvorbis', None, 'ogg'),
+    'aac': ('aac', '128k', 'adts'),
+    'flac': ('flac', None, 'flac'),
+}
 
-def _check_ffmpeg() -> bool:
-    """Проверяет наличие ffmpeg в системе."""
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+# Кодеки, которые целевой контейнер принимает как есть: тогда -c:a copy без перекодирования.
+# Только пары из CONVERSION_MATRIX, где меняется лишь контейнер: WAV со сжатым
+# MP3/AAC внутри (wav -> mp3, wav -> aac). Остальные разрешённые пары меняют кодек
+COPY_COMPATIBLE = {
+    'mp3': {'mp3'},
+    'aac': {'aac'},
+}
 
 
-def convert_audio(source_path: str, source_fmt: str, target_fmt: str, output_dir: Path) -> str:
-    """
-    Конвертирует аудио через pydub/ffmpeg.
-    """
-    if not PYDUB_AVAILABLE:
-        raise ConversionError('Модуль pydub не установлен. Выполните: pip install pydub')
-    if not _check_ffmpeg():
+def _check_target(source_fmt: str, target_fmt: str) -> None:
+    if not toolchain.has_ffmpeg():
         raise ConversionError(
             'Для конвертации аудио необходим ffmpeg. '
             'Скачайте: https://ffmpeg.org/download.html и добавьте в PATH'
         )
+    if target_fmt not in AUDIO_TARGETS:
+        raise ConversionError(f'Конвертация {source_fmt} -> {target_fmt} не поддерживается')
 
-    fmt_map = {
-        'mp3': 'mp3', 'wav': 'wav', 'ogg': 'ogg',
-        'aac': 'aac', 'flac': 'flac',
-    }
-    out_ext = fmt_map.get(target_fmt, target_fmt)
-    base = Path(source_path).stem
-    out_path = output_dir / f'{base}.{out_ext}'
-
-    try:
-        audio = AudioSegment.from_file(source_path, format=source_fmt)
-    except Exception as e:
-        raise ConversionError(f'Не удалось открыть аудиофайл: {e}')
-
-    export_format = out_ext
-    export_params = {}
-    if target_fmt == 'mp3':
-        export_params['bitrate'] = '192k'
-    elif target_fmt == 'aac':
-        export_params['bitrate'] = '128k'
-
-    try:
-        audio.export(str(out_path), format=export_format, **export_params)
-    except Exception as e:
-        raise ConversionError(f'Ошибка экспорта аудио: {e}')
 
+def _audio_command(source_path: str, target_fmt: str, out_path: Path, info: dict | None) -> list[str]:
+    codec, bitrate, muxer = AUDIO_TARGETS[target_fmt]
+    audio = first_stream(info, 'audio')
+    if audio is not None and audio['codec_name'] in COPY_COMPATIBLE.get(target_fmt, ()):
+        codec_args = ['-c:a', 'copy']
+    else:
+        if not toolchain.has_encoder(codec) and codec in toolchain.ENCODERS:
+            raise ConversionError(f'ffmpeg собран без кодека {codec}')
+        codec_args = ['-c:a', codec]
+        if bitrate:
+            codec_args += ['-b:a', bitrate]
+
+    return [
+        'ffmpeg', '-y', '-v', 'error', '-i', source_path,
+        '-map', '0:a:0', '-vn', *codec_args, '-f', muxer, str(out_path),
+    ]
+
+
+def _result(out_path: Path) -> str:
+    if not out_path.exists():
+        raise ConversionError('Результирующий файл не был создан')
     return str(out_path)
+
+
+def convert_audio(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
+    """
+    Конвертирует аудио через ffmpeg.
+    Если кодек исходника допустим в целевом контейнере — только перепаковка.
+    """
+    _check_target(source_fmt, target_fmt)
+    out_path = output_dir / f'{Path(source_path).stem}.{target_fmt}'
+    source_hash = (options or {}).get('source_hash')
+    info = probe_media(source_path, source_hash) if toolchain.has_ffprobe() else None
+    cmd = _audio_command(source_path, target_fmt, out_path, info)
+    run_ffmpeg(cmd, 'аудио', duration=info and info['duration'], progress=get_progress(options))
+    return _result(out_path)
+
+
+async def aconvert_audio(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
+    """
+    convert_audio для асинхронного кода. Проверки toolchain — в потоке: когда кеш
+    устарел, они запускают `ffmpeg -version` и заблокировали бы цикл событий.
+    """
+    await asyncio.to_thread(_check_target, source_fmt, target_fmt)
+    out_path = output_dir / f'{Path(source_path).stem}.{target_fmt}'
+    source_hash = (options or {}).get('source_hash')
+    has_ffprobe = await asyncio.to_thread(toolchain.has_ffprobe)
+    info = await aprobe_media(source_path, source_hash) if has_ffprobe else None
+    cmd = await asyncio.to_thread(_audio_command, source_path, target_fmt, out_path, info)
+    await arun_ffmpeg(cmd, 'аудио', duration=info and info['duration'], progress=get_progress(options))
+    return _result(out_path)
@@ -4,3 +4,13 @@
 class ConversionError(Exception):
     """Ошибка конвертации."""
     pass
+
+
+class ConversionCancelled(ConversionError):
+    """Конвертация отменена пользователем."""
+    pass
+
+
+class ConversionBusy(ConversionError):
+    """Все конвертеры категории заняты дольше допустимого ожидания (503)."""
+    pass
@@ -0,0 +1,423 @@
+"""
+Политика сжатия элементов ZIP и параллельное сжатие потоков.
+Уже сжатые данные (JPEG, MP4, вложенные архивы...) хранятся как ZIP_STORED —
+определяется по расширению, сигнатуре и пробному сжатию начала элемента.
+Крупные элементы сжимаются кусками в пуле потоков (zlib отпускает GIL), как pigz:
+каждый кусок — raw deflate с Z_SYNC_FLUSH и словарём из хвоста предыдущего куска,
+поэтому склейка кусков — обычный deflate-поток, а степень сжатия почти не меняется.
+Готовый deflate-поток zipfile принять не умеет, поэтому ZIP пишет ParallelZipWriter:
+метаданные — zipfile.ZipInfo, заголовки и центральный каталог (с ZIP64) — по спецификации.
+Тем же способом сжимаются tar.gz и tar.xz (xz — независимыми потоками, которые
+формат разрешает склеивать), tar.zst — встроенной многопоточностью zstandard.
+"""
+
+import abc
+import contextlib
+import gzip
+import io
+import lzma
+import struct
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+CHUNK_SIZE = 1024 * 1024
+# По этому началу элемента решаем, сжимать ли его
+SAMPLE_SIZE = 64 * 1024
+# Окно deflate — 32 КБ: столько хвоста предыдущего куска нужно как словарь
+DICT_SIZE = 32 * 1024
+# Пробное сжатие выиграло меньше 5% — храним как есть
+STORE_RATIO = 0.95
+COMPRESS_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+# Блок xz — три словаря пресета 6 (8 МБ), как у `xz -T`: меньше — хуже сжатие
+XZ_PRESET = 6
+XZ_BLOCK_SIZE = 24 * 1024 * 1024
+ZSTD_LEVEL = 3
+
+# Пустой gzip-заголовок: deflate, без имени и mtime, ОС неизвестна
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+# ZIP: после этого размера/смещения нужны поля ZIP64 (тот же порог, что у zipfile)
+ZIP64_LIMIT = (1 << 31) - 1
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+ZIP_UTF8_FLAG = 0x800
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+# Создан в Unix: в старших битах external_attr — режим файла
+ZIP_CREATE_SYSTEM = 3
+
+INCOMPRESSIBLE_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'avif',
+    'mp4', 'm4v', 'm4a', 'mov', 'mkv', 'webm', 'avi',
+    'mp3', 'aac', 'ogg', 'opus', 'flac',
+    'zip', 'gz', 'tgz', 'bz2', 'xz', 'txz', 'zst', '7z', 'rar',
+    'docx', 'xlsx', 'pptx', 'odt', 'ods', 'epub', 'jar', 'apk', 'woff', 'woff2',
+}
+
+MAGIC_PREFIXES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',   # PNG
+    b'GIF8',
+    b'PK\x03\x04',          # ZIP, docx, xlsx, jar
+    b'\x1f\x8b',            # gzip
+    b'\xfd7zXZ\x00',        # xz
+    b'(\xb5/\xfd',          # zstd
+    b'BZh',
+    b'7z\xbc\xaf\x27\x1c',
+    b'Rar!',
+    b'ID3',                 # MP3
+    b'OggS',
+    b'fLaC',
+    b'\x1aE\xdf\xa3',       # Matroska / WebM
+)
+
+
+def is_incompressible(name: str, head: bytes) -> bool:
+    """True — элемент уже сжат и deflate его не уменьшит."""
+    if PurePosixPath(name).suffix.lstrip('.').lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return True
+    if head.startswith(MAGIC_PREFIXES):
+        return True
+    if head[4:8] == b'ftyp' or (head[:4] == b'RIFF' and head[8:12] == b'WEBP'):
+        return True  # MP4 / MOV / HEIC / AVIF, WebP
+    if len(head) < 512:
+        return False
+    sample = zlib.compress(head, 1)
+    return len(sample) > len(head) * STORE_RATIO
+
+
+def _deflate_chunk(data: bytes, zdict: bytes | None, last: bool) -> bytes:
+    if zdict:
+        c = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        c = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _read_chunks(head: bytes, src, chunk_size: int):
+    """Куски по chunk_size: сначала уже прочитанное начало, затем остаток src."""
+    buf = head
+    while True:
+        while len(buf) < chunk_size:
+            data = src.read(chunk_size - len(buf))
+            if not data:
+                break
+            buf += data
+        if not buf:
+            return
+        yield buf[:chunk_size]
+        buf = buf[chunk_size:]
+
+
+def _dos_date_time(date_time: tuple) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _encode_name(name: str) -> tuple[bytes, int]:
+    """Имя элемента и флаги: не-ASCII пишется в UTF-8 с флагом 0x800, как у zipfile."""
+    try:
+        return name.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return name.encode('utf-8'), ZIP_UTF8_FLAG
+
+
+class ParallelZipWriter:
+    """
+    Запись ZIP: элементы ZIP_STORED и ZIP_DEFLATED, крупные сжимаемые — кусками
+    в threads потоках (в памяти не больше ~2 * threads кусков).
+    fileobj должен поддерживать seek: CRC и размеры дописываются в локальный заголовок
+    после данных. close() пишет центральный каталог, но не закрывает fileobj.
+    """
+
+    def __init__(self, fileobj, threads: int):
+        self.fileobj = fileobj
+        self.closed = False
+        self._executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self._window = max(2, threads * 2)
+        self._entries = []
+
+    def write(self, zinfo: zipfile.ZipInfo, head: bytes, src=None) -> None:
+        """
+        Пишет элемент. head — данные или их уже прочитанное начало, src — поток
+        с остатком. zinfo.file_size должен быть известен заранее (по нему решается
+        про ZIP64), zinfo.compress_type — ZIP_STORED или ZIP_DEFLATED.
+        """
+        fp = self.fileobj
+        offset = fp.tell()
+        # deflate может немного увеличить данные — запас 5%, как у zipfile
+        zip64 = zinfo.file_size * 1.05 > ZIP64_LIMIT
+        name, flags = _encode_name(zinfo.filename)
+        declared_size = zinfo.file_size
+        zinfo.CRC = zinfo.compress_size = 0
+        fp.write(self._local_header(zinfo, name, flags, zip64))
+        data_start = fp.tell()
+
+        chunks = _read_chunks(head, src or io.BytesIO(), CHUNK_SIZE)
+        if zinfo.compress_type == zipfile.ZIP_STORED:
+            crc, size = self._copy(chunks)
+        elif self._executor is not None and declared_size >= 2 * CHUNK_SIZE:
+            crc, size = self._deflate_parallel(chunks)
+        else:
+            crc, size = self._deflate(chunks)
+
+        end = fp.tell()
+        zinfo.CRC, zinfo.file_size, zinfo.compress_size = crc, size, end - data_start
+        if not zip64 and max(zinfo.file_size, zinfo.compress_size) > ZIP64_LIMIT:
+            raise ValueError(f'Размер элемента {zinfo.filename} больше заявленного')
+        fp.seek(offset)
+        fp.write(self._local_header(zinfo, name, flags, zip64))
+        fp.seek(end)
+        self._entries.append((zinfo, name, flags, offset))
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._write_central_directory()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _copy(self, chunks) -> tuple[int, int]:
+        crc = size = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            self.fileobj.write(chunk)
+        return crc, size
+
+    def _deflate(self, chunks) -> tuple[int, int]:
+        crc = size = 0
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            self.fileobj.write(compressor.compress(chunk))
+        self.fileobj.write(compressor.flush())
+        return crc, size
+
+    def _deflate_parallel(self, chunks) -> tuple[int, int]:
+        crc = size = 0
+        pending = deque()
+        current = next(chunks, b'')
+        zdict = None
+        while True:
+            following = next(chunks, None)
+            last = following is None
+            # CRC считается по порядку в основном потоке — он в разы быстрее deflate
+            crc = zlib.crc32(current, crc)
+            size += len(current)
+            pending.append(self._executor.submit(_deflate_chunk, current, zdict, last))
+            zdict = current[-DICT_SIZE:]
+            while pending and (last or len(pending) >= self._window):
+                self.fileobj.write(pending.popleft().result())
+            if last:
+                return crc, size
+            current = following
+
+    @staticmethod
+    def _local_header(zinfo: zipfile.ZipInfo, name: bytes, flags: int, zip64: bool) -> bytes:
+        # Длина заголовка не зависит от значений: второй раз он пишется поверх первого
+        file_size, compress_size, extra = zinfo.file_size, zinfo.compress_size, b''
+        if zip64:
+            extra = struct.pack('<HHQQ', 1, 16, file_size, compress_size)
+            file_size = compress_size = 0xFFFFFFFF
+        version = ZIP64_VERSION if zip64 else ZIP_VERSION
+        dosdate, dostime = _dos_date_time(zinfo.date_time)
+        return struct.pack(
+            '<4s2B4HL2L2H', b'PK\x03\x04', version, 0, flags, zinfo.compress_type,
+            dostime, dosdate, zinfo.CRC, compress_size, file_size, len(name), len(extra),
+        ) + name + extra
+
+    @staticmethod
+    def _central_entry(zinfo: zipfile.ZipInfo, name: bytes, flags: int, offset: int) -> bytes:
+        # В поле ZIP64 — только значения, не поместившиеся в 32 бита, в порядке спецификации
+        file_size, compress_size, wide = zinfo.file_size, zinfo.compress_size, []
+        if max(file_size, compress_size) > ZIP64_LIMIT:
+            wide += [file_size, compress_size]
+            file_size = compress_size = 0xFFFFFFFF
+        if offset > ZIP64_LIMIT:
+            wide.append(offset)
+            offset = 0xFFFFFFFF
+        extra = struct.pack(f'<HH{len(wide)}Q', 1, 8 * len(wide), *wide) if wide else b''
+        version = ZIP64_VERSION if wide else ZIP_VERSION
+        dosdate, dostime = _dos_date_time(zinfo.date_time)
+        return struct.pack(
+            '<4s4B4HL2L5H2L', b'PK\x01\x02', version, ZIP_CREATE_SYSTEM, version, 0,
+            flags, zinfo.compress_type, dostime, dosdate, zinfo.CRC, compress_size, file_size,
+            len(name), len(extra), 0, 0, 0, zinfo.external_attr, offset,
+        ) + name + extra
+
+    def _write_central_directory(self) -> None:
+        fp = self.fileobj
+        start = fp.tell()
+        for entry in self._entries:
+            fp.write(self._central_entry(*entry))
+        end = fp.tell()
+        count, size = len(self._entries), end - start
+        if count > ZIP_FILECOUNT_LIMIT or max(start, size) > ZIP64_LIMIT:
+            # Запись ZIP64 end of central directory и её локатор
+            fp.write(struct.pack(
+                '<4sQ2H2L4Q', b'PK\x06\x06', 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0,
+                count, count, size, start,
+            ))
+            fp.write(struct.pack('<4sLQL', b'PK\x06\x07', 0, end, 1))
+        fp.write(struct.pack(
+            '<4s4H2LH', b'PK\x05\x06', 0, 0, min(count, ZIP_FILECOUNT_LIMIT),
+            min(count, ZIP_FILECOUNT_LIMIT), min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF), 0,
+        ))
+
+
+class _ParallelBlockWriter(abc.ABC):
+    """
+    Файловый объект только для записи: данные режутся на блоки, блоки сжимаются
+    в пуле потоков и пишутся в fileobj по порядку. В памяти — не больше
+    ~2 * threads блоков. close() дописывает хвост потока, но не закрывает fileobj.
+    Формат задают подклассы: _task (сжатие блока) и, если нужен, _trailer.
+    """
+
+    block_size = CHUNK_SIZE
+
+    def __init__(self, fileobj, threads: int):
+        self.fileobj = fileobj
+        self.closed = False
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._window = max(2, threads * 2)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block, last=False)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._submit(bytes(self._buffer), last=True)
+            self._drain(0)
+            self.fileobj.write(self._trailer())
+        finally:
+            self._buffer = bytearray()
+            self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self, block: bytes, last: bool) -> None:
+        fn, args = self._task(block, last)
+        self._pending.append(self._executor.submit(fn, *args))
+        self._drain(self._window)
+
+    def _drain(self, keep: int) -> None:
+        while len(self._pending) > keep:
+            self.fileobj.write(self._pending.popleft().result())
+
+    @abc.abstractmethod
+    def _task(self, block: bytes, last: bool):
+        """(функция, аргументы) для сжатия блока в пуле."""
+
+    def _trailer(self) -> bytes:
+        return b''
+
+
+class ParallelGzipWriter(_ParallelBlockWriter):
+    """gzip как у pigz: один член gzip, deflate-блоки со словарём из предыдущего блока."""
+
+    def __init__(self, fileobj, threads: int):
+        super().__init__(fileobj, threads)
+        self._crc = 0
+        self._zdict = None
+        fileobj.write(GZIP_HEADER)
+
+    def _task(self, block: bytes, last: bool):
+        # CRC считается по порядку в основном потоке — он в разы быстрее deflate
+        self._crc = zlib.crc32(block, self._crc)
+        zdict, self._zdict = self._zdict, block[-DICT_SIZE:]
+        return _deflate_chunk, (block, zdict, last)
+
+    def _trailer(self) -> bytes:
+        return struct.pack('<II', self._crc, self._position & 0xffffffff)
+
+
+def _xz_block(block: bytes, first: bool) -> bytes:
+    if not block and not first:
+        return b''
+    return lzma.compress(block, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC64, preset=XZ_PRESET)
+
+
+class ParallelXzWriter(_ParallelBlockWriter):
+    """xz из склеенных независимых потоков — их читают и xz, и lzma.LZMAFile."""
+
+    block_size = XZ_BLOCK_SIZE
+
+    def __init__(self, fileobj, threads: int):
+        super().__init__(fileobj, threads)
+        self._first = True
+
+    def _task(self, block: bytes, last: bool):
+        first, self._first = self._first, False
+        return _xz_block, (block, first)
+
+
+def open_writer(fileobj, codec: str | None, threads: int):
+    """
+    Сжимающая обёртка над fileobj для codec 'gz' / 'xz' / 'zst' (None — без сжатия).
+    Используется как контекстный менеджер; fileobj остаётся открытым.
+    """
+    if codec is None:
+        return contextlib.nullcontext(fileobj)
+    if codec == 'gz':
+        return ParallelGzipWriter(fileobj, threads)
+    if codec == 'xz':
+        return ParallelXzWriter(fileobj, threads)
+    if codec == 'zst' and ZSTD_AVAILABLE:
+        # threads=0 у zstandard — однопоточный режим, поэтому 1 поток -> 0
+        cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads if threads > 1 else 0)
+        return cctx.stream_writer(fileobj, closefd=False)
+    raise ValueError(f'Сжатие {codec} недоступно')
+
+
+def open_reader(fileobj, codec: str | None):
+    """Распаковывающая обёртка над fileobj (контекстный менеджер); fileobj остаётся открытым."""
+    if codec is None:
+        return contextlib.nullcontext(fileobj)
+    if codec == 'gz':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if codec == 'xz':
+        return lzma.LZMAFile(fileobj, 'rb')
+    if codec == 'zst' and ZSTD_AVAILABLE:
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=False)
+    raise ValueError(f'Распаковка {codec} недоступна')
@@ -3,9 +3,22 @@
 """
 
 import io
+import logging
 from pathlib import Path
 
-from .base import ConversionError
+from django.conf import settings
+
+from converter.progress import get_progress
+
+from .base import ConversionError, ConversionCancelled
+from .docx_writer import StreamingDocxWriter
+from .html_resources import ResourceResolver
+# PDF generation: шрифты и метрики reportlab (layout), запись — StreamingPdfWriter
+from .layout import REPORTLAB_AVAILABLE, PageComposer, get_face
+from .office import OfficeError, get_office, warm_up as start_office
+from .pdf_parallel import page_indexes, parse_pages_parallel
+from .pdf_writer import StreamingPdfWriter
+from .textio import iter_text_lines
 
 # PDF -> DOCX
 try:
@@ -17,21 +30,10 @@ except ImportError:
 # DOCX, TXT
 try:
     from docx import Document
-    from docx.shared import Pt, Inches
     DOCX_AVAILABLE = True
 except ImportError:
     DOCX_AVAILABLE = False
 
-# PDF generation
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-
 # HTML -> PDF
 try:
     from xhtml2pdf import pisa
@@ -39,8 +41,27 @@ try:
 except ImportError:
     XHTML2PDF_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
 
-def convert_document(source_path: str, source_fmt: str, target_fmt: str, output_dir: Path) -> str:
+
+def warm_up() -> None:
+    """
+    Вызывается при старте процесса пула: шрифты PDF загружаются до первой конвертации,
+    свободный экземпляр soffice хоста (если установлен) поднимается в фоне.
+    """
+    if REPORTLAB_AVAILABLE:
+        get_face('regular')
+        get_face('bold')
+    start_office()
+
+
+def convert_document(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
     """
     Конвертирует документ.
     """
@@ -48,9 +69,9 @@ def convert_document(source_path: str, source_fmt: str, target_fmt: str, output_
     out_path = output_dir / f'{base}.{target_fmt}'
 
     if source_fmt == 'pdf' and target_fmt == 'docx':
-        return _pdf_to_docx(source_path, str(out_path))
+        return _pdf_to_docx(source_path, str(out_path), get_progress(options), (options or {}).get('pages'))
     if source_fmt == 'docx' and target_fmt == 'pdf':
-        return _docx_to_pdf(source_path, str(out_path))
+        return _docx_to_pdf(source_path, str(out_path), get_progress(options))
     if source_fmt == 'txt' and target_fmt == 'pdf':
         return _txt_to_pdf(source_path, str(out_path))
     if source_fmt == 'txt' and target_fmt == 'docx':
@@ -61,90 +82,127 @@ def convert_document(source_path: str, source_fmt: str, target_fmt: str, output_
     raise ConversionError(f'Конвертация {source_fmt} -> {target_fmt} не поддерживается')
 
 
-def _pdf_to_docx(source: str, dest: str) -> str:
+def _pdf_to_docx(source: str, dest: str, progress=None, pages: str | None = None) -> str:
+    """
+    Шаги Converter.convert() по отдельности: между страницами сообщаем прогресс
+    и проверяем отмену задачи (progress — JobProgress или None).
+    pages — необязательный список страниц ('1-3,7'). Документ от
+    CONVERT_PDF_PARALLEL_MIN_PAGES страниц разбирается кусками в нескольких процессах.
+    """
     if not PDF2DOCX_AVAILABLE:
         raise ConversionError('Установите pdf2docx: pip install pdf2docx')
     try:
         cv = Pdf2DocxConverter(source)
-        cv.convert(dest)
-        cv.close()
+        try:
+            config = cv.default_settings
+            page_count = len(cv.fitz_doc)
+            indexes = page_indexes(pages, page_count) if pages else list(range(page_count))
+            workers = settings.CONVERT_PDF_PAGE_WORKERS
+            if workers > 1 and len(indexes) >= settings.CONVERT_PDF_PARALLEL_MIN_PAGES \
+                    and not cv.fitz_doc.needs_pass:
+                stored = parse_pages_parallel(source, indexes, config, workers, progress)
+                cv.restore({'page_cnt': page_count, 'pages': stored})
+                cv.make_docx(dest, **config)
+                return dest
+
+            cv.load_pages(pages=indexes).parse_document(**config)
+            parsed = [page for page in cv.pages if not page.skip_parsing]
+            for i, page in enumerate(parsed, start=1):
+                if progress is not None:
+                    progress.check_cancelled()
+                try:
+                    page.parse(**config)
+                except Exception:
+                    if not config['ignore_page_error']:
+                        raise
+                if progress is not None:
+                    # Последняя доля — на сборку docx
+                    progress.update(i / (len(parsed) + 1))
+            cv.make_docx(dest, **config)
+        finally:
+            cv.close()
         return dest
+    except ConversionCancelled:
+        raise
     except Exception as e:
         raise ConversionError(f'Ошибка PDF->DOCX: {e}')
 
 
-def _docx_to_pdf(source: str, dest: str) -> str:
-    """DOCX -> PDF через reportlab (извлечение текста и создание PDF)."""
+def _docx_to_pdf(source: str, dest: str, progress=None) -> str:
+    """
+    DOCX -> PDF через запущенный LibreOffice (office), если он установлен.
+    Иначе (или если soffice не справился) — текст абзацев с переносом строк (layout),
+    заголовки полужирным; таблицы, картинки и стили при этом теряются.
+    """
+    soffice = get_office()
+    if soffice is not None:
+        try:
+            return soffice.convert(source, dest, progress)
+        except OfficeError as e:
+            logger.warning('DOCX->PDF через LibreOffice не удался, PDF будет без оформления: %s', e)
     if not DOCX_AVAILABLE or not REPORTLAB_AVAILABLE:
         raise ConversionError('Установите python-docx и reportlab')
     try:
         doc = Document(source)
-        c = canvas.Canvas(dest, pagesize=A4)
-        width, height = A4
-        y = height - 50
-        for para in doc.paragraphs:
-            text = para.text
-            if text.strip():
-                c.setFont('Helvetica', 12)
-                c.drawString(50, y, text[:100])
-                y -= 18
-            if y < 50:
-                c.showPage()
-                y = height - 50
-        c.save()
+        regular, bold = get_face('regular'), get_face('bold')
+        with StreamingPdfWriter(dest) as pdf:
+            composer = PageComposer(pdf)
+            for para in doc.paragraphs:
+                style = para.style.name if para.style is not None else ''
+                if style == 'Title' or style.startswith('Heading'):
+                    composer.add_paragraph(para.text, bold, 14, space_after=8)
+                else:
+                    composer.add_paragraph(para.text, regular, 11, leading=15, space_after=6)
+            composer.close()
         return dest
     except Exception as e:
         raise ConversionError(f'Ошибка DOCX->PDF: {e}')
 
 
 def _txt_to_pdf(source: str, dest: str) -> str:
+    """
+    Текст читается построчно (textio), длинные строки переносятся (layout), каждая
+    страница пишется в файл по заполнении (StreamingPdfWriter) — память не зависит
+    от размера текста.
+    """
     if not REPORTLAB_AVAILABLE:
         raise ConversionError('Установите reportlab: pip install reportlab')
     try:
-        with open(source, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
-        c = canvas.Canvas(dest, pagesize=A4)
-        width, height = A4
-        y = height - 50
-        for line in text.splitlines():
-            line = line[:120]
-            if line.strip():
-                c.setFont('Helvetica', 12)
-                c.drawString(50, y, line)
-                y -= 18
-            if y < 50:
-                c.showPage()
-                y = height - 50
-        c.save()
+        face = get_face('regular')
+        with StreamingPdfWriter(dest) as pdf:
+            composer = PageComposer(pdf)
+            for line in iter_text_lines(source):
+                composer.add_paragraph(line, face, 10, leading=13)
+            composer.close()
         return dest
     except Exception as e:
         raise ConversionError(f'Ошибка TXT->PDF: {e}')
 
 
 def _txt_to_docx(source: str, dest: str) -> str:
-    if not DOCX_AVAILABLE:
-        raise ConversionError('Установите python-docx: pip install python-docx')
+    """Построчно, без python-docx: абзацы сразу пишутся в DOCX (StreamingDocxWriter)."""
     try:
-        with open(source, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
-        doc = Document()
-        for line in text.splitlines():
-            p = doc.add_paragraph(line)
-            p.paragraph_format.space_after = Pt(6)
-        doc.save(dest)
+        with StreamingDocxWriter(dest, size_hint=Path(source).stat().st_size) as doc:
+            for line in iter_text_lines(source):
+                doc.add_paragraph(line)
         return dest
     except Exception as e:
         raise ConversionError(f'Ошибка TXT->DOCX: {e}')
 
 
 def _html_to_pdf(source: str, dest: str) -> str:
+    """Картинки, CSS и шрифты — только через ResourceResolver: без сети, с бюджетом байт и времени."""
     if not XHTML2PDF_AVAILABLE:
         raise ConversionError('Установите xhtml2pdf: pip install xhtml2pdf')
     try:
         with open(source, 'r', encoding='utf-8', errors='ignore') as f:
             html = f.read()
-        with open(dest, 'wb') as out:
-            pisa_status = pisa.CreatePDF(html, dest=out, encoding='utf-8')
+        resolver = ResourceResolver()
+        try:
+            with open(dest, 'wb') as out:
+                pisa_status = pisa.CreatePDF(html, dest=out, encoding='utf-8', **resolver.pisa_options())
+        finally:
+            resolver.close()
         if pisa_status.err:
             raise ConversionError('Ошибка создания PDF из HTML')
         return dest
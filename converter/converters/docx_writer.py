@@ -0,0 +1,143 @@
+"""
+Потоковая запись DOCX из простых абзацев.
+python-docx строит всё дерево документа в памяти до save(); здесь абзацы сразу
+пишутся в word/document.xml внутри ZIP — память не зависит от длины документа.
+"""
+
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Размер ZIP-элемента не известен заранее; больше — включаем ZIP64 сразу,
+# иначе zipfile оборвёт запись на 2 ГБ
+ZIP64_HINT = 256 * 1024 * 1024
+WRITE_BUFFER_SIZE = 256 * 1024
+
+# Управляющие символы запрещены в XML 1.0
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Calibri 11 и отступ 6 pt после абзаца — по умолчанию для всех абзацев,
+# чтобы не повторять свойства в каждом <w:p>
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:docDefaults>'
+    '<w:rPrDefault><w:rPr>'
+    '<w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:eastAsia="Calibri" w:cs="Calibri"/>'
+    '<w:sz w:val="22"/><w:szCs w:val="22"/><w:lang w:val="ru-RU"/>'
+    '</w:rPr></w:rPrDefault>'
+    '<w:pPrDefault><w:pPr><w:spacing w:after="120" w:line="240" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+    '</w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    '</w:styles>'
+)
+
+DOCUMENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+
+# A4, поля 2 см
+DOCUMENT_TAIL = (
+    '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+    '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134" '
+    'w:header="709" w:footer="709" w:gutter="0"/></w:sectPr>'
+    '</w:body></w:document>'
+)
+
+
+def _paragraph_xml(text: str) -> str:
+    text = _INVALID_XML_CHARS.sub('', text)
+    if not text:
+        return '<w:p/>'
+    # Табуляция — отдельный элемент, как в python-docx
+    runs = '<w:tab/>'.join(
+        f'<w:t xml:space="preserve">{escape(part)}</w:t>' if part else ''
+        for part in text.split('\t')
+    )
+    return f'<w:p><w:r>{runs}</w:r></w:p>'
+
+
+class StreamingDocxWriter:
+    """
+    with StreamingDocxWriter(path) as doc:
+        doc.add_paragraph('...')
+    size_hint — ожидаемый объём текста в байтах (для выбора ZIP64).
+    """
+
+    def __init__(self, path: str, size_hint: int = 0):
+        self._zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        try:
+            self._zf.writestr('[Content_Types].xml', CONTENT_TYPES)
+            self._zf.writestr('_rels/.rels', ROOT_RELS)
+            self._zf.writestr('word/_rels/document.xml.rels', DOCUMENT_RELS)
+            self._zf.writestr('word/styles.xml', STYLES)
+            self._body = self._zf.open('word/document.xml', 'w', force_zip64=size_hint > ZIP64_HINT)
+        except BaseException:
+            self._zf.close()
+            raise
+        self._buffer = [DOCUMENT_HEAD]
+        self._buffered = len(DOCUMENT_HEAD)
+
+    def add_paragraph(self, text: str) -> None:
+        xml = _paragraph_xml(text)
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        if self._buffered >= WRITE_BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._body.write(''.join(self._buffer).encode('utf-8'))
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self) -> None:
+        if self._zf.fp is None:
+            return
+        try:
+            self._buffer.append(DOCUMENT_TAIL)
+            self._flush()
+            self._body.close()
+        finally:
+            self._zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Документ всё равно неполный — просто освобождаем файл
+            self._body.close()
+            self._zf.close()
@@ -0,0 +1,150 @@
+"""
+Запуск ffmpeg для аудио- и видеоконвертеров.
+Прогресс читается из `-progress pipe:1`; процесс убивается по таймауту или отмене задачи.
+arun_ffmpeg — то же для асинхронных views: ожидание процесса не занимает поток.
+"""
+
+import asyncio
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+from .base import ConversionError, ConversionCancelled
+
+FFMPEG_TIMEOUT = 300
+# Как часто сторож проверяет таймаут и флаг отмены (сек)
+WATCH_INTERVAL = 0.5
+
+# Семафор числа процессов ffmpeg из асинхронных views — свой у каждого цикла событий;
+# на весь хост их ограничивают слоты категории (aconvert_file, converter.slots)
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _watch(proc, deadline: float, progress, stopped: list) -> None:
+    """Убивает ffmpeg по таймауту или отмене; причину кладёт в stopped."""
+    while proc.poll() is None:
+        if progress is not None and progress.is_cancelled():
+            stopped.append('cancel')
+        elif time.monotonic() > deadline:
+            stopped.append('timeout')
+        if stopped:
+            proc.kill()
+            return
+        time.sleep(WATCH_INTERVAL)
+
+
+def _progress_line(line: str, duration: float | None, progress) -> None:
+    key, _, value = line.strip().partition('=')
+    if key == 'out_time_us' and progress is not None and duration:
+        try:
+            progress.update(int(value) / 1_000_000 / duration)
+        except ValueError:
+            pass  # N/A до первого кадра
+
+
+def _check_result(stopped: list, returncode: int, stderr, what: str) -> None:
+    if 'cancel' in stopped:
+        raise ConversionCancelled('Конвертация отменена')
+    if 'timeout' in stopped:
+        raise ConversionError(f'Конвертация {what} заняла слишком много времени')
+    if returncode != 0:
+        stderr.seek(0)
+        err = stderr.read().decode('utf-8', 'replace')[-500:]
+        raise ConversionError(f'Ошибка ffmpeg: {err or "Unknown error"}')
+
+
+def run_ffmpeg(
+    cmd: list[str],
+    what: str,
+    timeout: int = FFMPEG_TIMEOUT,
+    duration: float | None = None,
+    progress=None,
+) -> None:
+    """
+    Выполняет команду ffmpeg. what — что конвертируем ('аудио', 'видео'),
+    используется в сообщениях об ошибках.
+    duration — длительность результата (сек) для расчёта доли готовности,
+    progress — JobProgress задачи (converter.progress) или None.
+    """
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1', *cmd[1:]]
+    stopped = []
+    try:
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr, text=True,
+            )
+            watcher = threading.Thread(
+                target=_watch, args=(proc, time.monotonic() + timeout, progress, stopped), daemon=True,
+            )
+            watcher.start()
+            for line in proc.stdout:
+                _progress_line(line, duration, progress)
+            proc.wait()
+            watcher.join()
+            _check_result(stopped, proc.returncode, stderr, what)
+    except Exception as e:
+        if isinstance(e, ConversionError):
+            raise
+        raise ConversionError(f'Ошибка конвертации {what}: {e}')
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(settings.CONVERT_ASYNC_FFMPEG_LIMIT)
+    return semaphore
+
+
+async def _awatch(proc, deadline: float, progress, stopped: list) -> None:
+    """Асинхронный сторож: убивает ffmpeg по таймауту или отмене задачи."""
+    while proc.returncode is None:
+        if progress is not None and progress.is_cancelled():
+            stopped.append('cancel')
+        elif time.monotonic() > deadline:
+            stopped.append('timeout')
+        if stopped:
+            proc.kill()
+            return
+        await asyncio.sleep(WATCH_INTERVAL)
+
+
+async def arun_ffmpeg(
+    cmd: list[str],
+    what: str,
+    timeout: int = FFMPEG_TIMEOUT,
+    duration: float | None = None,
+    progress=None,
+) -> None:
+    """
+    Асинхронный run_ffmpeg (asyncio.create_subprocess_exec), те же аргументы и ошибки.
+    Одновременно — не больше CONVERT_ASYNC_FFMPEG_LIMIT процессов на цикл событий.
+    Если ожидающую задачу отменили (клиент ушёл), ffmpeg убивается.
+    """
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1', *cmd[1:]]
+    stopped = []
+    try:
+        async with _semaphore():
+            with tempfile.TemporaryFile() as stderr:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr,
+                )
+                watcher = asyncio.create_task(_awatch(proc, time.monotonic() + timeout, progress, stopped))
+                try:
+                    async for line in proc.stdout:
+                        _progress_line(line.decode('utf-8', 'replace'), duration, progress)
+                    await proc.wait()
+                finally:
+                    if proc.returncode is None:
+                        proc.kill()
+                        await proc.wait()
+                    watcher.cancel()
+                _check_result(stopped, proc.returncode, stderr, what)
+    except Exception as e:
+        if isinstance(e, ConversionError):
+            raise
+        raise ConversionError(f'Ошибка конвертации {what}: {e}')
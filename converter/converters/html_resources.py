@@ -0,0 +1,253 @@
+"""
+Ресурсы HTML -> PDF: link_callback для xhtml2pdf (картинки, CSS, шрифты).
+По умолчанию сеть закрыта: пользовательский HTML не может подвесить процесс пула
+загрузкой с чужого сервера или прочитать файл сервера. Разрешены data: URI и файлы
+из CONVERT_HTML_ASSET_DIRS; http(s) — только при CONVERT_HTML_ALLOW_REMOTE.
+Декодированные data: URI и загруженные из сети ресурсы лежат файлами в LRU-кеше
+процесса: повторяющиеся шаблоны не декодируют одни и те же шрифты и картинки заново.
+На документ действуют бюджеты байт и времени; сверх них ресурс пропускается.
+"""
+
+import atexit
+import base64
+import binascii
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote, unquote_to_bytes, urlsplit
+from urllib.request import Request, url2pathname, urlopen
+
+from django.conf import settings
+
+# Новые xhtml2pdf сами ограничивают доступ к файлам (по умолчанию — текущая папка процесса);
+# им передаётся политика с теми же папками, что разрешает resolver
+try:
+    from xhtml2pdf.config.resources import ResourceAccessPolicy
+except ImportError:
+    ResourceAccessPolicy = None
+
+logger = logging.getLogger(__name__)
+
+# Пропущенный ресурс: xhtml2pdf получает пустой файл и рисует документ без него
+BLOCKED = os.devnull
+READ_CHUNK = 64 * 1024
+USER_AGENT = 'file-converter/html2pdf'
+# mimetypes не знает шрифтовые типы
+EXTENSIONS = {
+    'font/ttf': '.ttf',
+    'font/otf': '.otf',
+    'application/x-font-ttf': '.ttf',
+    'application/font-sfnt': '.ttf',
+    'image/svg+xml': '.svg',
+    'image/jpg': '.jpg',
+}
+
+
+class ResourceRefused(Exception):
+    """Ресурс не отдаётся: запрещён или не укладывается в бюджет документа."""
+    pass
+
+
+def _extension(mimetype: str) -> str:
+    mimetype = mimetype.split(';')[0].strip().lower()
+    return EXTENSIONS.get(mimetype) or mimetypes.guess_extension(mimetype) or ''
+
+
+class ResourceCache:
+    """
+    LRU-кеш ресурсов процесса: ключ -> файл во временной папке.
+    xhtml2pdf читает ресурсы по пути (шрифты — reportlab по имени файла),
+    поэтому кешируются файлы, а не байты.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # ключ -> (путь, размер)
+        self._size = 0
+        self._dir = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        with self._lock:
+            return self._ensure_dir()
+
+    def _ensure_dir(self) -> str:
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix='convert_html_')
+            atexit.register(shutil.rmtree, self._dir, True)
+        return self._dir
+
+    def get(self, key: str) -> tuple[str, int] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, data: bytes, suffix: str) -> tuple[str, int]:
+        with self._lock:
+            path = os.path.join(self._ensure_dir(), hashlib.sha256(key.encode()).hexdigest()[:32] + suffix)
+            with open(path, 'wb') as f:
+                f.write(data)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (path, len(data))
+            self._size += len(data)
+            return path, len(data)
+
+    def trim(self) -> None:
+        """Вытесняет старые ресурсы сверх CONVERT_HTML_CACHE_MAX_BYTES (после документа, не во время)."""
+        with self._lock:
+            while self._size > settings.CONVERT_HTML_CACHE_MAX_BYTES and self._entries:
+                _, (path, size) = self._entries.popitem(last=False)
+                self._size -= size
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+_cache = ResourceCache()
+
+
+@lru_cache(maxsize=1024)
+def _resolve_asset(path: str, base: str | None, asset_dirs: tuple) -> tuple[str, int] | None:
+    """Файл из папок ресурсов: (путь, размер) или None. Пути вне папок не выходят (../, симлинки)."""
+    relative = path.lstrip('/\\')
+    candidates = [Path(base).parent / path] if base and not Path(path).is_absolute() else []
+    candidates += [Path(directory) / relative for directory in asset_dirs]
+    roots = [Path(directory).resolve() for directory in asset_dirs]
+    for candidate in candidates:
+        resolved = candidate.resolve()
+        if resolved.is_file() and any(resolved.is_relative_to(root) for root in roots):
+            return str(resolved), resolved.stat().st_size
+    return None
+
+
+class ResourceResolver:
+    """
+    link_callback одного документа:
+        resolver = ResourceResolver()
+        try:
+            pisa.CreatePDF(html, dest=out, **resolver.pisa_options())
+        finally:
+            resolver.close()
+    """
+
+    def __init__(self):
+        self.bytes_left = settings.CONVERT_HTML_RESOURCE_MAX_BYTES
+        self.deadline = time.monotonic() + settings.CONVERT_HTML_RESOURCE_TIMEOUT
+        self.refused = 0
+
+    def __call__(self, uri, rel=None) -> str:
+        uri = str(uri or '').strip()
+        try:
+            if time.monotonic() > self.deadline:
+                raise ResourceRefused('время на ресурсы документа истекло')
+            if uri.startswith('data:'):
+                path, size = self._data_uri(uri)
+            else:
+                scheme = urlsplit(uri).scheme.lower()
+                if scheme in ('http', 'https'):
+                    path, size = self._remote(uri)
+                elif scheme in ('', 'file') or len(scheme) == 1:  # 'c:' — диск Windows
+                    path, size = self._local(uri, rel)
+                else:
+                    raise ResourceRefused(f'схема {scheme}: не поддерживается')
+            self._charge(size)
+            return path
+        except ResourceRefused as e:
+            self.refused += 1
+            logger.info('HTML->PDF: ресурс %.100s пропущен: %s', uri, e)
+            return BLOCKED
+
+    def _charge(self, size: int) -> None:
+        if size > self.bytes_left:
+            raise ResourceRefused('превышен бюджет байт документа')
+        self.bytes_left -= size
+
+    def _data_uri(self, uri: str) -> tuple[str, int]:
+        # Ключ — хеш всего URI: мегабайтные шрифты в base64 не держим ключами словаря
+        key = 'data:' + hashlib.sha256(uri.encode('utf-8', 'replace')).hexdigest()
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        header, comma, payload = uri[len('data:'):].partition(',')
+        if not comma:
+            raise ResourceRefused('некорректный data: URI')
+        params = [part for part in header.split(';') if part]
+        is_base64 = bool(params) and params[-1].lower() == 'base64'
+        # Размер проверяется до декодирования: base64 раскрывается в 3/4 длины
+        if (len(payload) * 3 // 4 if is_base64 else len(payload)) > self.bytes_left:
+            raise ResourceRefused('превышен бюджет байт документа')
+        try:
+            data = base64.b64decode(unquote(payload)) if is_base64 else unquote_to_bytes(payload)
+        except (binascii.Error, ValueError):
+            raise ResourceRefused('некорректный base64 в data: URI')
+        mimetype = params[0] if params and '/' in params[0] else 'text/plain'
+        return _cache.put(key, data, _extension(mimetype))
+
+    def _local(self, uri: str, rel) -> tuple[str, int]:
+        parts = urlsplit(uri)
+        path = url2pathname(parts.path) if parts.scheme.lower() == 'file' else unquote(uri.split('?')[0].split('#')[0])
+        asset_dirs = tuple(str(directory) for directory in settings.CONVERT_HTML_ASSET_DIRS)
+        if not asset_dirs or not path:
+            raise ResourceRefused('локальные файлы не разрешены (CONVERT_HTML_ASSET_DIRS)')
+        # rel — путь CSS-файла, из которого пришла ссылка (шрифты и @import рядом с ним);
+        # что бы там ни было, найденный файл всё равно должен лежать в папках ресурсов
+        found = _resolve_asset(path, str(rel) if rel else None, asset_dirs)
+        if found is None:
+            raise ResourceRefused('нет в папках ресурсов')
+        return found
+
+    def _remote(self, uri: str) -> tuple[str, int]:
+        if not settings.CONVERT_HTML_ALLOW_REMOTE:
+            raise ResourceRefused('загрузка из сети запрещена')
+        cached = _cache.get(uri)
+        if cached is not None:
+            return cached
+        chunks = []
+        size = 0
+        try:
+            with urlopen(Request(uri, headers={'User-Agent': USER_AGENT}),
+                         timeout=max(0.1, self.deadline - time.monotonic())) as response:
+                content_type = response.headers.get('Content-Type', '')
+                # timeout urlopen — на одну операцию сокета; общий срок проверяем между кусками
+                while chunk := response.read(READ_CHUNK):
+                    size += len(chunk)
+                    if size > self.bytes_left:
+                        raise ResourceRefused('превышен бюджет байт документа')
+                    if time.monotonic() > self.deadline:
+                        raise ResourceRefused('время на ресурсы документа истекло')
+                    chunks.append(chunk)
+        except (OSError, ValueError) as e:
+            raise ResourceRefused(f'ошибка загрузки: {e}')
+        suffix = Path(urlsplit(uri).path).suffix[:8] or _extension(content_type)
+        return _cache.put(uri, b''.join(chunks), suffix)
+
+    def pisa_options(self) -> dict:
+        """Аргументы pisa.CreatePDF: link_callback и, если xhtml2pdf её поддерживает, политика доступа."""
+        options = {'link_callback': self}
+        if ResourceAccessPolicy is not None:
+            # Сеть ей не нужна: разрешённые http(s)-ресурсы resolver уже положил в кеш.
+            # Размер HTML уже ограничен загрузкой (MAX_FILE_SIZE_MB)
+            options['resource_policy'] = ResourceAccessPolicy.server(
+                base_dir=_cache.directory,
+                extra_roots=tuple(settings.CONVERT_HTML_ASSET_DIRS),
+                allow_remote=False,
+                max_total_bytes=settings.CONVERT_HTML_RESOURCE_MAX_BYTES,
+                max_document_bytes=None,
+            )
+        return options
+
+    def close(self) -> None:
+        _cache.trim()
@@ -1,35 +1,81 @@
 """
 Конвертация изображений: JPG, PNG, WEBP, ICO, BMP, TIFF.
 Использует Pillow (PIL).
+Размер проверяется по заголовку до декодирования (CONVERT_MAX_IMAGE_PIXELS), поэтому
+пиковая память на изображение ограничена: ~4 байта на пиксель плюс копия при смене режима.
 """
 
 import os
 from pathlib import Path
 
+from django.conf import settings
 from PIL import Image
 
 from .base import ConversionError
 
+# Собственная защита Pillow от "бомб" — по тому же порогу, что и наша проверка
+Image.MAX_IMAGE_PIXELS = settings.CONVERT_MAX_IMAGE_PIXELS
 
-def convert_image(source_path: str, source_fmt: str, target_fmt: str, output_dir: Path) -> str:
+# ICO хранит кадры не больше 256x256
+ICO_SIZES = [(16, 16), (32, 32), (48, 48), (64, 64), (128, 128), (256, 256)]
+ICO_MAX_SIZE = 256
+# Режимы, которые Image.reduce() усредняет корректно (палитру и 1 бит — нет)
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA')
+
+
+def _too_large_error(size: tuple[int, int] | None = None) -> ConversionError:
+    max_mp = settings.CONVERT_MAX_IMAGE_PIXELS / 1_000_000
+    if size is None:
+        return ConversionError(f'Изображение слишком большое (максимум {max_mp:.0f} Мп)')
+    width, height = size
+    return ConversionError(
+        f'Изображение слишком большое: {width}x{height} '
+        f'({width * height / 1_000_000:.0f} Мп, максимум {max_mp:.0f} Мп)'
+    )
+
+
+def convert_image(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
     """
     Конвертирует изображение из source_fmt в target_fmt.
     Возвращает путь к созданному файлу.
     """
     try:
         img = Image.open(source_path)
+    except Image.DecompressionBombError:
+        raise _too_large_error()
     except Exception as e:
         raise ConversionError(f'Не удалось открыть изображение: {e}')
 
+    # Image.open читает только заголовок — отказываем до выделения памяти под растр
+    if img.width * img.height > settings.CONVERT_MAX_IMAGE_PIXELS:
+        raise _too_large_error(img.size)
+
+    ico_sizes = None
+    if target_fmt == 'ico':
+        # Набор кадров — от исходного размера, а растр сжимаем целочисленным reduce() до
+        # ресемплинга кадров (меньшая сторона остаётся >= 256) и до смены режима, чтобы
+        # convert() копировал уже уменьшенный растр
+        ico_sizes = [s for s in ICO_SIZES if s[0] <= max(img.size)] or [(ICO_MAX_SIZE, ICO_MAX_SIZE)]
+        factor = min(img.size) // ICO_MAX_SIZE
+        if factor >= 2 and img.mode in REDUCE_MODES:
+            img = img.reduce(factor)
+            factor = 1
+
     # Конвертация в RGB для форматов, не поддерживающих прозрачность
     if target_fmt in ('jpg', 'jpeg') and img.mode in ('RGBA', 'P'):
         img = img.convert('RGB')
     elif target_fmt == 'ico':
         # ICO обычно требует нескольких размеров; сохраняем основной
-        if img.mode == 'RGBA':
-            pass
-        elif img.mode != 'RGB':
+        if img.mode not in ('RGB', 'RGBA'):
             img = img.convert('RGB')
+        if factor >= 2:
+            img = img.reduce(factor)  # палитровые и 1-битные — только после convert()
 
     # Расширение для целевого формата
     ext_map = {'jpg': 'jpg', 'jpeg': 'jpg', 'png': 'png', 'webp': 'webp', 'ico': 'ico', 'bmp': 'bmp', 'tiff': 'tiff'}
@@ -46,9 +92,7 @@ def convert_image(source_path: str, source_fmt: str, target_fmt: str, output_dir
     elif target_fmt == 'webp':
         save_kwargs['quality'] = 90
     elif target_fmt == 'ico':
-        sizes = [(16, 16), (32, 32), (48, 48), (64, 64), (128, 128), (256, 256)]
-        valid_sizes = [s for s in sizes if s[0] <= max(img.size)]
-        img.save(out_path, 'ICO', sizes=valid_sizes if valid_sizes else [(256, 256)], **save_kwargs)
+        img.save(out_path, 'ICO', sizes=ico_sizes, **save_kwargs)
         return str(out_path)
 
     try:
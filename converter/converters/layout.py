@@ -0,0 +1,285 @@
+"""
+Раскладка текста для PDF: реестр шрифтов, ширины символов, перенос строк, страницы.
+TTF-шрифты (по умолчанию DejaVu Sans — с кириллицей) загружаются и регистрируются
+в reportlab один раз на процесс; таблица ширин шрифта строится тогда же,
+поэтому перенос строк — поиск в словаре, а не stringWidth на каждое слово.
+"""
+
+import logging
+import re
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .pdf_writer import StandardFont
+
+try:
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import (
+        FF_NONSYMBOLIC, FF_SYMBOLIC, SUBSETN, TTFont, makeToUnicodeCMap,
+    )
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Стиль -> (имя в reportlab, файлы-кандидаты); первый найденный в FONT_DIRS
+FONT_FILES = {
+    'regular': ('DejaVuSans', ('DejaVuSans.ttf', 'arial.ttf', 'Arial.ttf')),
+    'bold': ('DejaVuSans-Bold', ('DejaVuSans-Bold.ttf', 'arialbd.ttf', 'Arial Bold.ttf')),
+}
+FONT_DIRS = (
+    '/usr/share/fonts/truetype/dejavu',  # fonts-dejavu-core (Debian/Ubuntu, Docker-образ)
+    '/usr/share/fonts/dejavu',
+    '/usr/share/fonts/TTF',
+    'C:/Windows/Fonts',
+    '/Library/Fonts',
+)
+# Без TTF — встроенные шрифты PDF (только латиница)
+STANDARD_FONTS = {'regular': 'Helvetica', 'bold': 'Helvetica-Bold'}
+
+TAB = '    '
+_CONTROL_CHARS = re.compile('[\x00-\x08\x0a-\x1f\x7f]')
+
+_faces = {}
+_faces_lock = threading.Lock()
+
+
+class _Widths(dict):
+    """Ширины символов (код -> тысячные доли кегля); неизвестный символ — ширина по умолчанию."""
+
+    def __init__(self, table: dict, default: float):
+        super().__init__(table)
+        self.default = default
+
+    def __missing__(self, code):
+        return self.default
+
+
+class FontFace:
+    """Шрифт процесса: метрики для раскладки и фабрика шрифта для конкретного PDF."""
+
+    def __init__(self, name: str, widths: _Widths, ttfont=None):
+        self.name = name
+        self.widths = widths
+        self.ttfont = ttfont
+        self.space_width = widths[32]
+
+    def width(self, text: str) -> float:
+        """Ширина text в тысячных долях кегля."""
+        return sum(map(self.widths.__getitem__, map(ord, text)))
+
+    def pdf_font(self, resource: str):
+        if self.ttfont is not None:
+            return TrueTypeFont(self.ttfont, resource)
+        return StandardFont(self.name, resource)
+
+
+def _find_font_file(filenames) -> str | None:
+    dirs = [settings.CONVERT_PDF_FONT_DIR, *FONT_DIRS] if settings.CONVERT_PDF_FONT_DIR else FONT_DIRS
+    for directory in dirs:
+        for filename in filenames:
+            path = Path(directory) / filename
+            if path.is_file():
+                return str(path)
+    return None
+
+
+def _load_face(style: str) -> FontFace:
+    name, filenames = FONT_FILES[style]
+    path = _find_font_file(filenames)
+    if path:
+        ttfont = TTFont(name, path)
+        pdfmetrics.registerFont(ttfont)
+        face = ttfont.face
+        return FontFace(name, _Widths(face.charWidths, face.defaultWidth), ttfont)
+
+    logger.warning('Шрифт %s не найден, PDF будет без кириллицы (Helvetica)', name)
+    name = STANDARD_FONTS[style]
+    table = {}
+    for byte, width in enumerate(pdfmetrics.getFont(name).widths):
+        try:
+            table[ord(bytes([byte]).decode('cp1252'))] = width
+        except UnicodeDecodeError:
+            pass
+    return FontFace(name, _Widths(table, table.get(ord('?'), 556)))
+
+
+def get_face(style: str = 'regular') -> FontFace:
+    """Шрифт стиля 'regular' / 'bold'; загружается один раз на процесс."""
+    with _faces_lock:
+        face = _faces.get(style)
+        if face is None:
+            face = _faces[style] = _load_face(style)
+        return face
+
+
+class TrueTypeFont:
+    """
+    TTF-шрифт одного PDF: встраиваются только использованные символы — подмножествами
+    по 256 (как делает reportlab). Раскладку символов по подмножествам ведёт
+    reportlab TTFont (состояние по ключу self); здесь — кеш перекодировки строк,
+    чтобы уже встречавшиеся символы перекодировались str.translate, без цикла по символам.
+    """
+
+    def __init__(self, ttfont, resource: str):
+        self.ttfont = ttfont
+        self.resource = resource
+        self._table = {}
+        self._known = set()
+        self._runs = None
+        self._subset_count = 0
+
+    def _assign(self, chars: set) -> None:
+        self.ttfont.splitString(''.join(chars), self)
+        state = self.ttfont.state[self]
+        for ch in chars:
+            code = 32 if ch == '\xa0' else ord(ch)
+            self._table[ord(ch)] = chr(state.assignments.get(code, 0))
+        self._known |= chars
+        if len(state.subsets) != self._subset_count:
+            self._subset_count = len(state.subsets)
+            self._runs = re.compile('|'.join(
+                f'[\\u{n << 8:04x}-\\u{(n << 8) + 255:04x}]+' for n in range(self._subset_count)
+            ))
+
+    def show(self, text: str, size: float) -> bytes:
+        """Операторы PDF: выбор подмножества шрифта и вывод строки."""
+        missing = set(text) - self._known
+        if missing:
+            self._assign(missing)
+        mapped = text.translate(self._table)
+        ops = []
+        for run in self._runs.finditer(mapped):
+            chunk = run.group()
+            # Младший байт каждого кода — номер символа в подмножестве
+            data = chunk.encode('utf-16-be')[1::2]
+            ops.append(b'/%s+%d %.2f Tf <%s> Tj' % (
+                self.resource.encode(), ord(chunk[0]) >> 8, size, data.hex().encode(),
+            ))
+        return b' '.join(ops)
+
+    def write_objects(self, writer) -> dict:
+        state = self.ttfont.state.get(self)
+        if state is None:
+            return {}
+        face = self.ttfont.face
+        refs = {}
+        try:
+            for n, subset in enumerate(state.subsets):
+                base_name = (SUBSETN(n) + b'+' + face.name + face.subfontNameX).decode('latin-1')
+                font_data = face.makeSubset(subset)
+                font_file = writer.add_stream(font_data, f' /Length1 {len(font_data)}')
+                descriptor = writer.add_object((
+                    f'<< /Type /FontDescriptor /FontName /{base_name} '
+                    f'/Flags {(face.flags & ~FF_NONSYMBOLIC) | FF_SYMBOLIC} '
+                    f'/FontBBox [{" ".join(f"{v:.0f}" for v in face.bbox)}] '
+                    f'/Ascent {face.ascent:.0f} /Descent {face.descent:.0f} '
+                    f'/CapHeight {face.capHeight:.0f} /ItalicAngle {face.italicAngle:.0f} '
+                    f'/StemV {face.stemV} /MissingWidth {face.defaultWidth:.0f} '
+                    f'/FontFile2 {font_file} 0 R >>'
+                ).encode())
+                to_unicode = writer.add_stream(makeToUnicodeCMap(base_name, subset).encode())
+                widths = ' '.join(f'{face.getCharWidth(code):.0f}' for code in subset)
+                refs[f'{self.resource}+{n}'] = writer.add_object((
+                    f'<< /Type /Font /Subtype /TrueType /BaseFont /{base_name} '
+                    f'/FirstChar 0 /LastChar {len(subset) - 1} /Widths [{widths}] '
+                    f'/FontDescriptor {descriptor} 0 R /ToUnicode {to_unicode} 0 R >>'
+                ).encode())
+        finally:
+            self.discard()
+        return refs
+
+    def discard(self) -> None:
+        """
+        Убирает раскладку этого PDF из общего TTFont: состояние по ключу self иначе
+        живёт, пока жив процесс пула (конвертация прервана ошибкой).
+        """
+        self.ttfont.state.pop(self, None)
+
+
+def wrap_text(text: str, face: FontFace, size: float, max_width: float) -> list[str]:
+    """Перенос по словам в пределах max_width (пт); слово шире строки режется по символам."""
+    limit = max_width * 1000 / size
+    if face.width(text) <= limit:
+        return [text]
+    widths = face.widths
+    space = face.space_width
+    lines = []
+    current, current_width = None, 0.0
+    for word in text.split(' '):
+        word_width = face.width(word)
+        if current is not None and current_width + space + word_width <= limit:
+            current += ' ' + word
+            current_width += space + word_width
+            continue
+        if current is not None:
+            lines.append(current)
+        if word_width <= limit:
+            current, current_width = word, word_width
+            continue
+        start, current_width = 0, 0.0
+        for i, ch in enumerate(word):
+            w = widths[ord(ch)]
+            if current_width + w > limit and i > start:
+                lines.append(word[start:i])
+                start, current_width = i, 0.0
+            current_width += w
+        current = word[start:]
+    lines.append(current)
+    return lines
+
+
+class PageComposer:
+    """
+    Раскладывает абзацы по страницам StreamingPdfWriter: перенос по ширине,
+    новая страница по заполнении; готовая страница сразу уходит в файл.
+    """
+
+    def __init__(self, pdf, margin: float = 50):
+        self.pdf = pdf
+        width, height = pdf.page_size
+        self.left = margin
+        self.top = height - margin
+        self.bottom = margin
+        self.max_width = width - 2 * margin
+        self._fonts = {}
+        self._ops = []
+        self._y = self.top
+
+    def _font(self, face: FontFace):
+        font = self._fonts.get(face.name)
+        if font is None:
+            font = self._fonts[face.name] = face.pdf_font(f'F{len(self._fonts) + 1}')
+            self.pdf.add_font(font)
+        return font
+
+    def add_paragraph(
+        self,
+        text: str,
+        face: FontFace,
+        size: float,
+        leading: float | None = None,
+        space_after: float = 0,
+    ) -> None:
+        leading = leading or size * 1.25
+        font = self._font(face)
+        text = _CONTROL_CHARS.sub('', text.replace('\t', TAB)).rstrip()
+        for line in wrap_text(text, face, size, self.max_width):
+            if self._y - leading < self.bottom:
+                self._new_page()
+            self._y -= leading
+            if line:
+                self._ops.append(b'BT %.2f %.2f Td %s ET\n' % (self.left, self._y, font.show(line, size)))
+        self._y -= space_after
+
+    def _new_page(self) -> None:
+        self.pdf.add_page(b''.join(self._ops))
+        self._ops = []
+        self._y = self.top
+
+    def close(self) -> None:
+        if self._ops:
+            self._new_page()
@@ -0,0 +1,335 @@
+"""
+DOCX -> PDF через LibreOffice: таблицы, картинки и стили сохраняются.
+Запуск soffice на каждый файл стоит секунды, поэтому на хосте работают до
+CONVERT_OFFICE_INSTANCES экземпляров soffice — общих для процессов пула документов
+всех воркеров gunicorn. Экземпляр слушает свой локальный pipe (UNO); процесс пула берёт
+его на один документ (слот 'office', converter.slots), открывает документ и сохраняет
+в PDF в уже работающем офисе. pid экземпляра и число его документов лежат в файле рядом
+со слотом — их читает и меняет только владелец слота.
+Экземпляр запускает тот, кто взял слот и не смог подключиться; soffice живёт в своей
+сессии и переживает процесс пула, который его запустил (pid пишется в файл сразу после
+запуска — следующий владелец слота найдёт и такой экземпляр). Он перезапускается после
+CONVERT_OFFICE_MAX_JOBS документов — до освобождения слота — и если завис (дольше
+CONVERT_OFFICE_TIMEOUT). Свободный экземпляр ждётся не дольше CONVERT_OFFICE_TIMEOUT.
+Без LibreOffice или python-модуля uno get_office() возвращает None — documents.py
+рисует PDF сам (layout).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from converter import slots
+
+from .base import ConversionError
+
+# uno — из пакета LibreOffice (python3-uno), не из PyPI
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+    UNO_AVAILABLE = True
+except ImportError:
+    UNO_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PDF_FILTER = 'writer_pdf_Export'
+START_POLL_INTERVAL = 0.25
+STOP_TIMEOUT = 10
+# После неудачного запуска soffice не пробуем снова столько секунд — конвертации идут через layout
+RETRY_AFTER_FAILURE = 300
+
+_office = None
+_office_lock = threading.Lock()
+
+
+class OfficeError(ConversionError):
+    """soffice не запустился, завис или не смог сохранить документ."""
+    pass
+
+
+def _props(**values) -> tuple:
+    return tuple(PropertyValue(Name=name, Value=value) for name, value in values.items())
+
+
+def _kill(pid: int) -> None:
+    # soffice — скрипт-обёртка над soffice.bin: убиваем всю группу процессов (её лидер — pid)
+    try:
+        if os.name == 'posix':
+            os.killpg(pid, signal.SIGKILL)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _store(desktop, source: str, dest: str, result: dict) -> None:
+    try:
+        doc = desktop.loadComponentFromURL(
+            Path(source).resolve().as_uri(), '_blank', 0,
+            # Без макросов и обновления связей: документ пользовательский
+            _props(Hidden=True, ReadOnly=True, MacroExecutionMode=0, UpdateDocMode=0),
+        )
+        if doc is None:
+            raise OfficeError('документ не открылся')
+        try:
+            doc.storeToURL(Path(dest).resolve().as_uri(), _props(FilterName=PDF_FILTER))
+        finally:
+            doc.close(True)
+    except Exception as e:
+        result['error'] = e
+
+
+class SharedOffice:
+    """
+    Экземпляры soffice хоста: запуск, подключение по UNO, конвертация, перезапуск.
+    Экземпляр конвертирует по одному документу (soffice однопоточный для документов) —
+    это и обеспечивает слот.
+    """
+
+    def __init__(self, binary: str):
+        self.binary = binary
+        self.instances = max(settings.CONVERT_OFFICE_INSTANCES, 1)
+        # Имя pipe общее для всех процессов хоста, но своё у каждой установки (папки слотов)
+        digest = hashlib.sha256(str(settings.CONVERT_SLOTS_DIR).encode()).hexdigest()[:8]
+        self._pipe_prefix = f'convert_office_{digest}'
+        # Подключения этого процесса: номер экземпляра -> (pid soffice, Desktop)
+        self._desktops = {}
+        # soffice, запущенные этим процессом: pid -> Popen (чтобы не оставались зомби)
+        self._children = {}
+
+    def _url(self, index: int) -> str:
+        return f'pipe,name={self._pipe_prefix}_{index};urp;StarOffice.ComponentContext'
+
+    def _state_path(self, index: int) -> Path:
+        return settings.CONVERT_SLOTS_DIR / f'office.{index}.json'
+
+    def _profile_dir(self, index: int) -> Path:
+        # Свой профиль у экземпляра: иначе второй soffice передаёт документ первому и выходит
+        return settings.CONVERT_SLOTS_DIR / f'office.{index}.profile'
+
+    def _read_state(self, index: int) -> dict:
+        try:
+            with open(self._state_path(index), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, index: int, state: dict) -> None:
+        path = self._state_path(index)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def _alive(self, index: int, pid: int) -> bool:
+        """Работает ли экземпляр index с этим pid (после перезагрузки хоста pid в файле чужой)."""
+        child = self._children.get(pid)
+        if child is not None:
+            if child.poll() is None:
+                return True
+            del self._children[pid]
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                return f'--accept={self._url(index)}'.encode() in f.read()
+        except OSError:
+            return True  # нет /proc (не Linux) — проверить нечем
+
+    def _connect(self, index: int, pid: int, timeout: float):
+        """Desktop экземпляра; ждёт до timeout сек, пока soffice начнёт слушать pipe."""
+        cached = self._desktops.get(index)
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                context = resolver.resolve(f'uno:{self._url(index)}')
+                break
+            except NoConnectException:
+                if not self._alive(index, pid):
+                    raise OfficeError('soffice завершился при запуске')
+                if time.monotonic() > deadline:
+                    raise OfficeError('soffice не отвечает')
+                time.sleep(START_POLL_INTERVAL)
+        desktop = context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        self._desktops[index] = (pid, desktop)
+        return desktop
+
+    def _start(self, index: int) -> dict:
+        proc = subprocess.Popen(
+            [
+                self.binary, '--headless', '--invisible', '--nologo', '--nodefault',
+                '--norestore', '--nolockcheck', '--nofirststartwizard',
+                f'-env:UserInstallation={self._profile_dir(index).as_uri()}',
+                f'--accept={self._url(index)}',
+            ],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            # Своя сессия: soffice переживает процесс пула и убивается группой
+            start_new_session=os.name == 'posix',
+        )
+        self._children[proc.pid] = proc
+        state = {'pid': proc.pid, 'jobs': 0}
+        # Сразу: если процесс пула умрёт, пока soffice запускается, его найдёт следующий владелец
+        self._write_state(index, state)
+        try:
+            self._connect(index, proc.pid, settings.CONVERT_OFFICE_START_TIMEOUT)
+        except Exception:
+            self._kill(index, state)
+            raise
+        logger.info('soffice %d запущен (pid %s)', index, proc.pid)
+        return state
+
+    def _kill(self, index: int, state: dict) -> None:
+        """Убивает экземпляр; профиль после аварии не переиспользуется."""
+        self._desktops.pop(index, None)
+        pid = state.get('pid')
+        if pid:
+            if self._alive(index, pid):
+                _kill(pid)
+            child = self._children.pop(pid, None)
+            if child is not None:
+                child.wait()
+        shutil.rmtree(self._profile_dir(index), ignore_errors=True)
+
+    def _stop(self, index: int, state: dict) -> None:
+        """Штатная остановка (перезапуск после CONVERT_OFFICE_MAX_JOBS); не вышел — убиваем."""
+        pid = state['pid']
+        try:
+            self._connect(index, pid, 0).terminate()
+        except Exception:
+            pass  # соединение уже разорвано — процесс убьём ниже
+        self._desktops.pop(index, None)
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while self._alive(index, pid):
+            if time.monotonic() > deadline:
+                self._kill(index, state)
+                return
+            time.sleep(START_POLL_INTERVAL)
+
+    def _ensure_started(self, index: int) -> tuple[dict, object]:
+        """(состояние, Desktop) экземпляра index; вызывать только со взятым слотом."""
+        state = self._read_state(index)
+        pid = state.get('pid')
+        if pid and self._alive(index, pid):
+            try:
+                return state, self._connect(index, pid, 0)
+            except Exception:
+                self._kill(index, state)  # процесс есть, но pipe не отвечает — завис
+        failed_at = state.get('failed_at')
+        if failed_at is not None and time.time() - failed_at < RETRY_AFTER_FAILURE:
+            raise OfficeError('soffice недоступен')
+        try:
+            state = self._start(index)
+        except OfficeError:
+            # Отметка общая для хоста: остальные процессы не пробуют запуск заново
+            self._write_state(index, {'failed_at': time.time()})
+            raise
+        self._write_state(index, state)
+        return state, self._desktops[index][1]
+
+    def _restart(self, index: int, state: dict) -> None:
+        """Перезапуск экземпляра; вызывать только со взятым слотом и до его освобождения."""
+        try:
+            self._stop(index, state)
+            self._write_state(index, {})
+            self._ensure_started(index)
+        except OfficeError as e:
+            logger.warning('LibreOffice не перезапущен: %s', e)
+
+    def start(self) -> None:
+        """
+        Запуск заранее (прогрев процесса пула): поднимает свободный экземпляр, если он
+        не работает. Занятые не ждёт; ошибка только пишется в лог.
+        """
+        slot = slots.try_acquire('office', self.instances)
+        if slot is None:
+            return
+        index, release = slot
+        try:
+            self._ensure_started(index)
+        except OfficeError as e:
+            logger.warning('LibreOffice не запущен: %s', e)
+        finally:
+            release()
+
+    def convert(self, source: str, dest: str, progress=None) -> str:
+        """
+        Сохраняет source в PDF dest, дождавшись свободного экземпляра (не дольше
+        CONVERT_OFFICE_TIMEOUT; progress — JobProgress задачи: отмена прерывает ожидание).
+        OfficeError — все экземпляры заняты, soffice недоступен, завис или упал.
+        """
+        slot = slots.acquire(
+            'office', self.instances, timeout=settings.CONVERT_OFFICE_TIMEOUT,
+            should_stop=progress.is_cancelled if progress is not None else None,
+        )
+        if slot is None:
+            if progress is not None:
+                progress.check_cancelled()
+            raise OfficeError('все экземпляры LibreOffice заняты')
+        index, release = slot
+        try:
+            state, desktop = self._ensure_started(index)
+            result = {}
+            # UNO-вызов нельзя прервать — ждём его в потоке, по таймауту убиваем soffice
+            worker = threading.Thread(target=_store, args=(desktop, source, dest, result), daemon=True)
+            worker.start()
+            worker.join(settings.CONVERT_OFFICE_TIMEOUT)
+            if worker.is_alive():
+                self._kill(index, state)
+                self._write_state(index, {})
+                raise OfficeError('LibreOffice не ответил за отведённое время')
+            if not self._alive(index, state['pid']):
+                self._kill(index, state)
+                self._write_state(index, {})
+                raise OfficeError('soffice аварийно завершился')
+            state['jobs'] += 1
+            self._write_state(index, state)
+            if state['jobs'] >= settings.CONVERT_OFFICE_MAX_JOBS:
+                # Синхронно и со взятым слотом: фоновый поток погиб бы вместе с процессом
+                # пула (max_tasks_per_child, простой) и бросил бы экземпляр наполовину остановленным
+                self._restart(index, state)
+            if 'error' in result:
+                raise OfficeError(str(result['error']))
+            return dest
+        finally:
+            release()
+
+
+def get_office() -> SharedOffice | None:
+    """Экземпляры soffice хоста (запускаются при первой конвертации) или None без LibreOffice/uno."""
+    global _office
+    with _office_lock:
+        if _office is None:
+            if not settings.CONVERT_OFFICE_ENABLED or not UNO_AVAILABLE:
+                return None
+            binary = shutil.which(settings.CONVERT_OFFICE_BINARY)
+            if binary is None:
+                return None
+            _office = SharedOffice(binary)
+        return _office
+
+
+def warm_up() -> None:
+    """Поднимает свободный экземпляр soffice в фоне, не задерживая старт процесса пула."""
+    office = get_office()
+    if office is not None:
+        threading.Thread(target=office.start, daemon=True).start()
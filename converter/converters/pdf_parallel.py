@@ -0,0 +1,179 @@
+"""
+Параллельный PDF -> DOCX по диапазонам страниц.
+Страницы делятся на непрерывные куски; каждый кусок разбирается pdf2docx в отдельном
+процессе, разобранные страницы возвращаются словарями (Page.store()) и собираются
+в один DOCX в текущем процессе (restore + make_docx) — как multi_processing в самом
+pdf2docx, но без JSON-файлов в текущей папке, с прогрессом, отменой и списком страниц.
+Процессы-помощники создаются один раз и живут вместе с процессом пула документов:
+запуск помощника (spawn, django.setup(), импорт pdf2docx/PyMuPDF) стоит ~0.7 с
+процессорного времени, и платить его на каждый большой PDF дороже самого разбора кусков.
+"""
+
+import math
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from converter.progress import JobProgress
+
+from .base import ConversionError
+
+# Кусок меньше не окупает открытие PDF и анализ документа в процессе
+MIN_PAGES_PER_CHUNK = 4
+# Кусков больше, чем процессов: страницы разной сложности, прогресс плавнее
+CHUNKS_PER_WORKER = 3
+# Как часто проверять флаг отмены, пока куски разбираются, сек
+CANCEL_POLL_INTERVAL = 0.5
+MAX_PAGES_SPEC_LENGTH = 200
+
+_RANGE = re.compile(r'^(\d+)?\s*(?:(-)\s*(\d+)?)?$')
+
+_helpers = None
+_helpers_lock = threading.Lock()
+
+
+def parse_pages(spec: str) -> list[tuple[int, int | None]]:
+    """
+    '1-3, 7, 10-' -> [(1, 3), (7, 7), (10, None)]; нумерация с 1, None — до конца.
+    ValueError — некорректная запись.
+    """
+    if len(spec) > MAX_PAGES_SPEC_LENGTH:
+        raise ValueError('Слишком длинный список страниц')
+    ranges = []
+    for part in spec.split(','):
+        match = _RANGE.match(part.strip())
+        if not match or not (match.group(1) or match.group(3)):
+            raise ValueError(f'Некорректный диапазон страниц: {part.strip() or "(пусто)"}')
+        first = int(match.group(1) or 1)
+        last = int(match.group(3)) if match.group(3) else (None if match.group(2) else first)
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f'Некорректный диапазон страниц: {part.strip()}')
+        ranges.append((first, last))
+    return ranges
+
+
+def format_pages(ranges: list[tuple[int, int | None]]) -> str:
+    """Каноническая запись диапазонов (для ключа кеша)."""
+    return ','.join(
+        str(first) if first == last else f'{first}-{last or ""}' for first, last in ranges
+    )
+
+
+def page_indexes(spec: str, page_count: int) -> list[int]:
+    """Индексы страниц (с 0) по записи '1-3,7'; ConversionError — ни одной страницы в документе."""
+    try:
+        ranges = parse_pages(spec)
+    except ValueError as e:
+        raise ConversionError(str(e))
+    indexes = set()
+    for first, last in ranges:
+        indexes.update(range(first - 1, min(last or page_count, page_count)))
+    if not indexes:
+        raise ConversionError(f'В документе {page_count} стр. — указанных страниц нет')
+    return sorted(indexes)
+
+
+def split_chunks(indexes: list[int], workers: int) -> list[list[int]]:
+    count = max(1, min(workers * CHUNKS_PER_WORKER, len(indexes) // MIN_PAGES_PER_CHUNK))
+    size = math.ceil(len(indexes) / count)
+    return [indexes[i:i + size] for i in range(0, len(indexes), size)]
+
+
+def _parse_chunk(source: str, indexes: list[int], config: dict, job_dir: str | None) -> list[dict]:
+    """В процессе-помощнике: разбор страниц куска, результат — Page.store()."""
+    from pdf2docx import Converter
+
+    progress = JobProgress(job_dir) if job_dir else None
+    cv = Converter(source)
+    try:
+        cv.load_pages(pages=indexes).parse_document(**config)
+        for page in cv.pages:
+            if page.skip_parsing:
+                continue
+            if progress is not None:
+                progress.check_cancelled()
+            try:
+                page.parse(**config)
+            except Exception:
+                if not config['ignore_page_error']:
+                    raise
+        return [page.store() for page in cv.pages if page.finalized]
+    finally:
+        cv.close()
+
+
+def _get_helpers(workers: int):
+    """Пул помощников этого процесса; создаётся при первом большом PDF."""
+    global _helpers
+    with _helpers_lock:
+        if _helpers is None:
+            from converter.pools import make_executor
+
+            # Такие же процессы, как в пуле документов (Django, pdf2docx), но без прогрева;
+            # завершаются вместе с процессом пула, даже если его убили
+            _helpers = make_executor('document', workers, warm_up=False, exit_with_parent=True)
+        return _helpers
+
+
+def _drop_helpers(broken) -> None:
+    """Сломанный пул помощников заменяется при следующем обращении (если его ещё не заменили)."""
+    global _helpers
+    if broken is None:
+        return
+    with _helpers_lock:
+        if _helpers is broken:
+            _helpers = None
+    broken.shutdown(wait=False)
+
+
+def _submit_chunks(source: str, chunks: list[list[int]], config: dict, job_dir: str | None, workers: int):
+    """(пул, {future: страниц в куске}); помощник мог упасть между конвертациями — пул пересоздаётся."""
+    for attempt in (1, 2):
+        executor = _get_helpers(workers)
+        try:
+            return executor, {
+                executor.submit(_parse_chunk, source, chunk, config, job_dir): len(chunk) for chunk in chunks
+            }
+        except BrokenProcessPool:
+            _drop_helpers(executor)
+            if attempt == 2:
+                raise
+
+
+def parse_pages_parallel(
+    source: str,
+    indexes: list[int],
+    config: dict,
+    workers: int,
+    progress=None,
+) -> list[dict]:
+    """
+    Разбирает страницы indexes в workers процессах; возвращает Page.store() всех страниц.
+    Прогресс — по готовым кускам, последняя доля остаётся на сборку DOCX.
+    """
+    chunks = split_chunks(indexes, workers)
+    job_dir = str(progress.job_dir) if progress is not None else None
+    stored = []
+    done = 0
+    executor, pending = None, {}
+    try:
+        executor, pending = _submit_chunks(source, chunks, config, job_dir, workers)
+        while pending:
+            finished, _ = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            if progress is not None:
+                progress.check_cancelled()
+            for future in finished:
+                stored.extend(future.result())
+                done += pending.pop(future)
+                if progress is not None:
+                    progress.update(done / (len(indexes) + 1))
+    except BrokenProcessPool:
+        _drop_helpers(executor)
+        raise ConversionError('Процесс разбора PDF аварийно завершился')
+    finally:
+        # Пул общий: после отмены или ошибки снимаем только свои неначатые куски,
+        # начатые сами проверяют флаг отмены
+        for future in pending:
+            future.cancel()
+    return stored
@@ -0,0 +1,150 @@
+"""
+Потоковая запись PDF: каждая страница пишется в файл сразу по заполнении.
+reportlab держит содержимое всех страниц в памяти до save(); здесь в памяти
+остаются только смещения объектов для таблицы xref (8 байт на объект).
+Шрифты и словарь ресурсов пишутся в конце — ссылки в PDF можно делать вперёд,
+а встраивать TTF можно только когда известны все использованные символы.
+"""
+
+import zlib
+from array import array
+
+# A4 в пунктах
+PAGE_SIZE = (595.2756, 841.8898)
+
+# Номера объектов, которые пишутся в конце, но нужны ссылкам страниц
+CATALOG_ID = 1
+PAGES_ID = 2
+RESOURCES_ID = 3
+
+
+def pdf_string(data: bytes) -> bytes:
+    """Литеральная строка PDF: (...) с экранированием."""
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') \
+        .replace(b'\r', b'\\r') + b')'
+
+
+class StandardFont:
+    """Встроенный шрифт PDF (Helvetica и т.п.) в кодировке WinAnsi — без встраивания."""
+
+    def __init__(self, name: str, resource: str):
+        self.name = name
+        self.resource = resource
+
+    def show(self, text: str, size: float) -> bytes:
+        """Операторы PDF: выбор шрифта и вывод строки."""
+        return b'/%s %.2f Tf %s Tj' % (self.resource.encode(), size, pdf_string(text.encode('cp1252', 'replace')))
+
+    def write_objects(self, writer: 'StreamingPdfWriter') -> dict:
+        """Объекты шрифта; возвращает имя ресурса -> номер объекта."""
+        return {self.resource: writer.add_object(
+            f'<< /Type /Font /Subtype /Type1 /BaseFont /{self.name} /Encoding /WinAnsiEncoding >>'.encode()
+        )}
+
+    def discard(self) -> None:
+        """Освобождает состояние шрифта (PDF закрыт или брошен); у встроенного его нет."""
+        pass
+
+
+class StreamingPdfWriter:
+    """
+    with StreamingPdfWriter(path) as pdf:
+        font = pdf.add_font(StandardFont('Helvetica', 'F1'))
+        pdf.add_page(b'BT 50 800 Td ' + font.show('Hello', 12) + b' ET')
+    Шрифт — объект с show(), write_objects() и discard() (StandardFont, layout.TrueTypeFont):
+    discard() вызывается для всех шрифтов и когда PDF записан, и когда запись прервана.
+    """
+
+    def __init__(self, path: str, page_size: tuple = PAGE_SIZE):
+        self.fonts = []
+        self.page_size = page_size
+        self._f = open(path, 'wb')
+        self._offsets = array('Q', [0, 0, 0, 0])  # 0 — свободный объект, 1..3 — зарезервированы
+        self._page_ids = array('L')
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data: bytes) -> None:
+        self._f.write(data)
+
+    def _begin(self, obj_id: int) -> None:
+        self._offsets[obj_id] = self._f.tell()
+        self._write(f'{obj_id} 0 obj\n'.encode())
+
+    def _reserve(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def add_font(self, font):
+        self.fonts.append(font)
+        return font
+
+    def add_object(self, body: bytes, obj_id: int | None = None) -> int:
+        obj_id = obj_id or self._reserve()
+        self._begin(obj_id)
+        self._write(body + b'\nendobj\n')
+        return obj_id
+
+    def add_stream(self, data: bytes, extra: str = '', compress: bool = True) -> int:
+        if compress:
+            data = zlib.compress(data)
+            extra += ' /Filter /FlateDecode'
+        obj_id = self._reserve()
+        self._begin(obj_id)
+        self._write(f'<< /Length {len(data)}{extra} >>\nstream\n'.encode())
+        self._write(data + b'\nendstream\nendobj\n')
+        return obj_id
+
+    def add_page(self, content: bytes) -> None:
+        contents_id = self.add_stream(content)
+        width, height = self.page_size
+        self._page_ids.append(self.add_object(
+            f'<< /Type /Page /Parent {PAGES_ID} 0 R /MediaBox [0 0 {width:.4f} {height:.4f}] '
+            f'/Resources {RESOURCES_ID} 0 R /Contents {contents_id} 0 R >>'.encode()
+        ))
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        try:
+            if not self._page_ids:
+                self.add_page(b'')  # PDF без страниц не откроется
+            font_refs = ' '.join(
+                f'/{name} {obj_id} 0 R'
+                for font in self.fonts for name, obj_id in font.write_objects(self).items()
+            )
+            self.add_object(f'<< /Font << {font_refs} >> >>'.encode(), RESOURCES_ID)
+            # Kids пишется кусками — без одной огромной строки на весь документ
+            self._begin(PAGES_ID)
+            self._write(b'<< /Type /Pages /Kids [')
+            for start in range(0, len(self._page_ids), 1024):
+                self._write(''.join(f'{i} 0 R ' for i in self._page_ids[start:start + 1024]).encode())
+            self._write(f'] /Count {len(self._page_ids)} >>\nendobj\n'.encode())
+            self.add_object(f'<< /Type /Catalog /Pages {PAGES_ID} 0 R >>'.encode(), CATALOG_ID)
+
+            xref_offset = self._f.tell()
+            self._write(f'xref\n0 {len(self._offsets)}\n0000000000 65535 f \n'.encode())
+            for start in range(1, len(self._offsets), 1024):
+                self._write(''.join(
+                    f'{offset:010d} 00000 n \n' for offset in self._offsets[start:start + 1024]
+                ).encode())
+            self._write(
+                f'trailer\n<< /Size {len(self._offsets)} /Root {CATALOG_ID} 0 R >>\n'
+                f'startxref\n{xref_offset}\n%%EOF\n'.encode()
+            )
+        finally:
+            self._f.close()
+            self._discard_fonts()
+
+    def _discard_fonts(self) -> None:
+        for font in self.fonts:
+            font.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            self._discard_fonts()
@@ -0,0 +1,51 @@
+"""
+Чтение текстовых файлов потоком.
+Кодировка определяется по образцу из начала файла (BOM, затем UTF-8, иначе cp1251),
+дальше файл декодируется инкрементально, построчно — память не зависит от размера файла.
+"""
+
+import codecs
+from collections.abc import Iterator
+
+SAMPLE_SIZE = 64 * 1024
+# Строка без переводов длиннее этого отдаётся частями
+MAX_LINE_CHARS = 64 * 1024
+# Не UTF-8 — почти наверняка Windows-1251: пользователи в основном русскоязычные
+FALLBACK_ENCODING = 'cp1251'
+
+# UTF-32 LE раньше UTF-16 LE: их BOM начинаются одинаково
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Кодировка по началу файла."""
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # final=False: образец мог оборваться посреди многобайтового символа
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def iter_text_lines(path: str) -> Iterator[str]:
+    """
+    Строки файла без перевода строки (\\n, \\r\\n и \\r).
+    Нечитаемые байты заменяются на U+FFFD, а не теряются молча.
+    """
+    with open(path, 'rb') as f:
+        encoding = detect_encoding(f.read(SAMPLE_SIZE))
+    with open(path, 'r', encoding=encoding, errors='replace') as f:
+        while True:
+            line = f.readline(MAX_LINE_CHARS)
+            if not line:
+                return
+            yield line.rstrip('\n')
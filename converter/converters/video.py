@@ -1,53 +1,273 @@
 """
 Конвертация видео: MP4, WEBM, MOV, AVI.
 Использует ffmpeg через subprocess.
+Если кодеки исходника допустимы в целевом контейнере — перепаковка (-c copy) без перекодирования.
+Параметры кодирования задаются профилем (VIDEO_PROFILES): тариф задаёт профиль по умолчанию,
+запрос может выбрать другой. Длинные видео кодируются сегментами параллельно (video_parallel).
+aconvert_video — то же для асинхронных views: ffprobe и ffmpeg ожидаются без занятого потока.
 """
 
-import subprocess
+import asyncio
+import threading
 from pathlib import Path
 
-from .base import ConversionError
+from django.conf import settings
 
+from converter import toolchain
+from converter.media_probe import aprobe_media, probe_media, probe_keyframes, first_stream
+from converter.progress import get_progress
 
-def _check_ffmpeg() -> bool:
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+from .base import ConversionError, ConversionCancelled
+from .ffmpeg import arun_ffmpeg, run_ffmpeg
+from .video_parallel import encode_segmented, plan_cut_points
+
+# Кодеки, которые можно положить в контейнер как есть (с расчётом на воспроизведение в браузере)
+REMUX_COMPATIBLE = {
+    'mp4': {'video': {'h264'}, 'audio': {'aac', 'mp3'}},
+    'webm': {'video': {'vp8', 'vp9', 'av1'}, 'audio': {'vorbis', 'opus'}},
+}
+
+# Профили кодирования: скорость <-> размер результата.
+# x264 — preset/crf; VP9 — deadline/cpu-used/crf (-b:v 0 — режим постоянного качества).
+# tile_columns — log2 числа колонок тайлов VP9; вместе с row-mt даёт многопоточность.
+# max_height — ограничение высоты кадра (None — без масштабирования).
+VIDEO_PROFILES = {
+    'fast': {
+        'x264_preset': 'veryfast',
+        'x264_crf': 26,
+        'vp9_deadline': 'realtime',
+        'vp9_cpu_used': 8,
+        'vp9_crf': 36,
+        'tile_columns': 2,
+        'max_height': 720,
+    },
+    'balanced': {
+        'x264_preset': 'medium',
+        'x264_crf': 23,
+        'vp9_deadline': 'good',
+        'vp9_cpu_used': 4,
+        'vp9_crf': 32,
+        'tile_columns': 2,
+        'max_height': 1080,
+    },
+    'small': {
+        'x264_preset': 'slow',
+        'x264_crf': 28,
+        'vp9_deadline': 'good',
+        'vp9_cpu_used': 2,
+        'vp9_crf': 38,
+        'tile_columns': 1,
+        'max_height': 720,
+    },
+}
+DEFAULT_VIDEO_PROFILE = 'balanced'
+
+
+def _can_remux(info: dict | None, target_fmt: str) -> bool:
+    """Видео- и (если есть) аудиопоток уже в кодеках целевого контейнера."""
+    allowed = REMUX_COMPATIBLE.get(target_fmt)
+    video = first_stream(info, 'video')
+    if not allowed or video is None or video['codec_name'] not in allowed['video']:
         return False
+    audio = first_stream(info, 'audio')
+    return audio is None or audio['codec_name'] in allowed['audio']
+
+
+def get_profile(name: str | None) -> dict:
+    return VIDEO_PROFILES.get(name or DEFAULT_VIDEO_PROFILE, VIDEO_PROFILES[DEFAULT_VIDEO_PROFILE])
+
+
+def _needs_downscale(info: dict | None, profile: dict) -> bool:
+    video = first_stream(info, 'video')
+    max_height = profile['max_height']
+    return bool(max_height and video and video['height'] and video['height'] > max_height)
+
+
+def _encode_args(video_codec: str, profile: dict, threads: int | None = None) -> list[str]:
+    """Аргументы видеокодека по профилю."""
+    threads = str(threads or settings.CONVERT_VIDEO_THREADS)
+    if video_codec == 'libvpx-vp9':
+        return [
+            '-c:v', 'libvpx-vp9',
+            '-deadline', profile['vp9_deadline'],
+            '-cpu-used', str(profile['vp9_cpu_used']),
+            '-crf', str(profile['vp9_crf']), '-b:v', '0',
+            '-row-mt', '1',
+            '-tile-columns', str(profile['tile_columns']),
+            '-threads', threads,
+        ]
+    return [
+        '-c:v', 'libx264',
+        '-preset', profile['x264_preset'],
+        '-crf', str(profile['x264_crf']),
+        '-pix_fmt', 'yuv420p',
+        '-threads', threads,
+    ]
+
+
+def _scale_args(info: dict | None, profile: dict) -> list[str]:
+    if not _needs_downscale(info, profile):
+        return []
+    # -2: ширина пропорционально и чётная (требование yuv420p)
+    return ['-vf', f"scale=-2:'min(ih,{profile['max_height']})'"]
+
+
+def _parallel_cut_points(source_path: str, info: dict | None, source_hash: str | None) -> list[float]:
+    """Точки разреза для параллельного кодирования; пустой список — кодируем одним процессом."""
+    min_seconds = settings.CONVERT_VIDEO_PARALLEL_MIN_SECONDS
+    duration = info and info['duration']
+    if not min_seconds or not duration or duration < min_seconds or settings.CONVERT_VIDEO_SEGMENTS < 2:
+        return []
+    keyframes = probe_keyframes(source_path, source_hash)
+    return plan_cut_points(keyframes, duration, settings.CONVERT_VIDEO_SEGMENTS)
+
+
+class _Job:
+    """Общая часть convert_video и aconvert_video: пути, профиль, команды ffmpeg."""
 
+    def __init__(self, source_path: str, target_fmt: str, output_dir: Path, options: dict | None):
+        if not toolchain.has_ffmpeg():
+            raise ConversionError(
+                'Для конвертации видео необходим ffmpeg. '
+                'Скачайте: https://ffmpeg.org/download.html и добавьте в PATH'
+            )
+        options = options or {}
+        self.source_path = source_path
+        self.target_fmt = target_fmt
+        self.source_hash = options.get('source_hash')
+        self.profile = get_profile(options.get('video_profile'))
+        self.progress = get_progress(options)
+        self.out_path = output_dir / f'{Path(source_path).stem}.{target_fmt}'
+        self.container_args = ['-movflags', '+faststart'] if target_fmt == 'mp4' else []
+        self.info = None
 
-def convert_video(source_path: str, source_fmt: str, target_fmt: str, output_dir: Path) -> str:
+    def remux_command(self) -> list[str] | None:
+        """Команда перепаковки без перекодирования или None, если она не подходит."""
+        if not _can_remux(self.info, self.target_fmt) or _needs_downscale(self.info, self.profile):
+            return None
+        return [
+            'ffmpeg', '-y', '-i', self.source_path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', *self.container_args, str(self.out_path),
+        ]
+
+    def codecs(self) -> tuple[str, str]:
+        if self.target_fmt == 'webm':
+            video_codec, audio_codec = 'libvpx-vp9', 'libvorbis'
+        else:
+            video_codec, audio_codec = 'libx264', 'aac'
+        for codec in (video_codec, audio_codec):
+            if not toolchain.has_encoder(codec):
+                raise ConversionError(f'ffmpeg собран без кодека {codec}')
+        return video_codec, audio_codec
+
+    def encode_segmented(self, cut_points: list[float], aborted: threading.Event | None = None) -> str:
+        video_codec, audio_codec = self.codecs()
+        threads = max(1, settings.CONVERT_VIDEO_THREADS // (len(cut_points) + 1))
+        return encode_segmented(
+            self.source_path,
+            self.out_path,
+            cut_points,
+            self.info['duration'],
+            video_args=[*_scale_args(self.info, self.profile), *_encode_args(video_codec, self.profile, threads)],
+            audio_args=['-c:a', audio_codec] if first_stream(self.info, 'audio') else None,
+            container_args=self.container_args,
+            progress=self.progress,
+            aborted=aborted,
+        )
+
+    def encode_command(self) -> list[str]:
+        video_codec, audio_codec = self.codecs()
+        return [
+            'ffmpeg', '-y', '-i', self.source_path,
+            *_scale_args(self.info, self.profile),
+            *_encode_args(video_codec, self.profile),
+            '-c:a', audio_codec,
+            *self.container_args,
+            str(self.out_path),
+        ]
+
+    @property
+    def duration(self) -> float | None:
+        return self.info and self.info['duration']
+
+    def result(self) -> str:
+        if not self.out_path.exists():
+            raise ConversionError('Результирующий файл не был создан')
+        return str(self.out_path)
+
+
+def convert_video(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
     """
     Конвертирует видео через ffmpeg.
+    options['video_profile'] — имя профиля кодирования из VIDEO_PROFILES.
     """
-    if not _check_ffmpeg():
-        raise ConversionError(
-            'Для конвертации видео необходим ffmpeg. '
-            'Скачайте: https://ffmpeg.org/download.html и добавьте в PATH'
-        )
+    job = _Job(source_path, target_fmt, output_dir, options)
+    job.info = probe_media(source_path, job.source_hash) if toolchain.has_ffprobe() else None
+    cmd = job.remux_command()
+    if cmd is not None:
+        try:
+            run_ffmpeg(cmd, 'видео', duration=job.duration, progress=job.progress)
+        except ConversionCancelled:
+            raise
+        except ConversionError:
+            pass  # контейнер не принял потоки как есть — перекодируем
+        else:
+            if job.out_path.exists():
+                return str(job.out_path)
+
+    job.codecs()
+    cut_points = _parallel_cut_points(source_path, job.info, job.source_hash)
+    if cut_points:
+        return job.encode_segmented(cut_points)
+
+    run_ffmpeg(job.encode_command(), 'видео', duration=job.duration, progress=job.progress)
+    return job.result()
 
-    base = Path(source_path).stem
-    out_path = output_dir / f'{base}.{target_fmt}'
-
-    if target_fmt == 'webm':
-        cmd = ['ffmpeg', '-y', '-i', source_path, '-c:v', 'libvpx-vp9', '-c:a', 'libvorbis', str(out_path)]
-    else:
-        cmd = ['ffmpeg', '-y', '-i', source_path, '-c:v', 'libx264', '-c:a', 'aac', str(out_path)]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if result.returncode != 0:
-            err = result.stderr[-500:] if result.stderr else 'Unknown error'
-            raise ConversionError(f'Ошибка ffmpeg: {err}')
-    except subprocess.TimeoutExpired:
-        raise ConversionError('Конвертация видео заняла слишком много времени')
-    except Exception as e:
-        if isinstance(e, ConversionError):
+
+async def aconvert_video(
+    source_path: str,
+    source_fmt: str,
+    target_fmt: str,
+    output_dir: Path,
+    options: dict | None = None,
+) -> str:
+    """
+    convert_video для асинхронного кода.
+    Сегментное кодирование длинных видео само ждёт процессы ffmpeg в потоках — оно уходит в поток целиком;
+    если запрос отменён, поток не отменить, но его процессы ffmpeg останавливаются по событию aborted.
+    Проверки toolchain (_Job, codecs) — тоже в потоке: устаревший кеш запускает ffmpeg.
+    """
+    job = await asyncio.to_thread(_Job, source_path, target_fmt, output_dir, options)
+    has_ffprobe = await asyncio.to_thread(toolchain.has_ffprobe)
+    job.info = await aprobe_media(source_path, job.source_hash) if has_ffprobe else None
+    cmd = job.remux_command()
+    if cmd is not None:
+        try:
+            await arun_ffmpeg(cmd, 'видео', duration=job.duration, progress=job.progress)
+        except ConversionCancelled:
             raise
-        raise ConversionError(f'Ошибка конвертации видео: {e}')
+        except ConversionError:
+            pass  # контейнер не принял потоки как есть — перекодируем
+        else:
+            if job.out_path.exists():
+                return str(job.out_path)
 
-    if not out_path.exists():
-        raise ConversionError('Результирующий файл не был создан')
+    await asyncio.to_thread(job.codecs)
+    cut_points = await asyncio.to_thread(_parallel_cut_points, source_path, job.info, job.source_hash)
+    if cut_points:
+        aborted = threading.Event()
+        try:
+            return await asyncio.to_thread(job.encode_segmented, cut_points, aborted)
+        except asyncio.CancelledError:
+            aborted.set()  # клиент ушёл: сторожа run_ffmpeg убьют процессы сегментов
+            raise
 
-    return str(out_path)
+    cmd = await asyncio.to_thread(job.encode_command)
+    await arun_ffmpeg(cmd, 'видео', duration=job.duration, progress=job.progress)
+    return job.result()
@@ -0,0 +1,167 @@
+"""
+Параллельное кодирование длинного видео по сегментам.
+Исходник режется по ключевым кадрам без перекодирования (segment muxer, -c copy),
+сегменты кодируются одновременно отдельными процессами ffmpeg, аудио — один раз
+целиком, затем всё склеивается concat-демультиплексором без перекодирования.
+Ошибка одного процесса останавливает остальные — сразу, а не после их завершения.
+"""
+
+import shutil
+import threading
+import uuid
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .base import ConversionCancelled, ConversionError
+from .ffmpeg import run_ffmpeg
+
+# Сегмент короче не имеет смысла: запуск ffmpeg и GOP на стыке съедают выигрыш
+MIN_SEGMENT_SECONDS = 10
+
+
+def plan_cut_points(keyframes: list[float], duration: float, segments: int) -> list[float]:
+    """
+    Точки разреза — ключевые кадры, ближайшие к равным долям длительности.
+    Пустой список — резать не по чему (мало ключевых кадров или короткое видео).
+    """
+    segments = min(segments, int(duration // MIN_SEGMENT_SECONDS))
+    if segments < 2 or not keyframes:
+        return []
+    cuts = []
+    for i in range(1, segments):
+        target = duration * i / segments
+        pos = bisect_left(keyframes, target)
+        candidates = keyframes[max(pos - 1, 0):pos + 1]
+        best = min(candidates, key=lambda t: abs(t - target))
+        if best > 0 and (not cuts or best - cuts[-1] >= MIN_SEGMENT_SECONDS) \
+                and duration - best >= MIN_SEGMENT_SECONDS:
+            cuts.append(best)
+    return cuts
+
+
+class _AbortableProgress:
+    """
+    Прогресс задачи, который отменяется ещё и по aborted (упал соседний процесс, ушёл
+    клиент асинхронного запроса): сторож run_ffmpeg убивает ffmpeg.
+    """
+
+    def __init__(self, progress, aborted: threading.Event):
+        self.progress = progress
+        self.aborted = aborted
+
+    def update(self, fraction: float, force: bool = False) -> None:
+        if self.progress is not None:
+            self.progress.update(fraction, force)
+
+    def is_cancelled(self) -> bool:
+        return self.aborted.is_set() or (self.progress is not None and self.progress.is_cancelled())
+
+
+class _SegmentProgress(_AbortableProgress):
+    """Прогресс одного сегмента -> общий прогресс задачи (взвешенный по длительности)."""
+
+    def __init__(self, progress, done: list, index: int, weight: float, aborted: threading.Event):
+        super().__init__(progress, aborted)
+        self.done = done
+        self.index = index
+        self.weight = weight
+
+    def update(self, fraction: float, force: bool = False) -> None:
+        if self.progress is None:
+            return
+        self.done[self.index] = min(max(fraction, 0.0), 1.0) * self.weight
+        self.progress.update(sum(self.done), force)
+
+
+def _raise_first_error(futures: list) -> None:
+    """Ждёт все процессы; исходная ошибка важнее отмен, которые она вызвала."""
+    wait(futures)
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        raise next((e for e in errors if not isinstance(e, ConversionCancelled)), errors[0])
+
+
+def encode_segmented(
+    source_path: str,
+    out_path: Path,
+    cut_points: list[float],
+    duration: float,
+    video_args: list[str],
+    audio_args: list[str] | None,
+    container_args: list[str],
+    progress=None,
+    aborted: threading.Event | None = None,
+) -> str:
+    """
+    Кодирует видео сегментами параллельно.
+    video_args — фильтры и параметры видеокодека, audio_args — параметры аудиокодека
+    (None — в исходнике нет звука). aborted — остановка извне (событие выставляет
+    aconvert_video, когда запрос отменён). Возвращает путь к результату.
+    """
+    aborted = aborted if aborted is not None else threading.Event()
+    whole = _AbortableProgress(progress, aborted)
+    work_dir = out_path.parent / f'.segments-{uuid.uuid4().hex}'
+    work_dir.mkdir()
+    try:
+        # 1. Разрезание по ключевым кадрам — только демультиплексирование, без декодирования
+        run_ffmpeg([
+            'ffmpeg', '-y', '-i', source_path, '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment', '-segment_times', ','.join(f'{t:.6f}' for t in cut_points),
+            '-reset_timestamps', '1', str(work_dir / 'src%04d.mkv'),
+        ], 'видео', progress=whole)
+        sources = sorted(work_dir.glob('src*.mkv'))
+        if not sources:
+            raise ConversionError('Не удалось разрезать видео на сегменты')
+
+        bounds = [0.0, *cut_points, duration]
+        lengths = [max(b - a, 0.0) for a, b in zip(bounds, bounds[1:])]
+        if len(lengths) != len(sources):
+            # Muxer режет по ближайшему ключевому кадру — делим поровну
+            lengths = [duration / len(sources)] * len(sources)
+        total = sum(lengths) or 1.0
+        done = [0.0] * (len(sources) + 1)
+
+        def run(cmd: list[str], sub: _SegmentProgress, duration: float | None = None) -> None:
+            try:
+                run_ffmpeg(cmd, 'видео', duration=duration, progress=sub)
+            except BaseException:
+                aborted.set()
+                raise
+
+        def encode(index: int, src: Path) -> Path:
+            dest = work_dir / f'enc{index:04d}.mkv'
+            sub = _SegmentProgress(progress, done, index, lengths[index] / total, aborted)
+            run(['ffmpeg', '-y', '-i', str(src), *video_args, '-an', str(dest)], sub, lengths[index])
+            return dest
+
+        def encode_audio() -> Path:
+            dest = work_dir / 'audio.mka'
+            # В общую долю готовности звук не входит: она считается по сегментам видео
+            sub = _SegmentProgress(progress, done, len(sources), 0.0, aborted)
+            run(['ffmpeg', '-y', '-i', source_path, '-map', '0:a:0', '-vn', *audio_args, str(dest)], sub)
+            return dest
+
+        # 2. Сегменты и звук — одновременно; сами процессы ffmpeg и есть параллельность
+        workers = len(sources) + (1 if audio_args is not None else 0)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            audio_future = pool.submit(encode_audio) if audio_args is not None else None
+            futures = [pool.submit(encode, index, src) for index, src in enumerate(sources)]
+            _raise_first_error(futures + ([audio_future] if audio_future else []))
+            encoded = [f.result() for f in futures]
+            audio_path = audio_future.result() if audio_future else None
+
+        # 3. Склейка без перекодирования
+        list_path = work_dir / 'segments.txt'
+        list_path.write_text(''.join(f"file '{p.name}'\n" for p in encoded), encoding='utf-8')
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(list_path)]
+        if audio_path is not None:
+            cmd += ['-i', str(audio_path), '-map', '0:v:0', '-map', '1:a:0']
+        cmd += ['-c', 'copy', *container_args, str(out_path)]
+        run_ffmpeg(cmd, 'видео', progress=whole)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not out_path.exists():
+        raise ConversionError('Результирующий файл не был создан')
+    return str(out_path)
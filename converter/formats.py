@@ -3,6 +3,12 @@
 Без хардкода — всё централизовано здесь.
 """
 
+import importlib.util
+from pathlib import Path
+
+# tar.zst — только если установлен zstandard
+ZSTD_AVAILABLE = importlib.util.find_spec('zstandard') is not None
+
 # Категория : список форматов с MIME и расширениями
 FORMATS = {
     'image': {
@@ -35,6 +41,9 @@ FORMATS = {
     'archive': {
         'zip': {'mime': 'application/zip', 'extensions': ['zip']},
         'tar': {'mime': 'application/x-tar', 'extensions': ['tar']},
+        'tar.gz': {'mime': 'application/gzip', 'extensions': ['tar.gz', 'tgz']},
+        'tar.xz': {'mime': 'application/x-xz', 'extensions': ['tar.xz', 'txz']},
+        'tar.zst': {'mime': 'application/zstd', 'extensions': ['tar.zst', 'tzst']},
     },
 }
 
@@ -67,10 +76,49 @@ CONVERSION_MATRIX = {
     'html': ['pdf'],
     'htm': ['pdf'],
     # Archives
-    'zip': ['tar'],
-    'tar': ['zip'],
+    'zip': ['tar', 'tar.gz', 'tar.xz', 'tar.zst'],
+    'tar': ['zip', 'tar.gz', 'tar.xz', 'tar.zst'],
+    'tar.gz': ['zip', 'tar', 'tar.xz', 'tar.zst'],
+    'tar.xz': ['zip', 'tar', 'tar.gz', 'tar.zst'],
+    'tar.zst': ['zip', 'tar', 'tar.gz', 'tar.xz'],
 }
 
+if not ZSTD_AVAILABLE:
+    del FORMATS['archive']['tar.zst']
+    del CONVERSION_MATRIX['tar.zst']
+    for _targets in CONVERSION_MATRIX.values():
+        if 'tar.zst' in _targets:
+            _targets.remove('tar.zst')
+
+# Составные расширения (tar.gz), длинные — первыми
+_MULTI_EXTENSIONS = sorted(
+    (ext for formats in FORMATS.values() for data in formats.values()
+     for ext in data['extensions'] if '.' in ext),
+    key=len, reverse=True,
+)
+
+
+def split_extension(filename: str) -> tuple[str, str]:
+    """
+    Имя файла -> (имя без расширения, расширение в нижнем регистре).
+    Учитывает составные расширения: 'backup.tar.gz' -> ('backup', 'tar.gz').
+    """
+    name = Path(filename).name
+    lower = name.lower()
+    for ext in _MULTI_EXTENSIONS:
+        if lower.endswith('.' + ext) and len(name) > len(ext) + 1:
+            return name[:-len(ext) - 1], ext
+    path = Path(name)
+    return path.stem, path.suffix.lstrip('.').lower()
+
+
+def get_extension(filename: str) -> str:
+    return split_extension(filename)[1]
+
+
+def strip_extension(filename: str) -> str:
+    return split_extension(filename)[0]
+
 
 def get_category(format_key: str) -> str | None:
     """Возвращает категорию формата или None."""
@@ -0,0 +1,132 @@
+"""
+Размер изображения по заголовку файла — без Pillow и без декодирования растра.
+Нужен веб-процессу для проверки лимита пикселей до конвертации: Pillow загружается
+только в процессах пула изображений (converter.pools).
+Форматы — входящие из CONVERSION_MATRIX: JPEG, PNG, WebP, BMP, TIFF (включая BigTIFF).
+"""
+
+import struct
+
+# Столько читаем сразу: заголовки PNG, WebP, BMP целиком помещаются
+HEAD_SIZE = 32
+
+# Маркеры SOF JPEG (размер кадра); C4, C8, CC — DHT, JPG, DAC
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Маркеры без длины: TEM, RST0..RST7
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+# Не больше стольких сегментов до SOF (EXIF, ICC, XMP...) — защита от мусорных файлов
+JPEG_MAX_SEGMENTS = 256
+TIFF_MAX_ENTRIES = 4096
+
+_TIFF_WIDTH = 256
+_TIFF_HEIGHT = 257
+# Тип значения TIFF -> формат struct: SHORT, LONG, LONG8
+_TIFF_TYPES = {3: 'H', 4: 'I', 16: 'Q'}
+
+
+def _jpeg_size(f) -> tuple[int, int] | None:
+    f.seek(2)
+    for _ in range(JPEG_MAX_SEGMENTS):
+        byte = f.read(1)
+        if byte != b'\xff':
+            return None
+        marker = f.read(1)
+        while marker == b'\xff':  # заполняющие байты
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in _JPEG_STANDALONE:
+            continue
+        raw = f.read(2)
+        if len(raw) < 2:
+            return None
+        length = struct.unpack('>H', raw)[0]
+        if code in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            return width, height
+        if code in (0xD9, 0xDA) or length < 2:  # EOI или данные скана без SOF
+            return None
+        f.seek(length - 2, 1)
+    return None
+
+
+def _webp_size(head: bytes) -> tuple[int, int] | None:
+    chunk = head[12:16]
+    if chunk == b'VP8X':
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return width, height
+    if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    return None
+
+
+def _bmp_size(head: bytes) -> tuple[int, int] | None:
+    header_size = struct.unpack('<I', head[14:18])[0]
+    if header_size == 12:  # BITMAPCOREHEADER
+        return struct.unpack('<HH', head[18:22])
+    if header_size >= 40:
+        width, height = struct.unpack('<ii', head[18:26])
+        return abs(width), abs(height)  # высота < 0 — строки сверху вниз
+    return None
+
+
+def _tiff_size(f, head: bytes) -> tuple[int, int] | None:
+    order = '<' if head[:2] == b'II' else '>'
+    big = struct.unpack(f'{order}H', head[2:4])[0] == 43
+    if big:
+        count_fmt, entry_size = 'Q', 20
+        offset = struct.unpack(f'{order}Q', head[8:16])[0]
+    else:
+        count_fmt, entry_size = 'H', 12
+        offset = struct.unpack(f'{order}I', head[4:8])[0]
+
+    # Первый IFD — первая страница: её Pillow и открывает
+    f.seek(offset)
+    raw = f.read(struct.calcsize(count_fmt))
+    if len(raw) < struct.calcsize(count_fmt):
+        return None
+    count = min(struct.unpack(f'{order}{count_fmt}', raw)[0], TIFF_MAX_ENTRIES)
+    entries = f.read(count * entry_size)
+    size = {}
+    for pos in range(0, len(entries) - entry_size + 1, entry_size):
+        entry = entries[pos:pos + entry_size]
+        tag, value_type = struct.unpack(f'{order}HH', entry[:4])
+        if tag not in (_TIFF_WIDTH, _TIFF_HEIGHT) or value_type not in _TIFF_TYPES:
+            continue
+        # Одно значение хранится прямо в записи: после тега, типа и числа значений
+        value_at = 12 if big else 8
+        size[tag] = struct.unpack_from(f'{order}{_TIFF_TYPES[value_type]}', entry, value_at)[0]
+    if _TIFF_WIDTH in size and _TIFF_HEIGHT in size:
+        return size[_TIFF_WIDTH], size[_TIFF_HEIGHT]
+    return None
+
+
+def read_image_size(file_path) -> tuple[int, int] | None:
+    """(ширина, высота) по заголовку; None — формат не распознан или файл повреждён."""
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(HEAD_SIZE)
+            if head.startswith(b'\xff\xd8'):
+                return _jpeg_size(f)
+            if len(head) < HEAD_SIZE:
+                return None
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                return _webp_size(head)
+            if head[:2] == b'BM':
+                return _bmp_size(head)
+            if head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+                return _tiff_size(f, head)
+    except (OSError, struct.error):
+        return None
+    return None
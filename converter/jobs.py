@@ -0,0 +1,243 @@
+"""
+Фоновые задачи конвертации.
+Ограниченный пул потоков выполняет convert_cached вне HTTP-запроса; сама
+конвертация идёт в пулах процессов-конвертеров (converter.pools), поэтому
+потокам задач достаточно ждать результат.
+Состояние задачи хранится в job.json внутри её временной папки,
+поэтому статус виден любому воркеру gunicorn. Прогресс и отмена — converter.progress.
+"""
+
+import contextlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from converter import storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: job.json обновляется под блокировкой только внутри процесса
+    fcntl = None
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_ERROR = 'error'
+STATUS_CANCELLED = 'cancelled'
+
+FINISHED_STATUSES = (STATUS_DONE, STATUS_ERROR, STATUS_CANCELLED)
+
+JOB_FILE = 'job.json'
+# Блокировка обновлений job.json (чтение-изменение-запись из разных воркеров)
+JOB_LOCK_FILE = 'job.lock'
+
+_executor = None
+_executor_lock = threading.Lock()
+# Futures задач этого процесса: ещё не начатую задачу можно снять с очереди
+_futures = {}
+_update_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Пул создаётся лениво — уже после fork воркера gunicorn."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONVERT_JOB_WORKERS, thread_name_prefix='convert-job',
+            )
+        return _executor
+
+
+def submit(fn, *args):
+    """Отправляет функцию в пул задач."""
+    return get_executor().submit(fn, *args)
+
+
+def get_job_dir(job_id: str) -> Path | None:
+    """Папка задачи или None, если job_id некорректен."""
+    try:
+        job_id = str(uuid.UUID(str(job_id)))
+    except ValueError:
+        return None
+    return storage.find_dir(job_id)
+
+
+def read_job(job_id: str) -> dict | None:
+    """Читает состояние задачи. None — задача не найдена."""
+    job_dir = get_job_dir(job_id)
+    if job_dir is None:
+        return None
+    try:
+        with open(job_dir / JOB_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def _job_locked(job_dir: Path):
+    if fcntl is None:
+        with _update_lock:
+            yield
+        return
+    fd = os.open(job_dir / JOB_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # блокировка снимается вместе с дескриптором
+
+
+def update_job(job_dir: Path, expect: dict | None = None, **fields) -> dict | None:
+    """
+    Обновляет job.json атомарно (запись во временный файл + replace) под блокировкой задачи.
+    expect — compare-and-set: обновить, только если поля job.json равны этим значениям
+    (отсутствующее поле — None); иначе ничего не меняется и возвращается None.
+    """
+    job_dir = Path(job_dir)
+    path = job_dir / JOB_FILE
+    with _job_locked(job_dir):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if expect and any(data.get(name) != value for name, value in expect.items()):
+            return None
+        data.update(fields)
+        data['updated_at'] = timezone.now().isoformat()
+        tmp_path = job_dir / f'{JOB_FILE}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    return data
+
+
+def _run_job(
+    job_dir: str,
+    source_path: str,
+    source_ext: str,
+    target_ext: str,
+    source_hash: str | None = None,
+    params: dict | None = None,
+) -> None:
+    """Выполняется в потоке пула задач."""
+    from converter.cache import convert_cached
+    from converter.converters.base import ConversionError, ConversionCancelled
+    from converter.progress import JobProgress
+
+    job_dir = Path(job_dir)
+    progress = JobProgress(job_dir)
+    try:
+        progress.check_cancelled()
+        update_job(job_dir, status=STATUS_RUNNING)
+        result_path = convert_cached(
+            source_path, source_ext, target_ext, job_dir,
+            source_hash=source_hash, params=params, job_dir=str(job_dir),
+        )
+        if not result_path or not Path(result_path).exists():
+            raise ConversionError('Результирующий файл не создан')
+        progress.update(1.0, force=True)
+    except ConversionCancelled:
+        _finish_cancelled(job_dir)
+        return
+    except ConversionError as e:
+        update_job(job_dir, status=STATUS_ERROR, error=str(e))
+        return
+    except Exception as e:
+        update_job(job_dir, status=STATUS_ERROR, error=f'Ошибка сервера: {e}')
+        return
+    update_job(job_dir, status=STATUS_DONE, result_path=str(result_path))
+
+
+def _finish_cancelled(job_dir: Path) -> None:
+    """Статус cancelled; файлы задачи удаляются сразу, остаются только job.json и блокировка папки."""
+    for path in Path(job_dir).iterdir():
+        if path.name in (JOB_FILE, JOB_LOCK_FILE, storage.LOCK_FILE):
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+    update_job(job_dir, status=STATUS_CANCELLED, error='Конвертация отменена')
+
+
+def _on_job_finished(job_dir: Path, future) -> None:
+    """
+    Если задача упала вне _run_job, она не должна навсегда остаться в running.
+    Папка освобождается: результат ждёт скачивания, дальше её уберёт уборщик storage.
+    """
+    _futures.pop(job_dir.name, None)
+    try:
+        _finalize_job(job_dir, future)
+    finally:
+        storage.release(job_dir)
+
+
+def _finalize_job(job_dir: Path, future) -> None:
+    if future.cancelled():
+        _finish_cancelled(job_dir)
+        return
+    exc = future.exception()
+    if exc is None:
+        return
+    job = read_job(job_dir.name) or {}
+    if job.get('status') not in FINISHED_STATUSES:
+        update_job(job_dir, status=STATUS_ERROR, error=f'Ошибка сервера: {exc}')
+
+
+def submit_job(
+    job_dir: Path,
+    source_path: str,
+    source_ext: str,
+    target_ext: str,
+    source_hash: str | None = None,
+    params: dict | None = None,
+) -> str:
+    """
+    Ставит конвертацию в очередь пула. Возвращает job_id (имя папки задачи).
+    source_hash — SHA-256 исходника, посчитанный при загрузке.
+    params — параметры конвертации (см. convert_cached).
+    """
+    job_dir = Path(job_dir)
+    update_job(
+        job_dir,
+        id=job_dir.name,
+        status=STATUS_QUEUED,
+        source_name=Path(source_path).name,
+        target=target_ext,
+        source_sha256=source_hash,
+        params=params,
+        created_at=timezone.now().isoformat(),
+    )
+    future = submit(_run_job, str(job_dir), str(source_path), source_ext, target_ext, source_hash, params)
+    _futures[job_dir.name] = future
+    future.add_done_callback(lambda f: _on_job_finished(job_dir, f))
+    return job_dir.name
+
+
+def cancel_job(job_id: str) -> dict | None:
+    """
+    Отменяет задачу. Ещё не начатая снимается с очереди этого процесса;
+    иначе ставится флаг отмены — процесс пула убьёт ffmpeg / прервёт pdf2docx
+    и удалит файлы задачи. Возвращает состояние задачи (None — не найдена).
+    """
+    from converter.progress import request_cancel
+
+    job = read_job(job_id)
+    if job is None or job['status'] in FINISHED_STATUSES:
+        return job
+    job_dir = get_job_dir(job_id)
+    request_cancel(job_dir)
+    future = _futures.get(job['id'])
+    if future is not None:
+        future.cancel()  # done-callback сам вызовет _finish_cancelled
+    return read_job(job_id)
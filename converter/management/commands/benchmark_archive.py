@@ -0,0 +1,116 @@
+"""Сравнение сжатия TAR: однопоточный tarfile против блочно-параллельного сжатия конвертера."""
+
+import contextlib
+import os
+import random
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from converter.converters.archives import COPY_BUFFER_SIZE, TAR_CODECS, convert_archive
+from converter.converters.base import ConversionError
+from converter.converters.compression import COMPRESS_LEVEL, XZ_PRESET, ZSTD_AVAILABLE, open_writer
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'request', 'response', 'error', 'user', 'file', 'ok')
+
+
+class Command(BaseCommand):
+    help = 'Замерить сжатие TAR однопоточным tarfile и параллельно (tar.gz, tar.xz, tar.zst)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', nargs='?', help='Исходный .tar (по умолчанию — тестовый)')
+        parser.add_argument('--size', type=int, default=256, help='Размер тестового TAR, МБ')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--codec', action='append', choices=('gz', 'xz', 'zst'),
+                            help='Сжатие (можно несколько; по умолчанию — все доступные)')
+
+    def handle(self, *args, **options):
+        codecs = options['codec'] or ['gz', 'xz', 'zst']
+        if 'zst' in codecs and not ZSTD_AVAILABLE:
+            self.stdout.write('zstandard не установлен — tar.zst пропущен')
+            codecs = [c for c in codecs if c != 'zst']
+
+        work_dir = Path(tempfile.mkdtemp(prefix='benchmark_archive-'))
+        try:
+            source = Path(options['source']) if options['source'] else self._make_sample(work_dir, options['size'])
+            size_mb = source.stat().st_size / (1024 * 1024)
+            self.stdout.write(f'Исходный TAR: {size_mb:.0f} МБ, потоков: {options["threads"]}')
+            for codec in codecs:
+                fmt = f'tar.{codec}'
+                assert TAR_CODECS[fmt] == codec
+
+                single_path = work_dir / f'single.{fmt}'
+                started = time.perf_counter()
+                self._compress_single(source, single_path, codec)
+                single = time.perf_counter() - started
+
+                out_dir = work_dir / f'out-{codec}'
+                out_dir.mkdir()
+                started = time.perf_counter()
+                with override_settings(CONVERT_ARCHIVE_THREADS=options['threads']):
+                    try:
+                        parallel_path = Path(convert_archive(str(source), 'tar', fmt, out_dir))
+                    except ConversionError as e:
+                        raise CommandError(str(e))
+                parallel = time.perf_counter() - started
+
+                self.stdout.write(
+                    f'{fmt}: tarfile {single:.1f} с, {self._mb(single_path)} МБ; '
+                    f'параллельно {parallel:.1f} с, {self._mb(parallel_path)} МБ; '
+                    + self.style.SUCCESS(f'ускорение {single / parallel:.2f}x')
+                )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _compress_single(self, source: Path, dest: Path, codec: str) -> None:
+        """Однопоточно, с тем же уровнем сжатия, что и конвертер."""
+        with contextlib.ExitStack() as stack:
+            if codec == 'gz':
+                out = stack.enter_context(tarfile.open(dest, 'w:gz', compresslevel=COMPRESS_LEVEL))
+            elif codec == 'xz':
+                out = stack.enter_context(tarfile.open(dest, 'w:xz', preset=XZ_PRESET))
+            else:
+                # В tarfile нет zstd — однопоточный zstandard
+                raw = stack.enter_context(open(dest, 'wb'))
+                writer = stack.enter_context(open_writer(raw, 'zst', 1))
+                out = stack.enter_context(tarfile.open(fileobj=writer, mode='w'))
+            src_tf = stack.enter_context(tarfile.open(source, 'r|*'))
+            for member in src_tf:
+                src_tf.members = []
+                if member.isfile():
+                    with src_tf.extractfile(member) as src:
+                        out.addfile(member, src)
+                else:
+                    out.addfile(member)
+
+    @staticmethod
+    def _mb(path: Path) -> str:
+        return f'{path.stat().st_size / (1024 * 1024):.1f}'
+
+    def _make_sample(self, work_dir: Path, size_mb: int) -> Path:
+        """Тестовый TAR: журналы (хорошо сжимаются) и немного случайных данных."""
+        rng = random.Random(0)
+        path = work_dir / 'sample.tar'
+        member_size = 16 * 1024 * 1024
+        with tarfile.open(path, 'w', copybufsize=COPY_BUFFER_SIZE) as tf:
+            for i in range(max(1, size_mb * 1024 * 1024 // member_size)):
+                name = f'data/random-{i}.bin' if i % 8 == 7 else f'logs/app-{i}.log'
+                data_path = work_dir / 'member'
+                with open(data_path, 'wb') as f:
+                    if name.endswith('.bin'):
+                        f.write(rng.randbytes(member_size))
+                    else:
+                        written = 0
+                        while written < member_size:
+                            line = (f'{i}:{written} {rng.choice(WORDS)} {rng.choice(WORDS)} '
+                                    f'{rng.randrange(10 ** 6)} {rng.choice(WORDS)}\n').encode()
+                            f.write(line)
+                            written += len(line)
+                tf.add(data_path, arcname=name)
+            (work_dir / 'member').unlink()
+        return path
@@ -0,0 +1,110 @@
+"""
+Время старта и память воркера: ленивый реестр конвертеров против импорта всех конвертеров.
+Каждый замер — в отдельном чистом процессе Python, как у нового воркера gunicorn.
+С --preload воркеры форкаются от мастера, уже загрузившего приложение: приватной у воркера
+остаётся только память, которую он изменил (copy-on-write).
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в чистом процессе: то же, что делает воркер gunicorn до первого запроса
+CHILD = '''
+import gc, json, os, signal, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from config.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns  # urls -> views, как при первом запросе
+if sys.argv[1] == 'eager':
+    from converter.converters import CONVERTERS, load_module
+    for category in CONVERTERS:
+        load_module(category)
+result = {'seconds': time.perf_counter() - started}
+
+def memory_kb(pid):
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line[0].isdigit())
+    except OSError:
+        return None
+    kb = lambda name: int(fields.get(name, '0 kB').split()[0])
+    return {'rss': kb('Rss'), 'private': kb('Private_Clean') + kb('Private_Dirty')}
+
+result['master'] = memory_kb(os.getpid())
+if result['master'] is not None and hasattr(os, 'fork'):
+    # Воркер при --preload: fork от загруженного мастера; gc.collect проходит по всем
+    # объектам и пачкает страницы с ними — худший случай для copy-on-write
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        gc.collect()
+        os.write(w, b'.')
+        time.sleep(60)
+        os._exit(0)
+    os.close(w)
+    os.read(r, 1)
+    result['forked'] = memory_kb(pid)
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+result['modules'] = sorted(m for m in sys.argv[2].split(',') if m in sys.modules)
+print(json.dumps(result))
+'''
+
+# Тяжёлые библиотеки: какие из них оказались в памяти воркера
+HEAVY_MODULES = ('PIL', 'fitz', 'pdf2docx', 'cv2', 'numpy', 'docx', 'reportlab', 'xhtml2pdf', 'zstandard')
+
+
+class Command(BaseCommand):
+    help = 'Замерить время старта и память воркера: ленивые конвертеры против импорта всех'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Воркеров gunicorn для оценки суммарной памяти')
+        parser.add_argument('--repeat', type=int, default=3, help='Запусков на режим (берётся лучший)')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        results = {mode: self._measure(mode, options['repeat']) for mode in ('eager', 'lazy')}
+        for mode, title in (('eager', 'все конвертеры при импорте'), ('lazy', 'ленивый реестр')):
+            result = results[mode]
+            line = f'{title}: старт {result["seconds"]:.2f} с'
+            if result['master']:
+                rss = result['master']['rss'] / 1024
+                line += f', RSS {rss:.0f} МБ'
+                if result.get('forked'):
+                    private = result['forked']['private'] / 1024
+                    line += (
+                        f'; воркеров: {workers} — без --preload ≈ {workers * rss:.0f} МБ, '
+                        f'с --preload ≈ {rss + workers * private:.0f} МБ (приватно на воркер {private:.0f} МБ)'
+                    )
+            self.stdout.write(line)
+            self.stdout.write(f'  библиотеки в воркере: {", ".join(result["modules"]) or "нет"}')
+
+        eager, lazy = results['eager'], results['lazy']
+        summary = f'старт быстрее в {eager["seconds"] / lazy["seconds"]:.1f} раза'
+        if eager['master'] and lazy['master']:
+            summary += f', RSS воркера меньше на {(eager["master"]["rss"] - lazy["master"]["rss"]) / 1024:.0f} МБ'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def _measure(self, mode: str, repeat: int) -> dict:
+        best = None
+        for _ in range(max(1, repeat)):
+            proc = subprocess.run(
+                [sys.executable, '-c', CHILD, mode, ','.join(HEAVY_MODULES)],
+                cwd=Path(settings.BASE_DIR), capture_output=True, text=True,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')},
+            )
+            if proc.returncode != 0:
+                raise CommandError(proc.stderr.strip()[-1000:])
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            if best is None or result['seconds'] < best['seconds']:
+                best = result
+        return best
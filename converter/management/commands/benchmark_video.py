@@ -0,0 +1,85 @@
+"""Сравнение времени кодирования видео: один процесс ffmpeg против параллельных сегментов."""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from converter.converters.base import ConversionError
+from converter.converters.video import VIDEO_PROFILES, convert_video
+
+
+class Command(BaseCommand):
+    help = 'Замерить кодирование видео одним процессом и по сегментам параллельно'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', nargs='?', help='Исходное видео (по умолчанию — тестовое из lavfi)')
+        parser.add_argument('--target', default='webm', choices=('mp4', 'webm'))
+        parser.add_argument('--profile', default='balanced', choices=tuple(VIDEO_PROFILES))
+        parser.add_argument('--segments', type=int, default=settings.CONVERT_VIDEO_SEGMENTS)
+        parser.add_argument('--duration', type=int, default=180,
+                            help='Длительность тестового видео, сек')
+
+    def handle(self, *args, **options):
+        work_dir = Path(tempfile.mkdtemp(prefix='benchmark_video-'))
+        try:
+            source = options['source'] or self._make_sample(work_dir, options['duration'])
+            source_fmt = Path(source).suffix.lstrip('.').lower()
+            # Обоим вариантам доступны все ядра: в параллельном они делятся между сегментами
+            threads = os.cpu_count() or 1
+            runs = [
+                ('один процесс', {
+                    'CONVERT_VIDEO_PARALLEL_MIN_SECONDS': 0,
+                    'CONVERT_VIDEO_THREADS': threads,
+                }),
+                (f'сегменты x{options["segments"]}', {
+                    'CONVERT_VIDEO_PARALLEL_MIN_SECONDS': 1,
+                    'CONVERT_VIDEO_SEGMENTS': options['segments'],
+                    'CONVERT_VIDEO_THREADS': threads,
+                }),
+            ]
+            results = []
+            for name, overrides in runs:
+                out_dir = work_dir / f'out-{len(results)}'
+                out_dir.mkdir()
+                started = time.perf_counter()
+                with override_settings(**overrides):
+                    try:
+                        out_path = convert_video(
+                            str(source), source_fmt, options['target'], out_dir,
+                            options={'video_profile': options['profile']},
+                        )
+                    except ConversionError as e:
+                        raise CommandError(str(e))
+                elapsed = time.perf_counter() - started
+                results.append(elapsed)
+                size_mb = Path(out_path).stat().st_size / (1024 * 1024)
+                self.stdout.write(f'{name}: {elapsed:.1f} с, {size_mb:.1f} МБ')
+
+            self.stdout.write(self.style.SUCCESS(f'Ускорение: {results[0] / results[1]:.2f}x'))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _make_sample(self, work_dir: Path, duration: int) -> Path:
+        """
+        Тестовое видео 1280x720 с ключевым кадром каждые 2 секунды.
+        MPEG-4 Part 2, а не H.264 — чтобы и для mp4 было перекодирование, а не перепаковка.
+        """
+        path = work_dir / 'sample.mp4'
+        cmd = [
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f'testsrc2=duration={duration}:size=1280x720:rate=30',
+            '-f', 'lavfi', '-i', f'sine=duration={duration}',
+            '-c:v', 'mpeg4', '-q:v', '5', '-g', '60', '-c:a', 'aac', '-shortest', str(path),
+        ]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise CommandError(f'Не удалось создать тестовое видео: {e}')
+        return path
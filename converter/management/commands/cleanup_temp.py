@@ -0,0 +1,20 @@
+"""Уборка брошенных временных папок конвертаций (при старте контейнера и вручную)."""
+
+from django.core.management.base import BaseCommand
+
+from converter import storage
+
+
+class Command(BaseCommand):
+    help = 'Удалить временные папки конвертаций без живого владельца и просроченные результаты задач'
+
+    def handle(self, *args, **options):
+        result = storage.sweep()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено папок: {result["removed"]}, освобождено {result["freed_bytes"] / (1024 * 1024):.1f} МБ'
+        ))
+        for name, tier in storage.get_stats().items():
+            free = tier['free_bytes']
+            self.stdout.write(
+                f'{name}: свободно {free / (1024 * 1024):.0f} МБ' if free is not None else f'{name}: недоступен'
+            )
@@ -0,0 +1,31 @@
+"""Статистика и очистка кеша результатов конвертации."""
+
+from django.core.management.base import BaseCommand
+
+from converter import cache
+
+
+class Command(BaseCommand):
+    help = 'Показать статистику кеша результатов конвертации (или очистить его)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Очистить кеш и статистику')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('Кеш очищен'))
+            return
+
+        stats = cache.get_stats()
+        self.stdout.write(f'Попадания: {stats["hits"]}, промахи: {stats["misses"]}')
+        self.stdout.write(f'Hit rate: {stats["hit_rate"]:.1%}')
+        self.stdout.write(f'Сэкономлено: {stats["bytes_saved"] / (1024 * 1024):.1f} МБ')
+        self.stdout.write(
+            f'Вытеснено: {stats["evictions"]} записей '
+            f'({stats["evicted_bytes"] / (1024 * 1024):.1f} МБ)'
+        )
+        self.stdout.write(
+            f'Занято: {stats["size_bytes"] / (1024 * 1024):.1f} из '
+            f'{stats["max_bytes"] / (1024 * 1024):.0f} МБ, записей: {stats["entries"]}'
+        )
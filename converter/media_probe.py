@@ -0,0 +1,285 @@
+"""
+Сведения о медиафайле через ffprobe: контейнер, длительность, потоки, кодеки,
+разрешение и интервал ключевых кадров.
+Результат кешируется по SHA-256 содержимого (в памяти процесса и на диске
+в CONVERT_PROBE_CACHE_DIR), поэтому ffprobe запускается один раз на загрузку.
+Кеш результатов конвертации (converter.cache) его не учитывает и не вытесняет:
+на диске хранится не больше CONVERT_PROBE_CACHE_MAX_ENTRIES записей, лишние — LRU по mtime.
+aprobe_media — то же для асинхронных views (asyncio.create_subprocess_exec).
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+PROBE_TIMEOUT = 30
+# Интервал ключевых кадров оцениваем по началу файла — без чтения всех пакетов
+KEYFRAME_SAMPLE_SECONDS = 60
+MEMORY_CACHE_SIZE = 256
+# Число записей на диске проверяется раз на столько записей этого процесса
+PRUNE_EVERY = 100
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+_puts = 0
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(value) -> float | None:
+    """'30000/1001' -> 29.97."""
+    try:
+        num, _, den = str(value).partition('/')
+        return float(num) / float(den or 1)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _ffprobe_cmd(args: list[str]) -> list[str]:
+    return ['ffprobe', '-v', 'error', *args]
+
+
+def _ffprobe(args: list[str]) -> str | None:
+    try:
+        result = subprocess.run(
+            _ffprobe_cmd(args),
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT,
+        )
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+async def _affprobe(args: list[str]) -> str | None:
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *_ffprobe_cmd(args),
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        return None
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), PROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode != 0:
+        return None
+    return out.decode('utf-8', 'replace')
+
+
+def _keyframes_args(path, sample_seconds: int | None = None) -> list[str]:
+    args = ['-select_streams', 'v:0']
+    if sample_seconds:
+        args += ['-read_intervals', f'%+{sample_seconds}']
+    return [*args, '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', str(path)]
+
+
+def _read_keyframes(path, sample_seconds: int | None = None) -> list[float]:
+    """Времена ключевых кадров первого видеопотока (демультиплексирование, без декодирования)."""
+    return _parse_keyframes(_ffprobe(_keyframes_args(path, sample_seconds)))
+
+
+def _parse_keyframes(out: str | None) -> list[float]:
+    times = []
+    for line in (out or '').splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            value = _to_float(pts_time)
+            if value is not None:
+                times.append(value)
+    return sorted(times)
+
+
+def _probe_cache_path(source_hash: str, kind: str) -> Path:
+    return Path(settings.CONVERT_PROBE_CACHE_DIR) / f'{source_hash}.{kind}.json'
+
+
+def _prune() -> None:
+    """Удаляет самые давно использованные записи сверх CONVERT_PROBE_CACHE_MAX_ENTRIES."""
+    entries = []
+    for entry in os.scandir(settings.CONVERT_PROBE_CACHE_DIR):
+        if entry.name.endswith('.json'):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    excess = len(entries) - settings.CONVERT_PROBE_CACHE_MAX_ENTRIES
+    for _, path in sorted(entries)[:max(excess, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _remember(key: tuple, value) -> None:
+    with _memory_lock:
+        _memory_cache[key] = value
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def _cache_get(source_hash: str, kind: str):
+    """Значение из памяти процесса или с диска; None — промах."""
+    key = (source_hash, kind)
+    with _memory_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+    path = _probe_cache_path(source_hash, kind)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f)
+        os.utime(path)  # LRU: отмечаем использование
+    except (OSError, ValueError):
+        return None
+    if value is not None:
+        _remember(key, value)
+    return value
+
+
+def _cache_put(source_hash: str, kind: str, value) -> None:
+    global _puts
+    if value is None:
+        return
+    path = _probe_cache_path(source_hash, kind)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+    _remember((source_hash, kind), value)
+    with _memory_lock:
+        _puts += 1
+        prune = _puts % PRUNE_EVERY == 0
+    if prune:
+        _prune()
+
+
+def _cached(source_hash: str | None, kind: str, compute):
+    """Кеш по хешу содержимого: память процесса -> диск -> compute()."""
+    if not source_hash:
+        return compute()
+    value = _cache_get(source_hash, kind)
+    if value is None:
+        value = compute()
+        _cache_put(source_hash, kind, value)
+    return value
+
+
+def probe_media(path, source_hash: str | None = None) -> dict | None:
+    """
+    Сведения о файле (с кешем по source_hash):
+    {'format_name', 'duration', 'bit_rate', 'streams': [{'index', 'codec_type', 'codec_name', ...}]}.
+    У видеопотоков есть 'fps' и 'keyframe_interval' (сек, оценка по началу файла).
+    None — ffprobe недоступен или файл не распознан.
+    """
+    return _cached(source_hash, 'streams', lambda: _probe(path))
+
+
+def probe_keyframes(path, source_hash: str | None = None) -> list[float]:
+    """Полный список времён ключевых кадров (для нарезки видео на сегменты)."""
+    return _cached(source_hash, 'keyframes', lambda: _read_keyframes(path)) or []
+
+
+async def aprobe_media(path, source_hash: str | None = None) -> dict | None:
+    """probe_media для асинхронного кода: ffprobe не занимает поток, кеш тот же."""
+    if source_hash:
+        value = await asyncio.to_thread(_cache_get, source_hash, 'streams')
+        if value is not None:
+            return value
+    info = _parse_probe(await _affprobe(_probe_args(path)))
+    video = first_stream(info, 'video')
+    if video is not None:
+        keyframes = _parse_keyframes(await _affprobe(_keyframes_args(path, KEYFRAME_SAMPLE_SECONDS)))
+        video['keyframe_interval'] = _keyframe_interval(keyframes)
+    if source_hash:
+        await asyncio.to_thread(_cache_put, source_hash, 'streams', info)
+    return info
+
+
+def _probe_args(path) -> list[str]:
+    return ['-show_format', '-show_streams', '-of', 'json', str(path)]
+
+
+def _keyframe_interval(keyframes: list[float]) -> float | None:
+    gaps = [b - a for a, b in zip(keyframes, keyframes[1:])]
+    return sum(gaps) / len(gaps) if gaps else None
+
+
+def _probe(path) -> dict | None:
+    info = _parse_probe(_ffprobe(_probe_args(path)))
+    video = first_stream(info, 'video')
+    if video is not None:
+        video['keyframe_interval'] = _keyframe_interval(_read_keyframes(path, KEYFRAME_SAMPLE_SECONDS))
+    return info
+
+
+def _parse_probe(out: str | None) -> dict | None:
+    """Вывод ffprobe -show_format -show_streams -> сведения о файле (без keyframe_interval)."""
+    if out is None:
+        return None
+    try:
+        raw = json.loads(out or '{}')
+    except ValueError:
+        return None
+
+    fmt = raw.get('format', {})
+    streams = []
+    for s in raw.get('streams', []):
+        streams.append({
+            'index': s.get('index'),
+            'codec_type': s.get('codec_type'),
+            'codec_name': s.get('codec_name'),
+            'width': _to_int(s.get('width')),
+            'height': _to_int(s.get('height')),
+            'pix_fmt': s.get('pix_fmt'),
+            'sample_rate': _to_int(s.get('sample_rate')),
+            'channels': _to_int(s.get('channels')),
+            'bit_rate': _to_int(s.get('bit_rate')),
+            'duration': _to_float(s.get('duration')),
+        })
+        if s.get('codec_type') == 'video':
+            streams[-1]['fps'] = _parse_rate(s.get('avg_frame_rate') or s.get('r_frame_rate'))
+
+    return {
+        'format_name': fmt.get('format_name'),
+        'duration': _to_float(fmt.get('duration')),
+        'bit_rate': _to_int(fmt.get('bit_rate')),
+        'streams': streams,
+    }
+
+
+def first_stream(info: dict | None, codec_type: str) -> dict | None:
+    """Первый поток заданного типа ('audio', 'video') или None."""
+    if not info:
+        return None
+    for stream in info['streams']:
+        if stream['codec_type'] == codec_type:
+            return stream
+    return None
@@ -0,0 +1,256 @@
+"""
+Пулы процессов-конвертеров, по одному на категорию.
+Тяжёлые библиотеки (Pillow, pdf2docx/PyMuPDF, reportlab, xhtml2pdf) импортируются
+один раз в долгоживущих процессах пула, а не в веб-воркерах. Падение нативной
+библиотеки убивает процесс пула, а не воркер gunicorn; процессы перезапускаются
+каждые CONVERT_POOL_MAX_TASKS задач (защита от утечек памяти).
+Размер — на хост, а не на воркер gunicorn: задача сначала берёт один из
+CONVERT_POOL_WORKERS[категория] слотов хоста (converter.slots). Процессы пула воркера
+запускаются по требованию и останавливаются после CONVERT_POOL_IDLE_TIMEOUT сек простоя,
+поэтому одновременно работающих конвертеров категории на хосте не больше числа слотов,
+а простаивающие воркеры процессов не держат.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from converter import slots
+from converter.converters import load_module
+from converter.converters.base import ConversionBusy, ConversionError
+
+# Как часто ищутся простаивающие пулы (сек)
+REAP_INTERVAL = 30
+# Как часто долгоживущий процесс-помощник проверяет, жив ли создавший его процесс (сек)
+PARENT_POLL_INTERVAL = 5
+
+_pools = {}
+# Категория -> число выполняемых задач и время завершения последней
+_running = {}
+_last_used = {}
+_pools_lock = threading.Lock()
+_reaper = None
+_reaper_lock = threading.Lock()
+# True внутри процесса пула: там convert_file выполняет конвертацию сам
+_in_pool_worker = False
+
+
+def _exit_with_parent(parent_pid: int) -> None:
+    while True:
+        time.sleep(PARENT_POLL_INTERVAL)
+        if os.getppid() != parent_pid:
+            os._exit(0)  # создатель убит (segfault, OOM) — не остаёмся сиротой
+
+
+def _init_worker(settings_module: str, category: str, warm_up: bool = True, parent_pid: int | None = None) -> None:
+    """Инициализатор процесса пула (spawn): настройка Django и прогрев импортов."""
+    global _in_pool_worker
+    if parent_pid is not None:
+        threading.Thread(target=_exit_with_parent, args=(parent_pid,), daemon=True).start()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    _in_pool_worker = True
+    # Импорт модуля конвертера категории в процессе пула и есть «прогрев»
+    module = load_module(category)
+    # Необязательный прогрев модуля: загрузка шрифтов, запуск soffice и т.п.
+    module_warm_up = getattr(module, 'warm_up', None)
+    if warm_up and module_warm_up is not None:
+        module_warm_up()
+
+
+def in_pool_worker() -> bool:
+    return _in_pool_worker
+
+
+def make_executor(
+    category: str,
+    workers: int,
+    warm_up: bool = True,
+    exit_with_parent: bool = False,
+    **kwargs,
+) -> ProcessPoolExecutor:
+    """
+    Пул процессов (spawn), инициализированных как процессы пула категории.
+    warm_up=False — без прогрева модуля (процессам-помощникам не нужны шрифты и soffice).
+    exit_with_parent — процессы завершаются, если создавший пул процесс убит: для
+    долгоживущих помощников внутри процесса пула.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        # spawn: чистый процесс без унаследованных сокетов и потоков воркера;
+        # max_tasks_per_child с fork не поддерживается
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(
+            os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'), category, warm_up,
+            os.getpid() if exit_with_parent else None,
+        ),
+        **kwargs,
+    )
+
+
+def get_pool(category: str) -> ProcessPoolExecutor:
+    """
+    Пул категории; создаётся лениво (после fork воркера gunicorn). Процесс запускается,
+    только когда задаче не хватило свободного, — их не больше, чем слотов категории
+    этот воркер держал одновременно.
+    """
+    _start_reaper()
+    with _pools_lock:
+        pool = _pools.get(category)
+        if pool is None:
+            workers = settings.CONVERT_POOL_WORKERS[category]
+            pool = make_executor(category, workers, max_tasks_per_child=settings.CONVERT_POOL_MAX_TASKS)
+            _pools[category] = pool
+            _last_used[category] = time.monotonic()
+        return pool
+
+
+def _reap_idle() -> None:
+    """Останавливает пулы, в которых дольше CONVERT_POOL_IDLE_TIMEOUT сек не было задач."""
+    now = time.monotonic()
+    idle = []
+    with _pools_lock:
+        for category, pool in list(_pools.items()):
+            if not _running.get(category) and now - _last_used[category] > settings.CONVERT_POOL_IDLE_TIMEOUT:
+                idle.append(_pools.pop(category))
+    for pool in idle:
+        pool.shutdown(wait=False)
+
+
+def _reaper_loop() -> None:
+    interval = min(REAP_INTERVAL, settings.CONVERT_POOL_IDLE_TIMEOUT)
+    while True:
+        time.sleep(interval)
+        _reap_idle()
+
+
+def _start_reaper() -> None:
+    global _reaper
+    if settings.CONVERT_POOL_IDLE_TIMEOUT <= 0:
+        return
+    with _reaper_lock:
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reaper_loop, name='convert-pool-reaper', daemon=True)
+            _reaper.start()
+
+
+def _replace_broken(category: str, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """
+    Заменяет сломанный пул новым — только если в _pools всё ещё он: о той же поломке
+    узнают все ожидавшие её задачи, и второй сброс убил бы уже пересозданный пул
+    вместе с чужими задачами.
+    """
+    with _pools_lock:
+        if _pools.get(category) is broken:
+            del _pools[category]
+    # Задачи сломанного пула уже завершились с BrokenProcessPool — отменять нечего
+    broken.shutdown(wait=False)
+    return get_pool(category)
+
+
+def _task_done(category: str, release) -> None:
+    release()
+    with _pools_lock:
+        _running[category] -= 1
+        _last_used[category] = time.monotonic()
+
+
+def _submit(category: str, release, fn, *args, **kwargs):
+    """
+    (пул, future) — пул нужен, чтобы при падении заменить именно его.
+    release освобождает слот хоста, когда задача завершится, — даже если её перестали ждать.
+    """
+    try:
+        pool = get_pool(category)
+        try:
+            future = pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            pool = _replace_broken(category, pool)
+            future = pool.submit(fn, *args, **kwargs)
+    except BaseException:
+        release()
+        raise
+    with _pools_lock:
+        _running[category] = _running.get(category, 0) + 1
+    future.add_done_callback(lambda _: _task_done(category, release))
+    return pool, future
+
+
+def _pool_crashed(category: str, pool: ProcessPoolExecutor) -> ConversionError:
+    # Процесс упал посреди задачи (segfault, OOM) — пул пересоздаём для следующих
+    _replace_broken(category, pool)
+    return ConversionError('Процесс конвертации аварийно завершился')
+
+
+def _slot_args(category: str, progress) -> dict:
+    return {
+        'name': f'pool-{category}',
+        'count': settings.CONVERT_POOL_WORKERS[category],
+        'timeout': settings.CONVERT_POOL_WAIT_TIMEOUT,
+        'should_stop': progress.is_cancelled if progress is not None else None,
+    }
+
+
+def _no_slot(progress) -> ConversionBusy:
+    # Слот не получен: задачу отменили или все конвертеры заняты дольше таймаута
+    if progress is not None:
+        progress.check_cancelled()
+    return ConversionBusy('Сервер перегружен: все конвертеры заняты. Повторите попытку позже')
+
+
+def acquire_slot(category: str, progress=None):
+    """
+    Слот хоста категории: ждёт не дольше CONVERT_POOL_WAIT_TIMEOUT, отмена задачи
+    (progress — JobProgress) прерывает ожидание. Возвращает функцию освобождения.
+    ConversionCancelled — задачу отменили, ConversionBusy — слот не освободился.
+    """
+    slot = slots.acquire(**_slot_args(category, progress))
+    if slot is None:
+        raise _no_slot(progress)
+    return slot[1]
+
+
+async def aacquire_slot(category: str, progress=None):
+    """acquire_slot для асинхронного кода."""
+    slot = await slots.aacquire(**_slot_args(category, progress))
+    if slot is None:
+        raise _no_slot(progress)
+    return slot[1]
+
+
+def run_in_pool(category: str, fn, *args, progress=None, **kwargs):
+    """
+    Выполняет fn в пуле категории, дождавшись свободного слота хоста (acquire_slot),
+    и ждёт результат. ConversionError из процесса пула пробрасывается как есть.
+    """
+    release = acquire_slot(category, progress)
+    pool, future = _submit(category, release, fn, *args, **kwargs)
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        raise _pool_crashed(category, pool)
+
+
+async def arun_in_pool(category: str, fn, *args, progress=None, **kwargs):
+    """run_in_pool для асинхронного кода: результат ожидается без занятого потока."""
+    release = await aacquire_slot(category, progress)
+    pool, future = _submit(category, release, fn, *args, **kwargs)
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        raise _pool_crashed(category, pool)
+
+
+def shutdown() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
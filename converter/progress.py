@@ -0,0 +1,70 @@
+"""
+Прогресс и отмена фоновых конвертаций.
+Канал — файлы в папке задачи: progress.json пишет процесс пула, флаг cancel —
+веб-процесс (эндпоинт отмены). Так связь работает между любыми процессами
+и воркерами gunicorn, а в options конвертера передаётся только путь (picklable).
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from converter.converters.base import ConversionCancelled
+
+PROGRESS_FILE = 'progress.json'
+CANCEL_FILE = 'cancel'
+# Не чаще раза в WRITE_INTERVAL секунд — ffmpeg сообщает о прогрессе дважды в секунду
+WRITE_INTERVAL = 0.5
+
+
+class JobProgress:
+    """Прогресс задачи (доля 0..1) и проверка флага отмены."""
+
+    def __init__(self, job_dir):
+        self.job_dir = Path(job_dir)
+        self._written_at = 0.0
+        self._value = None
+
+    def update(self, fraction: float, force: bool = False) -> None:
+        fraction = min(max(fraction, 0.0), 1.0)
+        now = time.monotonic()
+        if not force and (now - self._written_at < WRITE_INTERVAL or fraction == self._value):
+            return
+        self._written_at = now
+        self._value = fraction
+        path = self.job_dir / PROGRESS_FILE
+        # Пишут и потоки одного процесса (сегменты видео) — у каждого свой временный файл
+        tmp_path = path.with_name(f'{PROGRESS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'progress': round(fraction, 4)}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # папку задачи уже удалили — прогресс никому не нужен
+
+    def is_cancelled(self) -> bool:
+        return (self.job_dir / CANCEL_FILE).exists()
+
+    def check_cancelled(self) -> None:
+        if self.is_cancelled():
+            raise ConversionCancelled('Конвертация отменена')
+
+
+def get_progress(options: dict | None) -> JobProgress | None:
+    """JobProgress для options['job_dir'] или None (синхронная конвертация)."""
+    job_dir = (options or {}).get('job_dir')
+    return JobProgress(job_dir) if job_dir else None
+
+
+def read_progress(job_dir) -> float | None:
+    try:
+        with open(Path(job_dir) / PROGRESS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('progress')
+    except (OSError, ValueError):
+        return None
+
+
+def request_cancel(job_dir) -> None:
+    (Path(job_dir) / CANCEL_FILE).touch()
@@ -0,0 +1,46 @@
+"""
+HTTP-ответы для отдачи результатов конвертации.
+"""
+
+import asyncio
+
+from django.http import FileResponse
+
+from converter import storage
+
+
+class TempDirFileResponse(FileResponse):
+    """
+    Потоковая отдача файла с диска (wsgi.file_wrapper / sendfile).
+    Временная папка конвертации удаляется после close() —
+    то есть только после отправки последнего байта (в фоне, storage.remove).
+    """
+
+    block_size = 64 * 1024
+
+    def __init__(self, *args, cleanup_dir=None, **kwargs):
+        self.cleanup_dir = cleanup_dir
+        super().__init__(*args, **kwargs)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.cleanup_dir is not None:
+                storage.remove(self.cleanup_dir)
+
+
+class AsyncTempDirFileResponse(TempDirFileResponse):
+    """
+    TempDirFileResponse для асинхронных views под ASGI: файл читается кусками в потоке,
+    цикл событий не блокируется. Синхронный итератор файла Django под ASGI
+    сначала прочитал бы в память весь результат.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.streaming_content = self._read_blocks(self.file_to_stream)
+
+    async def _read_blocks(self, f):
+        while block := await asyncio.to_thread(f.read, self.block_size):
+            yield block
@@ -0,0 +1,208 @@
+"""
+Возобновляемая загрузка больших файлов частями.
+Протокол: init -> PUT пронумерованных частей (можно параллельно, в любом порядке)
+-> complete. Части лежат в CONVERT_TEMP_DIR/uploads/<id>/, при завершении
+собираются на месте (дописываются в первую часть) и переносятся в папку конвертации
+с проверкой размера и SHA-256.
+Место под ещё не принятые части зарезервировано с init (pending_bytes учитывается
+в storage.admit) до завершения загрузки или её удаления уборщиком.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from converter import storage
+
+META_FILE = 'upload.json'
+# Собираемый файл: первая часть, в которую дописываются остальные
+ASSEMBLY_FILE = 'assembly'
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки (сообщение показывается пользователю)."""
+    pass
+
+
+def _uploads_root() -> Path:
+    return Path(settings.CONVERT_TEMP_DIR) / storage.UPLOADS_DIR
+
+
+def _upload_dir(upload_id: str) -> Path | None:
+    try:
+        upload_id = str(uuid.UUID(str(upload_id)))
+    except ValueError:
+        return None
+    return _uploads_root() / upload_id
+
+
+def _chunk_path(upload_dir: Path, index: int) -> Path:
+    return upload_dir / 'chunks' / f'{index:06d}'
+
+
+def create_upload(filename: str, size: int, sha256: str | None = None) -> dict:
+    """Регистрирует загрузку и возвращает её описание (upload.json)."""
+    filename = Path(filename.replace('\\', '/')).name.strip()
+    if filename in ('', '.', '..'):
+        raise UploadError('Некорректное имя файла')
+    if size <= 0:
+        raise UploadError('Некорректный размер файла')
+
+    chunk_size = settings.CONVERT_UPLOAD_CHUNK_SIZE
+    upload_id = str(uuid.uuid4())
+    upload_dir = _uploads_root() / upload_id
+    (upload_dir / 'chunks').mkdir(parents=True, exist_ok=True)
+
+    meta = {
+        'id': upload_id,
+        'filename': filename,
+        'size': size,
+        'sha256': (sha256 or '').lower() or None,
+        'chunk_size': chunk_size,
+        'total_chunks': (size + chunk_size - 1) // chunk_size,
+        'created_at': timezone.now().isoformat(),
+    }
+    with open(upload_dir / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return meta
+
+
+def get_upload(upload_id: str) -> dict | None:
+    upload_dir = _upload_dir(upload_id)
+    if upload_dir is None:
+        return None
+    try:
+        with open(upload_dir / META_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pending_bytes() -> int:
+    """Сколько байт ещё придёт в незавершённые загрузки: объявленный размер минус принятые части."""
+    try:
+        uploads = os.scandir(_uploads_root())
+    except FileNotFoundError:
+        return 0
+    total = 0
+    with uploads:
+        for entry in uploads:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if os.path.exists(Path(entry.path) / ASSEMBLY_FILE):
+                continue  # части уже приняты и собираются
+            try:
+                with open(Path(entry.path) / META_FILE, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                received = sum(1 for name in os.listdir(Path(entry.path) / 'chunks') if name.isdigit())
+            except (OSError, ValueError):
+                continue  # загрузку собрали или удалили, пока смотрели
+            total += max(meta['size'] - received * meta['chunk_size'], 0)
+    return total
+
+
+def received_chunks(meta: dict) -> list[int]:
+    """Номера уже принятых частей — клиент досылает только недостающие."""
+    chunks_dir = _upload_dir(meta['id']) / 'chunks'
+    return sorted(int(p.name) for p in chunks_dir.iterdir() if p.name.isdigit())
+
+
+def expected_chunk_size(meta: dict, index: int) -> int:
+    if index == meta['total_chunks'] - 1:
+        return meta['size'] - meta['chunk_size'] * index
+    return meta['chunk_size']
+
+
+def write_chunk(meta: dict, index: int, stream, length: int, sha256: str | None = None) -> None:
+    """
+    Потоково пишет часть из stream (тело PUT-запроса).
+    Часть появляется под своим номером только целиком и с верным размером/хешем,
+    поэтому повтор после обрыва безопасен.
+    """
+    if not 0 <= index < meta['total_chunks']:
+        raise UploadError('Некорректный номер части')
+    expected = expected_chunk_size(meta, index)
+    if length != expected:
+        raise UploadError(f'Неверный размер части: {length}, ожидалось {expected}')
+
+    final_path = _chunk_path(_upload_dir(meta['id']), index)
+    part_path = final_path.with_name(f'{final_path.name}.{uuid.uuid4().hex}.part')
+    hasher = hashlib.sha256()
+    written = 0
+    try:
+        with open(part_path, 'wb') as f:
+            while written < expected:
+                data = stream.read(min(READ_BLOCK_SIZE, expected - written))
+                if not data:
+                    break
+                f.write(data)
+                hasher.update(data)
+                written += len(data)
+        if written != expected:
+            raise UploadError('Часть загружена не полностью')
+        if sha256 and hasher.hexdigest() != sha256.lower():
+            raise UploadError('Контрольная сумма части не совпадает')
+        os.replace(part_path, final_path)
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+
+
+def _append_chunks(meta: dict, upload_dir: Path, assembly_path: Path) -> tuple[int, str]:
+    """Дописывает части 1.. в собираемый файл, удаляя каждую сразу; (размер, sha256)."""
+    hasher = hashlib.sha256()
+    with open(assembly_path, 'r+b') as out:
+        for data in iter(lambda: out.read(READ_BLOCK_SIZE), b''):
+            hasher.update(data)
+        for index in range(1, meta['total_chunks']):
+            chunk_path = _chunk_path(upload_dir, index)
+            with open(chunk_path, 'rb') as f:
+                for data in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                    out.write(data)
+                    hasher.update(data)
+            chunk_path.unlink()
+        return out.tell(), hasher.hexdigest()
+
+
+def assemble(meta: dict, dest_dir: Path, sha256: str | None = None) -> tuple[Path, str]:
+    """
+    Собирает файл на месте — части дописываются в первую и сразу удаляются, сверх
+    загруженного нужно место на одну часть — и переносит его в dest_dir/<filename>
+    (папка на диске: storage.create_dir(..., disk=True)). Проверяет размер и SHA-256:
+    из init и/или sha256 из complete (клиент считает хеш, пока отправляет части).
+    Возвращает (путь к файлу, sha256). Папка загрузки удаляется.
+    Не хватает частей — UploadError, загрузку можно продолжить; не сошёлся хеш —
+    UploadError, загрузка удалена (файл нужно отправить заново).
+    """
+    missing = sorted(set(range(meta['total_chunks'])) - set(received_chunks(meta)))
+    if missing:
+        raise UploadError(f'Не загружены части: {missing[:20]}')
+
+    upload_dir = _upload_dir(meta['id'])
+    assembly_path = upload_dir / ASSEMBLY_FILE
+    try:
+        # Первая часть становится собираемым файлом: повторный complete её уже не найдёт
+        os.replace(_chunk_path(upload_dir, 0), assembly_path)
+    except FileNotFoundError:
+        raise UploadError('Загрузка уже собирается')
+
+    try:
+        size, digest = _append_chunks(meta, upload_dir, assembly_path)
+        if size != meta['size']:
+            raise UploadError('Размер собранного файла не совпадает')
+        expected = {value.lower() for value in (meta['sha256'], sha256) if value}
+        if expected and expected != {digest}:
+            raise UploadError('Контрольная сумма файла не совпадает, загрузите файл заново')
+        dest_path = Path(dest_dir) / meta['filename']
+        shutil.move(assembly_path, dest_path)  # та же файловая система — переименование
+    finally:
+        # Частично собранную загрузку не продолжить
+        storage.remove(upload_dir)
+    return dest_path, digest
@@ -0,0 +1,110 @@
+"""
+Слоты на весь хост: не больше count одновременных владельцев имени name,
+сколько бы ни было воркеров gunicorn и их пулов.
+Слот — flock на файле CONVERT_SLOTS_DIR/<name>.<номер>.lock. Убитый процесс
+освобождает свои слоты вместе с дескрипторами, уборка не нужна.
+Без fcntl (Windows) слоты считаются только внутри процесса.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: слоты только внутри процесса
+    fcntl = None
+
+# Как часто ждущий проверяет, не освободился ли слот (сек)
+POLL_INTERVAL = 0.05
+
+_local_slots = {}
+_local_slots_guard = threading.Lock()
+
+
+def _try_local(name: str, index: int):
+    with _local_slots_guard:
+        lock = _local_slots.setdefault((name, index), threading.Lock())
+    return lock.release if lock.acquire(blocking=False) else None
+
+
+def _try_flock(name: str, index: int):
+    fd = os.open(settings.CONVERT_SLOTS_DIR / f'{name}.{index}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    except BaseException:
+        os.close(fd)
+        raise
+    return lambda: os.close(fd)  # блокировка снимается вместе с дескриптором
+
+
+def try_acquire(name: str, count: int):
+    """(номер слота, функция освобождения) или None, если все count слотов заняты."""
+    if fcntl is not None:
+        settings.CONVERT_SLOTS_DIR.mkdir(parents=True, exist_ok=True)
+    try_one = _try_flock if fcntl is not None else _try_local
+    # Со случайного слота: ждущие не толпятся на первом
+    start = random.randrange(count)
+    for offset in range(count):
+        index = (start + offset) % count
+        release = try_one(name, index)
+        if release is not None:
+            return index, release
+    return None
+
+
+def acquire(name: str, count: int, timeout: float | None = None, should_stop=None):
+    """
+    Ждёт свободный слот из count. Возвращает (номер слота, функция освобождения);
+    освобождать можно из любого потока.
+    timeout — сколько ждать (сек), should_stop — функция без аргументов (например,
+    JobProgress.is_cancelled): по истечении timeout или если она вернула True — None.
+    """
+    count = max(count, 1)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        slot = try_acquire(name, count)
+        if slot is not None:
+            return slot
+        if should_stop is not None and should_stop():
+            return None
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def _release_later(future) -> None:
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result()[1]()
+
+
+async def aacquire(name: str, count: int, timeout: float | None = None, should_stop=None):
+    """
+    acquire без блокировки цикла событий: опрос в asyncio.sleep, поток занимается только
+    на одну попытку. Ждущие запросы не держат потоки executor'а, нужные остальным.
+    timeout и should_stop — как у acquire: None, если слот так и не освободился.
+    """
+    count = max(count, 1)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        attempt = asyncio.ensure_future(asyncio.to_thread(try_acquire, name, count))
+        try:
+            slot = await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            # Запрос отменён, а попытка могла взять слот — освобождаем его сразу
+            attempt.add_done_callback(_release_later)
+            raise
+        if slot is not None:
+            return slot
+        if should_stop is not None and should_stop():
+            return None
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+        await asyncio.sleep(POLL_INTERVAL)
@@ -0,0 +1,347 @@
+"""
+Временные папки конвертаций: загрузка, результат, папка фоновой задачи.
+Два уровня: задача с оценкой объёма до CONVERT_TEMP_RAM_MAX_MB попадает в CONVERT_TEMP_RAM_DIR
+(tmpfs), остальные и не поместившиеся в RAM — на диск, в CONVERT_TEMP_DIR.
+Допуск (admit): запрос принимается, только если после него на уровне останется не меньше
+минимума свободного места; иначе сразу StorageFull -> 503 с Retry-After (поток запроса
+место не ждёт). Незавершённые возобновляемые загрузки резервируют на диске ещё не
+принятую часть объявленного размера (resumable.pending_bytes) — на всём хосте.
+Папки удаляются в фоновом потоке (remove) — ответ не ждёт rmtree.
+Живая папка держит flock на своём .lock. Если процесс убит (таймаут gunicorn, OOM),
+блокировку никто не держит, и уборщик (sweep) удаляет папку — при старте
+(manage.py cleanup_temp) и каждые CONVERT_TEMP_JANITOR_INTERVAL сек в каждом воркере.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: владелец папки неизвестен, уборка только по возрасту
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = '.lock'
+JANITOR_LOCK_FILE = '.janitor.lock'
+# Части возобновляемых загрузок (converter.resumable) — своя папка на диске
+UPLOADS_DIR = 'uploads'
+RETRY_AFTER_SECONDS = 30
+
+# Папки этого процесса: путь -> {'fd', 'reserved', 'tier', 'created'}
+_held = {}
+_held_lock = threading.Lock()
+_cleaner = None
+_janitor = None
+_start_lock = threading.Lock()
+
+
+class StorageFull(Exception):
+    """Нет места под временные файлы: запрос стоит повторить позже."""
+    pass
+
+
+def _tiers() -> list[dict]:
+    """Уровни хранения — от быстрого к медленному."""
+    tiers = []
+    if settings.CONVERT_TEMP_RAM_DIR:
+        tiers.append({
+            'name': 'ram',
+            'root': Path(settings.CONVERT_TEMP_RAM_DIR),
+            'min_free': settings.CONVERT_TEMP_RAM_MIN_FREE_BYTES,
+            'max_job': settings.CONVERT_TEMP_RAM_MAX_BYTES,
+        })
+    tiers.append({
+        'name': 'disk',
+        'root': Path(settings.CONVERT_TEMP_DIR),
+        'min_free': settings.CONVERT_TEMP_MIN_FREE_BYTES,
+        'max_job': None,
+    })
+    return tiers
+
+
+def _estimate(size: int | None) -> int:
+    """Сколько места займёт задача: исходник, результат и промежуточные файлы."""
+    return int(max(size or 0, 0) * settings.CONVERT_TEMP_SIZE_FACTOR)
+
+
+def _reserved(tier_name: str) -> int:
+    from converter.resumable import pending_bytes
+
+    with _held_lock:
+        reserved = sum(held['reserved'] for held in _held.values() if held['tier'] == tier_name)
+    if tier_name == 'disk':
+        # Части загрузок пишутся в CONVERT_TEMP_DIR/uploads
+        reserved += pending_bytes()
+    return reserved
+
+
+def _free_bytes(root: Path) -> int:
+    root.mkdir(parents=True, exist_ok=True)
+    return shutil.disk_usage(root).free
+
+
+def _pick_tier(size: int | None) -> dict | None:
+    need = _estimate(size)
+    for tier in _tiers():
+        if tier['max_job'] is not None and need > tier['max_job']:
+            continue
+        try:
+            free = _free_bytes(tier['root'])
+        except OSError:
+            continue  # tmpfs не смонтирован — обходимся диском
+        if free - _reserved(tier['name']) - need >= tier['min_free']:
+            return tier
+    return None
+
+
+def admit(size: int | None) -> None:
+    """
+    Допуск запроса с файлами общим размером size (байт; None — неизвестен).
+    StorageFull — места нет: клиент повторит после Retry-After.
+    """
+    if _pick_tier(size) is None:
+        raise StorageFull('Сервер перегружен: не хватает места для файлов. Повторите попытку позже')
+
+
+def _lock_dir(path: Path):
+    if fcntl is None:
+        return None
+    fd = os.open(path / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return fd
+
+
+def create_dir(size: int | None = None, disk: bool = False) -> Path:
+    """
+    Новая папка конвертации на подходящем уровне; оценка объёма резервируется до
+    release()/remove(). Допуск проверяется раньше (admit): здесь папка создаётся всегда,
+    без места на уровнях — на диске. disk — только на диске (файл переносится туда
+    из CONVERT_TEMP_DIR без копирования).
+    """
+    start_janitor()
+    tier = None if disk else _pick_tier(size)
+    tier = tier or _tiers()[-1]
+    path = tier['root'] / str(uuid.uuid4())
+    path.mkdir(parents=True)
+    with _held_lock:
+        _held[str(path)] = {
+            'fd': _lock_dir(path),
+            'reserved': _estimate(size),
+            'tier': tier['name'],
+            'created': time.monotonic(),
+        }
+    return path
+
+
+def find_dir(name: str) -> Path:
+    """Папка name на любом уровне (папки задач ищутся по job_id); не найдена — путь на диске."""
+    for tier in _tiers():
+        path = tier['root'] / name
+        if path.is_dir():
+            return path
+    return Path(settings.CONVERT_TEMP_DIR) / name
+
+
+def release(path) -> None:
+    """Процесс больше не работает с папкой (задача завершена): снимаются резерв и блокировка."""
+    with _held_lock:
+        held = _held.pop(str(path), None)
+    if held is not None and held['fd'] is not None:
+        os.close(held['fd'])
+
+
+def _get_cleaner() -> ThreadPoolExecutor:
+    global _cleaner
+    with _start_lock:
+        if _cleaner is None:
+            _cleaner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='convert-cleanup')
+        return _cleaner
+
+
+def remove(path) -> None:
+    """Освобождает папку и удаляет её в фоновом потоке."""
+    release(path)
+    try:
+        _get_cleaner().submit(shutil.rmtree, path, True)
+    except RuntimeError:
+        shutil.rmtree(path, ignore_errors=True)  # интерпретатор завершается
+
+
+def _last_modified(path: Path) -> float:
+    """Последнее изменение папки или её job.json (статус задачи)."""
+    from converter.jobs import JOB_FILE
+
+    mtimes = [path.stat().st_mtime]
+    try:
+        mtimes.append((path / JOB_FILE).stat().st_mtime)
+    except OSError:
+        pass
+    return max(mtimes)
+
+
+def _upload_modified(path: Path) -> float:
+    """Последняя активность возобновляемой загрузки: части пишутся в chunks/."""
+    try:
+        return max(path.stat().st_mtime, (path / 'chunks').stat().st_mtime)
+    except OSError:
+        return path.stat().st_mtime
+
+
+def _owned(path: Path, age: float) -> bool:
+    """Держит ли папку живой процесс (flock на .lock)."""
+    if fcntl is None:
+        return age < settings.CONVERT_TEMP_MAX_AGE
+    try:
+        fd = os.open(path / LOCK_FILE, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)  # наша пробная блокировка снимается вместе с дескриптором
+    return False
+
+
+def _job_finished(path: Path) -> bool:
+    from converter.jobs import FINISHED_STATUSES, JOB_FILE
+
+    try:
+        with open(path / JOB_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('status') in FINISHED_STATUSES
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def _is_orphan(path: Path, now: float) -> bool:
+    with _held_lock:
+        held = _held.get(str(path))
+    if held is not None:
+        # Папка этого процесса, которую так и не освободили (ошибка в коде) — убираем по возрасту
+        return time.monotonic() - held['created'] > settings.CONVERT_TEMP_MAX_AGE
+    age = now - _last_modified(path)
+    # Свежая папка могла ещё не получить блокировку
+    if age < settings.CONVERT_TEMP_ORPHAN_GRACE or _owned(path, age):
+        return False
+    if _job_finished(path):
+        # Результат задачи ждёт скачивания
+        return age > settings.CONVERT_TEMP_RESULT_TTL
+    return True
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _sweep_root(root: Path, now: float) -> tuple[int, int]:
+    removed = freed = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        path = Path(entry.path)
+        try:
+            if entry.name == UPLOADS_DIR:
+                # Незавершённые возобновляемые загрузки живут до CONVERT_TEMP_MAX_AGE
+                for upload in os.scandir(path):
+                    if upload.is_dir(follow_symlinks=False) and \
+                            now - _upload_modified(Path(upload.path)) > settings.CONVERT_TEMP_MAX_AGE:
+                        freed += _dir_size(upload.path)
+                        shutil.rmtree(upload.path, ignore_errors=True)
+                        removed += 1
+                continue
+            if not _is_orphan(path, now):
+                continue
+        except OSError:
+            continue  # папку удалили, пока смотрели
+        release(path)
+        freed += _dir_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed, freed
+
+
+def sweep() -> dict:
+    """Удаляет брошенные папки на всех уровнях: {'removed': число папок, 'freed_bytes': байт}."""
+    removed = freed = 0
+    now = time.time()
+    for tier in _tiers():
+        root = tier['root']
+        if not root.is_dir():
+            continue
+        guard = None
+        if fcntl is not None:
+            # Воркеры убирают по очереди: занято — этот проход пропускаем
+            guard = os.open(root / JANITOR_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(guard, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(guard)
+                continue
+        try:
+            tier_removed, tier_freed = _sweep_root(root, now)
+        finally:
+            if guard is not None:
+                os.close(guard)
+        removed += tier_removed
+        freed += tier_freed
+    if removed:
+        logger.info('convert temp: removed %d orphaned dirs (%d bytes)', removed, freed)
+    return {'removed': removed, 'freed_bytes': freed}
+
+
+def _janitor_loop() -> None:
+    while True:
+        try:
+            sweep()
+        except Exception:
+            logger.exception('convert temp: janitor failed')
+        time.sleep(settings.CONVERT_TEMP_JANITOR_INTERVAL)
+
+
+def start_janitor() -> None:
+    """Периодический уборщик процесса; запускается лениво — уже после fork воркера gunicorn."""
+    global _janitor
+    if settings.CONVERT_TEMP_JANITOR_INTERVAL <= 0:
+        return
+    with _start_lock:
+        if _janitor is None:
+            _janitor = threading.Thread(target=_janitor_loop, name='convert-janitor', daemon=True)
+            _janitor.start()
+
+
+def get_stats() -> dict:
+    """Свободное место и резервы по уровням (для /api/health/)."""
+    stats = {}
+    for tier in _tiers():
+        try:
+            free = _free_bytes(tier['root'])
+        except OSError:
+            free = None
+        reserved = _reserved(tier['name'])
+        stats[tier['name']] = {
+            'free_bytes': free,
+            'reserved_bytes': reserved,
+            'min_free_bytes': tier['min_free'],
+            'accepting': free is not None and free - reserved >= tier['min_free'],
+        }
+    return stats
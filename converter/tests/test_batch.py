@@ -0,0 +1,122 @@
+"""
+Проверки лимитов пакетной конвертации (/api/convert/batch/): каждый файл проходит те же
+проверки, что и одиночный, до начала ZIP-потока. Тарифные проверки plans.utils и сама
+конвертация подменены: проверяется, какие элементы получили ошибку и что учтено в счётчике.
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from converter import storage
+
+MAX_SIZE = 1000
+MAX_VIDEO_SECONDS = 30
+MAX_PIXELS = 1_000_000
+
+
+def check_limits(request, file_size, is_video, video_duration_seconds=None):
+    if file_size > MAX_SIZE:
+        return False, 'Файл слишком большой', True
+    if is_video and video_duration_seconds > MAX_VIDEO_SECONDS:
+        return False, 'Видео слишком длинное', True
+    return True, '', False
+
+
+def check_image_pixels(request, pixels):
+    if pixels > MAX_PIXELS:
+        return False, 'Изображение слишком большое', True
+    return True, '', False
+
+
+class BatchLimitsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, True)
+        overrides = override_settings(
+            CONVERT_TEMP_DIR=self.temp_dir,
+            CONVERT_TEMP_RAM_DIR='',
+            CONVERT_TEMP_JANITOR_INTERVAL=0,
+            CONVERT_BATCH_MAX_FILES=5,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.items = []
+        self.durations = {}
+        self.pixels = {}
+        self.increment = mock.Mock()
+        patches = [
+            mock.patch.object(storage, '_free_bytes', return_value=10 ** 12),
+            mock.patch('converter.views.is_conversion_allowed', return_value=True),
+            mock.patch('converter.views.stream_batch_zip', side_effect=self._stream),
+            mock.patch('plans.utils.check_limits', side_effect=check_limits),
+            mock.patch('plans.utils.get_limits_for_request', return_value={'video_profile': 'fast'}),
+            mock.patch('plans.utils.check_image_pixels', side_effect=check_image_pixels),
+            mock.patch('plans.utils.get_video_duration_seconds', side_effect=self._duration),
+            mock.patch('plans.utils.get_image_pixels', side_effect=self._pixels),
+            mock.patch('plans.utils.increment_conversion_count', self.increment),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _stream(self, items):
+        self.items = items
+        for item in items:
+            storage.release(item['temp_dir'])
+        return iter([b''])
+
+    def _duration(self, path, source_hash=None):
+        return self.durations.get(Path(path).name)
+
+    def _pixels(self, path):
+        return self.pixels.get(Path(path).name)
+
+    def _post(self, files: dict, target: str = 'pdf'):
+        uploads = [SimpleUploadedFile(name, data) for name, data in files.items()]
+        return self.client.post('/api/convert/batch/', {'files': uploads, 'target': target})
+
+    def _errors(self) -> dict:
+        return {item['name']: item.get('error') for item in self.items}
+
+    def test_each_item_is_checked(self):
+        self.durations = {'short.mp4': 10, 'long.mp4': 120}
+        self.pixels = {'small.png': 100, 'huge.png': 50_000_000}
+        response = self._post({
+            'notes.txt': b'text',
+            'big.txt': b'x' * (MAX_SIZE + 1),
+            'short.mp4': b'video',
+            'long.mp4': b'video',
+            'small.png': b'image',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._errors(), {
+            'notes.txt': None,
+            'big.txt': 'Файл слишком большой',
+            'short.mp4': None,
+            'long.mp4': 'Видео слишком длинное',
+            'small.png': None,
+        })
+        self.assertEqual(self.increment.call_count, 3)
+
+    def test_image_pixel_budget(self):
+        self.pixels = {'huge.png': 50_000_000}
+        self._post({'huge.png': b'image'}, target='jpg')
+        self.assertEqual(self._errors(), {'huge.png': 'Изображение слишком большое'})
+        self.increment.assert_not_called()
+
+    def test_unknown_video_duration_is_allowed(self):
+        self._post({'clip.mp4': b'video'}, target='mp3')
+        self.assertEqual(self._errors(), {'clip.mp4': None})
+        self.increment.assert_called_once()
+
+    def test_too_many_files(self):
+        response = self._post({f'{i}.txt': b'text' for i in range(6)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.items, [])
+        self.increment.assert_not_called()
@@ -0,0 +1,113 @@
+"""
+Кеш результатов без конвертеров: convert_file подменён и только пишет результат.
+Проверяются одна конвертация на одинаковые одновременные запросы, LRU-вытеснение
+и счётчик размера в stats.json (скан — только сверх бюджета).
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from converter import cache
+
+
+class ConvertCachedTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_dir = Path(tempfile.mkdtemp())
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+        self.delay = 0
+
+        overrides = override_settings(
+            CONVERT_CACHE_ENABLED=True,
+            CONVERT_CACHE_DIR=self.cache_dir,
+            CONVERT_CACHE_MAX_BYTES=250,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patch = mock.patch('converter.converters.convert_file', side_effect=self._convert_file)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _convert_file(self, source_path, source_ext, target_ext, output_dir, options=None):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        result = Path(output_dir) / f'{Path(source_path).stem}.{target_ext}'
+        result.write_bytes(Path(source_path).read_bytes())
+        return str(result)
+
+    def _source(self, name: str, size: int = 100) -> Path:
+        path = self.work_dir / f'{name}.png'
+        path.write_bytes(name.encode().ljust(size, b'.'))
+        return path
+
+    def _convert(self, source: Path) -> str:
+        output_dir = Path(tempfile.mkdtemp(dir=self.work_dir))
+        return cache.convert_cached(str(source), 'png', 'jpg', output_dir)
+
+    def test_concurrent_requests_convert_once(self):
+        source = self._source('same')
+        self.delay = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self._convert(source))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertEqual(Path(result).read_bytes(), source.read_bytes())
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+        # Блокировка ключа удаляется владельцем
+        self.assertEqual([p.name for p in (self.cache_dir / 'locks').glob('key-*')], [])
+
+    def test_evicts_least_recently_used(self):
+        first, second, third = self._source('first'), self._source('second'), self._source('third')
+        self._convert(first)
+        self._convert(second)
+        entries = [e.path for e in cache._iter_entries()]
+        self.assertEqual(len(entries), 2)
+        for path in entries:
+            os.utime(path, (1, 1))
+        self._convert(first)  # попадание делает first самой свежей записью
+        self._convert(third)
+
+        self.assertEqual(self.calls, 3)
+        self._convert(first)
+        self.assertEqual(self.calls, 3)
+        self._convert(second)
+        self.assertEqual(self.calls, 4)
+        stats = cache._read_stats()
+        self.assertLessEqual(stats['size_bytes'], 250)
+        self.assertEqual(stats['size_bytes'], cache.get_stats()['size_bytes'])
+        self.assertGreaterEqual(stats['evictions'], 2)
+
+    def test_scans_only_over_budget(self):
+        self._convert(self._source('a'))  # первый промах сверяет счётчик с диском
+        with mock.patch.object(cache, '_iter_entries', wraps=cache._iter_entries) as scan:
+            self._convert(self._source('b'))
+            scan.assert_not_called()
+            self.assertEqual(cache._read_stats()['size_bytes'], 200)
+            self._convert(self._source('c'))
+            scan.assert_called_once()
+        self.assertEqual(cache._read_stats()['size_bytes'], 200)
+
+    def test_rescans_after_interval(self):
+        self._convert(self._source('a'))
+        with mock.patch.object(cache, 'EVICT_SCAN_INTERVAL', -1), \
+                mock.patch.object(cache, '_iter_entries', wraps=cache._iter_entries) as scan:
+            self._convert(self._source('b'))
+            scan.assert_called_once()
@@ -0,0 +1,137 @@
+"""
+Писатели converter.converters.compression: результат читается стандартными
+zipfile, gzip и lzma. Пороги ZIP64 и размеры блоков уменьшены, чтобы проверить
+ZIP64 и параллельное сжатие на небольших данных.
+"""
+
+import gzip
+import io
+import lzma
+import random
+import zipfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from converter.converters import compression
+
+
+def sample_data(size: int, seed: int = 1) -> bytes:
+    """Сжимаемые данные: случайные слова из небольшого словаря."""
+    rnd = random.Random(seed)
+    words = [bytes(rnd.choices(b'abcdefghij', k=rnd.randint(2, 8))) for _ in range(200)]
+    out = bytearray()
+    while len(out) < size:
+        out += rnd.choice(words) + b' '
+    return bytes(out[:size])
+
+
+def make_info(name: str, size: int, compress_type: int) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo(name, date_time=(2024, 5, 17, 12, 30, 10))
+    zinfo.file_size = size
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = 0o644 << 16
+    return zinfo
+
+
+class ParallelZipWriterTests(SimpleTestCase):
+
+    def _write(self, members: dict, threads: int = 4) -> bytes:
+        buf = io.BytesIO()
+        with compression.ParallelZipWriter(buf, threads) as writer:
+            for name, (data, compress_type) in members.items():
+                # Начало уже прочитано (как при выборе политики сжатия), остальное — поток
+                writer.write(make_info(name, len(data), compress_type), data[:100], io.BytesIO(data[100:]))
+        return buf.getvalue()
+
+    def _assert_members(self, raw: bytes, members: dict) -> None:
+        with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(members))
+            for name, (data, compress_type) in members.items():
+                info = zf.getinfo(name)
+                self.assertEqual(info.compress_type, compress_type)
+                self.assertEqual(info.date_time, (2024, 5, 17, 12, 30, 10))
+                self.assertEqual(zf.read(name), data)
+
+    def test_stored_and_deflated_members(self):
+        members = {
+            'photo.jpg': (b'\xff\xd8\xff' + bytes(range(256)) * 8, zipfile.ZIP_STORED),
+            'notes.txt': (sample_data(5000), zipfile.ZIP_DEFLATED),
+            'папка/отчёт.txt': (sample_data(3000, seed=2), zipfile.ZIP_DEFLATED),
+            'empty.txt': (b'', zipfile.ZIP_DEFLATED),
+        }
+        self._assert_members(self._write(members), members)
+
+    def test_parallel_deflate_matches_single_stream(self):
+        data = sample_data(300_000)
+        members = {'big.txt': (data, zipfile.ZIP_DEFLATED)}
+        with mock.patch.object(compression, 'CHUNK_SIZE', 16 * 1024):
+            parallel = self._write(members, threads=4)
+            single = self._write(members, threads=1)
+        self._assert_members(parallel, members)
+        self._assert_members(single, members)
+        # Куски со словарём из хвоста предыдущего почти не теряют в сжатии
+        self.assertLess(len(parallel), len(single) * 1.05)
+
+    def test_zip64_members_offsets_and_count(self):
+        members = {
+            f'part{i}.txt': (sample_data(2000, seed=i), zipfile.ZIP_STORED if i % 2 else zipfile.ZIP_DEFLATED)
+            for i in range(5)
+        }
+        with mock.patch.object(compression, 'ZIP64_LIMIT', 1000), \
+                mock.patch.object(compression, 'ZIP_FILECOUNT_LIMIT', 3):
+            raw = self._write(members)
+        self.assertIn(b'PK\x06\x06', raw)  # ZIP64 end of central directory
+        self.assertIn(b'PK\x06\x07', raw)
+        self._assert_members(raw, members)
+        with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+            self.assertEqual(zf.getinfo('part1.txt').compress_size, 2000)
+
+    def test_size_above_declared_is_rejected(self):
+        buf = io.BytesIO()
+        writer = compression.ParallelZipWriter(buf, 1)
+        self.addCleanup(writer.close)
+        with mock.patch.object(compression, 'ZIP64_LIMIT', 1000):
+            with self.assertRaises(ValueError):
+                writer.write(make_info('a.bin', 10, zipfile.ZIP_STORED), b'x' * 2000)
+
+
+class ParallelStreamWriterTests(SimpleTestCase):
+
+    def _roundtrip(self, codec: str, data: bytes, threads: int = 4) -> bytes:
+        buf = io.BytesIO()
+        with compression.open_writer(buf, codec, threads) as writer:
+            for start in range(0, len(data), 7000):
+                writer.write(data[start:start + 7000])
+            self.assertEqual(writer.tell(), len(data))
+        buf.seek(0)
+        with compression.open_reader(buf, codec) as reader:
+            self.assertEqual(reader.read(), data)
+        return buf.getvalue()
+
+    def test_gzip_blocks(self):
+        data = sample_data(200_000)
+        with mock.patch.object(compression.ParallelGzipWriter, 'block_size', 16 * 1024):
+            raw = self._roundtrip('gz', data)
+        self.assertEqual(gzip.decompress(raw), data)
+        self.assertLess(len(raw), len(gzip.compress(data)) * 1.05)
+
+    def test_gzip_empty(self):
+        raw = self._roundtrip('gz', b'')
+        self.assertEqual(gzip.decompress(raw), b'')
+
+    def test_xz_concatenated_streams(self):
+        data = sample_data(100_000)
+        with mock.patch.object(compression.ParallelXzWriter, 'block_size', 16 * 1024):
+            raw = self._roundtrip('xz', data)
+        self.assertEqual(lzma.decompress(raw), data)
+        self.assertGreater(raw.count(b'\xfd7zXZ\x00'), 1)
+
+    def test_xz_empty(self):
+        raw = self._roundtrip('xz', b'')
+        self.assertEqual(lzma.decompress(raw), b'')
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            compression.open_writer(io.BytesIO(), 'lz4', 2)
@@ -0,0 +1,163 @@
+"""
+SharedOffice без LibreOffice: soffice (subprocess.Popen) и UNO подменены.
+Проверяются запуск экземпляра, перезапуск после CONVERT_OFFICE_MAX_JOBS и таймауты.
+"""
+
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from converter import slots
+from converter.converters import office
+from converter.converters.base import ConversionCancelled
+
+
+class FakeProc:
+    """Запущенный soffice: работает, пока его не остановят через Desktop.terminate()."""
+
+    next_pid = 40000
+
+    def __init__(self, *args, **kwargs):
+        FakeProc.next_pid += 1
+        self.pid = FakeProc.next_pid
+        self.running = True
+
+    def poll(self):
+        return None if self.running else 0
+
+    def wait(self):
+        self.running = False
+        return 0
+
+
+class FakeUno:
+    """uno.getComponentContext() -> ... -> Desktop; Desktop пишет PDF в storeToURL."""
+
+    def __init__(self, procs: list):
+        self.procs = procs
+        self.hang = threading.Event()
+        self.release_hang = threading.Event()
+        self.desktop = mock.Mock()
+        self.desktop.loadComponentFromURL.side_effect = self._load
+        self.desktop.terminate.side_effect = self._terminate
+        context = mock.Mock()
+        context.ServiceManager.createInstanceWithContext.return_value = self.desktop
+        resolver = mock.Mock()
+        resolver.resolve.return_value = context
+        self.local = mock.Mock()
+        self.local.ServiceManager.createInstanceWithContext.return_value = resolver
+
+    def getComponentContext(self):
+        return self.local
+
+    def _load(self, url, *args):
+        if self.hang.is_set():
+            self.release_hang.wait(5)
+        doc = mock.Mock()
+        doc.storeToURL.side_effect = lambda dest, props: Path(dest.replace('file://', '')).write_bytes(b'%PDF')
+        return doc
+
+    def _terminate(self):
+        self.procs[-1].running = False
+
+
+class SharedOfficeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.slots_dir = Path(tempfile.mkdtemp())
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.source = self.work_dir / 'doc.docx'
+        self.source.write_bytes(b'docx')
+        self.procs = []
+        self.uno = FakeUno(self.procs)
+
+        def popen(*args, **kwargs):
+            proc = FakeProc()
+            self.procs.append(proc)
+            return proc
+
+        overrides = override_settings(
+            CONVERT_SLOTS_DIR=self.slots_dir,
+            CONVERT_OFFICE_INSTANCES=1,
+            CONVERT_OFFICE_MAX_JOBS=50,
+            CONVERT_OFFICE_TIMEOUT=1,
+            CONVERT_OFFICE_START_TIMEOUT=1,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patches = [
+            mock.patch.object(office, 'uno', self.uno, create=True),
+            mock.patch.object(office, 'PropertyValue', lambda **kw: kw, create=True),
+            mock.patch.object(office, 'NoConnectException', type('NoConnectException', (Exception,), {}), create=True),
+            mock.patch.object(office.subprocess, 'Popen', side_effect=popen),
+            mock.patch.object(office, '_kill', side_effect=self._kill_group),
+            mock.patch.object(office, 'STOP_TIMEOUT', 1),
+            mock.patch.object(office, 'START_POLL_INTERVAL', 0.01),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.office = office.SharedOffice('soffice')
+
+    def _kill_group(self, pid: int) -> None:
+        for proc in self.procs:
+            if proc.pid == pid:
+                proc.running = False
+
+    def _convert(self, name: str = 'doc.pdf', progress=None) -> str:
+        return self.office.convert(str(self.source), str(self.work_dir / name), progress)
+
+    def _slot_free(self) -> bool:
+        slot = slots.try_acquire('office', 1)
+        if slot is None:
+            return False
+        slot[1]()
+        return True
+
+    def test_starts_once_and_reuses_instance(self):
+        self.assertEqual(Path(self._convert('a.pdf')).read_bytes(), b'%PDF')
+        self._convert('b.pdf')
+        self.assertEqual(len(self.procs), 1)
+        state = self.office._read_state(0)
+        self.assertEqual(state, {'pid': self.procs[0].pid, 'jobs': 2})
+        self.assertTrue(self._slot_free())
+
+    def test_restarts_before_releasing_slot(self):
+        with override_settings(CONVERT_OFFICE_MAX_JOBS=1):
+            self._convert()
+        self.uno.desktop.terminate.assert_called_once()
+        self.assertEqual(len(self.procs), 2)
+        self.assertFalse(self.procs[0].running)
+        self.assertTrue(self.procs[1].running)
+        self.assertEqual(self.office._read_state(0), {'pid': self.procs[1].pid, 'jobs': 0})
+        self.assertTrue(self._slot_free())
+
+    def test_busy_instances_time_out(self):
+        _, release = slots.try_acquire('office', 1)
+        self.addCleanup(release)
+        with override_settings(CONVERT_OFFICE_TIMEOUT=0.2):
+            with self.assertRaises(office.OfficeError):
+                self._convert()
+        self.assertEqual(self.procs, [])
+
+    def test_cancel_stops_waiting_for_slot(self):
+        _, release = slots.try_acquire('office', 1)
+        self.addCleanup(release)
+        progress = mock.Mock()
+        progress.is_cancelled.return_value = True
+        progress.check_cancelled.side_effect = ConversionCancelled('Конвертация отменена')
+        with self.assertRaises(ConversionCancelled):
+            self._convert(progress=progress)
+
+    def test_hung_document_kills_instance(self):
+        self.uno.hang.set()
+        self.addCleanup(self.uno.release_hang.set)
+        with override_settings(CONVERT_OFFICE_TIMEOUT=0.2):
+            with self.assertRaises(office.OfficeError):
+                self._convert()
+        self.assertFalse(self.procs[0].running)
+        self.assertEqual(self.office._read_state(0), {})
+        self.assertTrue(self._slot_free())
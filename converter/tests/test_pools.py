@@ -0,0 +1,69 @@
+"""
+Слоты пулов конвертеров: ожидание ограничено CONVERT_POOL_WAIT_TIMEOUT,
+отмена задачи прерывает ожидание — и в синхронном, и в асинхронном коде.
+"""
+
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from converter import pools, slots
+from converter.converters.base import ConversionBusy, ConversionCancelled
+from converter.progress import CANCEL_FILE, JobProgress
+
+
+class PoolSlotTests(SimpleTestCase):
+
+    def setUp(self):
+        self.slots_dir = Path(tempfile.mkdtemp())
+        self.job_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.slots_dir, True)
+        self.addCleanup(shutil.rmtree, self.job_dir, True)
+        overrides = override_settings(
+            CONVERT_SLOTS_DIR=self.slots_dir,
+            CONVERT_POOL_WORKERS={'image': 1},
+            CONVERT_POOL_WAIT_TIMEOUT=0.2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _occupy(self) -> None:
+        _, release = slots.try_acquire('pool-image', 1)
+        self.addCleanup(release)
+
+    def _cancelled_progress(self) -> JobProgress:
+        (self.job_dir / CANCEL_FILE).touch()
+        return JobProgress(self.job_dir)
+
+    def test_free_slot_is_taken_and_released(self):
+        release = pools.acquire_slot('image')
+        self.assertIsNone(slots.try_acquire('pool-image', 1))
+        release()
+        pools.acquire_slot('image')()
+
+    def test_busy_after_timeout(self):
+        self._occupy()
+        started = time.monotonic()
+        with self.assertRaises(ConversionBusy):
+            pools.acquire_slot('image', JobProgress(self.job_dir))
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_cancel_stops_waiting(self):
+        self._occupy()
+        with override_settings(CONVERT_POOL_WAIT_TIMEOUT=30):
+            started = time.monotonic()
+            with self.assertRaises(ConversionCancelled):
+                pools.acquire_slot('image', self._cancelled_progress())
+            self.assertLess(time.monotonic() - started, 5)
+
+    def test_async_busy_and_cancel(self):
+        self._occupy()
+        with self.assertRaises(ConversionBusy):
+            asyncio.run(pools.aacquire_slot('image'))
+        with override_settings(CONVERT_POOL_WAIT_TIMEOUT=30):
+            with self.assertRaises(ConversionCancelled):
+                asyncio.run(pools.aacquire_slot('image', self._cancelled_progress()))
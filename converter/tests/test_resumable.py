@@ -0,0 +1,127 @@
+"""
+Возобновляемая загрузка через API: init -> PUT частей -> complete.
+Постановка конвертации в очередь подменена: проверяется собранный файл и его хеш.
+"""
+
+import hashlib
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from converter import resumable, storage
+
+JOB_ID = '00000000-0000-4000-8000-000000000001'
+
+
+class ResumableUploadTests(SimpleTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, True)
+        overrides = override_settings(
+            CONVERT_TEMP_DIR=self.temp_dir,
+            CONVERT_TEMP_RAM_DIR='',
+            CONVERT_TEMP_JANITOR_INTERVAL=0,
+            CONVERT_UPLOAD_CHUNK_SIZE=1000,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.data = bytes(range(256)) * 10  # 2560 байт — три части
+        self.submitted = {}
+        patches = [
+            mock.patch.object(storage, '_free_bytes', return_value=10 ** 12),
+            mock.patch('converter.views.jobs.submit_job', side_effect=self._submit_job),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _submit_job(self, temp_dir, source_path, source_ext, target_ext, source_hash=None, params=None):
+        self.submitted = {
+            'data': Path(source_path).read_bytes(),
+            'source_hash': source_hash,
+            'target_ext': target_ext,
+        }
+        storage.release(temp_dir)  # папкой владела бы задача
+        return JOB_ID
+
+    def _init(self, **fields) -> dict:
+        response = self.client.post('/api/uploads/', {'filename': 'notes.txt', 'size': len(self.data), **fields})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def _put(self, upload_id: str, index: int, data: bytes | None = None, sha256: str | None = None):
+        if data is None:
+            data = self.data[index * 1000:(index + 1) * 1000]
+        headers = {'HTTP_X_CHUNK_SHA256': sha256} if sha256 else {}
+        return self.client.put(
+            f'/api/uploads/{upload_id}/chunks/{index}/', data,
+            content_type='application/octet-stream', **headers,
+        )
+
+    def _complete(self, upload_id: str, **fields):
+        return self.client.post(f'/api/uploads/{upload_id}/complete/', {'target': 'pdf', **fields})
+
+    def _wait_removed(self, path: Path) -> bool:
+        # storage.remove удаляет папку в фоновом потоке
+        for _ in range(100):
+            if not path.exists():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_upload_and_complete(self):
+        upload = self._init()
+        self.assertEqual((upload['chunk_size'], upload['total_chunks']), (1000, 3))
+        for index in (2, 0):
+            self.assertEqual(self._put(upload['upload_id'], index).status_code, 200)
+        status = self.client.get(f'/api/uploads/{upload["upload_id"]}/').json()
+        self.assertEqual(status['received'], [0, 2])
+
+        self.assertEqual(self._put(upload['upload_id'], 1).status_code, 200)
+        digest = hashlib.sha256(self.data).hexdigest()
+        response = self._complete(upload['upload_id'], sha256=digest)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['job_id'], JOB_ID)
+        self.assertEqual(self.submitted, {'data': self.data, 'source_hash': digest, 'target_ext': 'pdf'})
+        self.assertTrue(self._wait_removed(self.temp_dir / storage.UPLOADS_DIR / upload['upload_id']))
+
+    def test_chunk_hash_mismatch_is_rejected(self):
+        upload = self._init()
+        response = self._put(upload['upload_id'], 0, sha256='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(resumable.received_chunks(resumable.get_upload(upload['upload_id'])), [])
+
+        chunk = self.data[:1000]
+        response = self._put(upload['upload_id'], 0, sha256=hashlib.sha256(chunk).hexdigest())
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_chunk_size_is_rejected(self):
+        upload = self._init()
+        self.assertEqual(self._put(upload['upload_id'], 0, data=b'short').status_code, 400)
+        self.assertEqual(self._put(upload['upload_id'], 3).status_code, 400)
+
+    def test_complete_with_missing_chunks_keeps_upload(self):
+        upload = self._init()
+        self._put(upload['upload_id'], 0)
+        self._put(upload['upload_id'], 2)
+        self.assertEqual(self._complete(upload['upload_id']).status_code, 409)
+        self.assertEqual(self.submitted, {})
+
+        self._put(upload['upload_id'], 1)
+        self.assertEqual(self._complete(upload['upload_id']).status_code, 202)
+        self.assertEqual(self.submitted['data'], self.data)
+
+    def test_file_hash_mismatch_drops_upload(self):
+        upload = self._init(sha256=hashlib.sha256(b'other').hexdigest())
+        for index in range(3):
+            self._put(upload['upload_id'], index)
+        self.assertEqual(self._complete(upload['upload_id']).status_code, 409)
+        self.assertEqual(self.submitted, {})
+        self.assertTrue(self._wait_removed(self.temp_dir / storage.UPLOADS_DIR / upload['upload_id']))
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["upload_id"]}/').status_code, 404)
@@ -0,0 +1,118 @@
+"""
+Временные папки: допуск по месту (свободное место подменено), резерв незавершённых
+загрузок частями и уборка брошенных папок.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from converter import resumable, storage
+
+
+class StorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.temp_dir, True)
+        overrides = override_settings(
+            CONVERT_TEMP_DIR=self.temp_dir,
+            CONVERT_TEMP_RAM_DIR='',
+            CONVERT_TEMP_MIN_FREE_BYTES=1000,
+            CONVERT_TEMP_SIZE_FACTOR=3,
+            CONVERT_TEMP_JANITOR_INTERVAL=0,
+            CONVERT_TEMP_ORPHAN_GRACE=60,
+            CONVERT_TEMP_MAX_AGE=3600,
+            CONVERT_TEMP_RESULT_TTL=600,
+            CONVERT_UPLOAD_CHUNK_SIZE=1000,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patch = mock.patch.object(storage, '_free_bytes', return_value=10_000)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _make_old(self, path: Path, age: float) -> None:
+        past = time.time() - age
+        os.utime(path, (past, past))
+
+    def test_admit_fails_fast_without_space(self):
+        storage.admit(2000)
+        started = time.monotonic()
+        with self.assertRaises(storage.StorageFull):
+            storage.admit(4000)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_dir_reservation_until_release(self):
+        path = storage.create_dir(1000)
+        self.addCleanup(storage.release, path)
+        with self.assertRaises(storage.StorageFull):
+            storage.admit(2500)
+        storage.release(path)
+        storage.admit(2500)
+
+    def test_pending_upload_is_reserved(self):
+        meta = resumable.create_upload('big.txt', 5000)
+        self.assertEqual(storage._reserved('disk'), 5000)
+        with self.assertRaises(storage.StorageFull):
+            storage.admit(2000)
+
+        for index in range(3):
+            resumable.write_chunk(meta, index, io.BytesIO(b'x' * 1000), 1000)
+        self.assertEqual(storage._reserved('disk'), 2000)
+        storage.admit(2000)
+
+        shutil.rmtree(self.temp_dir / storage.UPLOADS_DIR / meta['id'])
+        self.assertEqual(storage._reserved('disk'), 0)
+
+    def test_sweep_removes_orphans_only(self):
+        orphan = self.temp_dir / 'orphan'
+        orphan.mkdir()
+        (orphan / storage.LOCK_FILE).touch()
+        (orphan / 'source.txt').write_bytes(b'x' * 10)
+        self._make_old(orphan, 120)
+
+        fresh = self.temp_dir / 'fresh'
+        fresh.mkdir()
+        (fresh / storage.LOCK_FILE).touch()
+
+        held = storage.create_dir(10)
+        self.addCleanup(storage.remove, held)
+        self._make_old(held, 120)
+
+        stale_upload = resumable.create_upload('old.txt', 10)
+        stale_dir = self.temp_dir / storage.UPLOADS_DIR / stale_upload['id']
+        self._make_old(stale_dir / 'chunks', 7200)
+        self._make_old(stale_dir, 7200)
+        live_upload = resumable.create_upload('new.txt', 10)
+
+        result = storage.sweep()
+
+        self.assertEqual(result['removed'], 2)
+        self.assertFalse(orphan.exists())
+        self.assertFalse(stale_dir.exists())
+        self.assertTrue(fresh.exists())
+        self.assertTrue(held.exists())
+        self.assertIsNotNone(resumable.get_upload(live_upload['id']))
+
+    def test_sweep_keeps_finished_job_until_ttl(self):
+        from converter.jobs import JOB_FILE, STATUS_DONE
+
+        job = self.temp_dir / 'job'
+        job.mkdir()
+        (job / JOB_FILE).write_text(f'{{"status": "{STATUS_DONE}"}}', encoding='utf-8')
+        self._make_old(job / JOB_FILE, 120)
+        self._make_old(job, 120)
+        storage.sweep()
+        self.assertTrue(job.exists())
+
+        self._make_old(job / JOB_FILE, 1200)
+        self._make_old(job, 1200)
+        storage.sweep()
+        self.assertFalse(job.exists())
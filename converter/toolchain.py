@@ -0,0 +1,102 @@
+"""
+Реестр внешних инструментов и Python-бэкендов конвертации.
+ffmpeg/ffprobe опрашиваются один раз на процесс и кешируются на TOOLCHAIN_PROBE_TTL секунд,
+вместо запуска `ffmpeg -version` на каждую конвертацию.
+Python-бэкенды проверяются через importlib.util.find_spec — без импорта самих библиотек.
+"""
+
+import importlib.util
+import shutil
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+
+# Кодеки, которые используют audio.py и video.py
+ENCODERS = ('libx264', 'libvpx-vp9', 'libvorbis', 'aac', 'libmp3lame')
+
+# Флаг в converters/*.py -> модуль, от которого он зависит
+PYTHON_BACKENDS = {
+    'PILLOW_AVAILABLE': 'PIL',
+    'PDF2DOCX_AVAILABLE': 'pdf2docx',
+    'DOCX_AVAILABLE': 'docx',
+    'REPORTLAB_AVAILABLE': 'reportlab',
+    'XHTML2PDF_AVAILABLE': 'xhtml2pdf',
+    'ZSTD_AVAILABLE': 'zstandard',
+    'UNO_AVAILABLE': 'uno',
+}
+
+PROBE_TIMEOUT = 10
+
+_lock = threading.Lock()
+_cache = {'data': None, 'probed_at': 0.0}
+
+
+def _run(cmd: list[str]) -> str | None:
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def _probe_binary(name: str) -> dict:
+    out = _run([name, '-hide_banner', '-version'])
+    if out is None:
+        return {'available': False, 'version': None}
+    first_line = out.splitlines()[0] if out else ''
+    return {'available': True, 'version': first_line}
+
+
+def _probe_encoders() -> set[str]:
+    """Парсит `ffmpeg -encoders`: строки вида ' V....D libx264   ...'."""
+    out = _run(['ffmpeg', '-hide_banner', '-encoders'])
+    if not out:
+        return set()
+    names = set()
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+            names.add(parts[1])
+    return names
+
+
+def _probe() -> dict:
+    ffmpeg = _probe_binary('ffmpeg')
+    encoders = _probe_encoders() if ffmpeg['available'] else set()
+    return {
+        'ffmpeg': ffmpeg,
+        'ffprobe': _probe_binary('ffprobe'),
+        'encoders': {name: name in encoders for name in ENCODERS},
+        # LibreOffice для DOCX -> PDF (converters/office.py); версию не спрашиваем — это секунды запуска
+        'office': {'available': shutil.which(settings.CONVERT_OFFICE_BINARY) is not None},
+        'backends': {
+            flag: importlib.util.find_spec(module) is not None
+            for flag, module in PYTHON_BACKENDS.items()
+        },
+    }
+
+
+def get_toolchain(refresh: bool = False) -> dict:
+    """Состояние инструментов (из кеша, если он моложе TOOLCHAIN_PROBE_TTL)."""
+    with _lock:
+        expired = time.monotonic() - _cache['probed_at'] > settings.TOOLCHAIN_PROBE_TTL
+        if refresh or _cache['data'] is None or expired:
+            _cache['data'] = _probe()
+            _cache['probed_at'] = time.monotonic()
+        return _cache['data']
+
+
+def has_ffmpeg() -> bool:
+    return get_toolchain()['ffmpeg']['available']
+
+
+def has_ffprobe() -> bool:
+    return get_toolchain()['ffprobe']['available']
+
+
+def has_encoder(name: str) -> bool:
+    return get_toolchain()['encoders'].get(name, False)
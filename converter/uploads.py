@@ -0,0 +1,105 @@
+"""
+Обработчик загрузки для конвертера.
+Пишет файл сразу в папку конвертации (converter.storage: tmpfs или CONVERT_TEMP_DIR/<uuid>/),
+по пути считая размер, SHA-256 и первые байты (сигнатуру формата).
+Так загрузка попадает на диск один раз, без промежуточного temp-файла Django.
+"""
+
+import hashlib
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from converter import storage
+
+MAGIC_BYTES = 32
+
+
+class ConvertUploadedFile(UploadedFile):
+    """Загруженный файл, уже лежащий в своей папке конвертации."""
+
+    def __init__(self, path, name, content_type, size, charset, content_type_extra,
+                 temp_dir, sha256: str, magic: bytes):
+        super().__init__(open(path, 'rb'), name, content_type, size, charset, content_type_extra)
+        self.temp_dir = temp_dir
+        self.sha256 = sha256
+        self.magic = magic
+        # view помечает файл, который забирает себе; остальные папки удаляются
+        self.claimed = False
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+
+class ConvertUploadHandler(FileUploadHandler):
+    """
+    Каждый файл запроса получает собственную папку конвертации (storage.create_dir).
+    Папку дальше использует view: туда же пишется результат конвертации.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.created_dirs = []
+        self.completed_files = []
+        self.content_length = None
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.content_length = content_length
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        # Размер файла заранее неизвестен: не больше, чем осталось тела запроса
+        remaining = (self.content_length - self.received) if self.content_length else None
+        self.temp_dir = storage.create_dir(remaining)
+        self.created_dirs.append(self.temp_dir)
+        self.path = self.temp_dir / self.file_name
+        self.file = open(self.path, 'wb')
+        self.hasher = hashlib.sha256()
+        self.magic = b''
+        # Остальные обработчики (memory/temporary) этот файл не получают
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.received += len(raw_data)
+        self.hasher.update(raw_data)
+        if len(self.magic) < MAGIC_BYTES:
+            self.magic += raw_data[:MAGIC_BYTES - len(self.magic)]
+        return None
+
+    def file_complete(self, file_size):
+        self.file.close()
+        uploaded = ConvertUploadedFile(
+            self.path,
+            self.file_name,
+            self.content_type,
+            file_size,
+            self.charset,
+            self.content_type_extra,
+            temp_dir=self.temp_dir,
+            sha256=self.hasher.hexdigest(),
+            magic=self.magic,
+        )
+        self.completed_files.append(uploaded)
+        return uploaded
+
+    def upload_interrupted(self):
+        # Разбор запроса прерван — request.FILES не будет, убираем все папки
+        if hasattr(self, 'file'):
+            self.file.close()
+        for temp_dir in self.created_dirs:
+            storage.remove(temp_dir)
+
+    def discard_unclaimed(self):
+        """Удаляет папки файлов, которые view не забрал (отказ CSRF, лишние поля)."""
+        claimed = {f.temp_dir for f in self.completed_files if f.claimed}
+        for temp_dir in self.created_dirs:
+            if temp_dir not in claimed:
+                storage.remove(temp_dir)
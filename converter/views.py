@@ -4,24 +4,33 @@ Views для File Converter.
 Регистрация не обязательна — гости имеют лимиты по тарифу FREE.
 """
 
-import uuid
-import shutil
+import os
 from pathlib import Path
 
-from django.http import JsonResponse, HttpRequest, HttpResponse
-from django.views.decorators.http import require_GET, require_POST
-from django.views.decorators.csrf import ensure_csrf_cookie
+from django.http import JsonResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt, csrf_protect
 from django.conf import settings
 from django.shortcuts import render
+from django.urls import reverse
 
 from converter.formats import (
     normalize_format,
     get_available_targets,
     is_conversion_allowed,
     get_category,
+    get_extension,
+    strip_extension,
 )
-from converter.converters import convert_file as do_convert
-from converter.converters.base import ConversionError
+from converter.cache import convert_cached
+from converter.converters import CONVERTERS, is_available
+from converter.converters.base import ConversionBusy, ConversionError
+from converter.converters.pdf_parallel import format_pages, parse_pages
+from converter.converters.video import VIDEO_PROFILES
+from converter import jobs, progress, resumable, storage, toolchain
+from converter.batch import stream_batch_zip
+from converter.responses import TempDirFileResponse
+from converter.uploads import ConvertUploadHandler, ConvertUploadedFile
 
 
 @ensure_csrf_cookie
@@ -30,6 +39,45 @@ def index(request: HttpRequest) -> HttpResponse:
     return render(request, 'index.html')
 
 
+def _temp_dir_writable() -> bool:
+    """
+    Папку конвертаций создают по требованию (загрузки — с parents=True), не при импорте views;
+    здесь — тоже, чтобы readiness не зависела от того, была ли уже загрузка.
+    """
+    try:
+        Path(settings.CONVERT_TEMP_DIR).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(settings.CONVERT_TEMP_DIR, os.W_OK)
+
+
+@require_GET
+def health_view(request: HttpRequest) -> JsonResponse:
+    """
+    Readiness-проверка для HEALTHCHECK: без шаблонов и запросов к БД.
+    Инструменты берутся из кеша toolchain, ffmpeg не запускается на каждый запрос.
+    """
+    tools = toolchain.get_toolchain()
+    temp_dir_writable = _temp_dir_writable()
+    temp_storage = storage.get_stats()
+    # Уборщик воркера стартует и без загрузок: health опрашивается регулярно
+    storage.start_janitor()
+    if not temp_dir_writable:
+        status = 'unavailable'
+    elif not tools['ffmpeg']['available'] or not temp_storage['disk']['accepting']:
+        # Без ffmpeg изображения и документы работают; без места новые запросы получают 503
+        status = 'degraded'
+    else:
+        status = 'ok'
+    return JsonResponse({
+        'status': status,
+        'temp_dir_writable': temp_dir_writable,
+        'temp_storage': temp_storage,
+        'categories': {category: is_available(category) for category in CONVERTERS},
+        **tools,
+    }, status=503 if status == 'unavailable' else 200)
+
+
 @require_GET
 @ensure_csrf_cookie
 def detect_format(request: HttpRequest) -> JsonResponse:
@@ -37,11 +85,15 @@ def detect_format(request: HttpRequest) -> JsonResponse:
     Определяет формат файла по расширению.
     Query: filename=example.jpg
     """
+    return _detect_response(request)
+
+
+def _detect_response(request: HttpRequest) -> JsonResponse:
     filename = request.GET.get('filename', '')
     if not filename:
         return JsonResponse({'error': 'Не указано имя файла'}, status=400)
 
-    ext = Path(filename).suffix.lstrip('.').lower()
+    ext = get_extension(filename)
     normalized = normalize_format(ext)
     if not normalized:
         return JsonResponse({
@@ -58,20 +110,184 @@ def detect_format(request: HttpRequest) -> JsonResponse:
     })
 
 
+@csrf_exempt
 @require_POST
 def convert_file_view(request: HttpRequest) -> JsonResponse | HttpResponse:
     """
     Принимает файл и целевой формат, конвертирует, возвращает файл или JSON с ошибкой.
     Проверка лимитов выполняется до конвертации.
+    С mode=job конвертация ставится в очередь пула, сразу возвращается job_id.
     """
-    if 'file' not in request.FILES:
-        return JsonResponse({'error': 'Файл не загружен'}, status=400)
+    error_response = _storage_error(_content_length(request))
+    if error_response is not None:
+        return error_response
+    # Обработчик загрузки подменяется до чтения тела запроса,
+    # поэтому CSRF проверяется уже внутри (csrf_protect ниже)
+    handler = ConvertUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    try:
+        return _convert_file_view(request)
+    finally:
+        handler.discard_unclaimed()
+
+
+def _content_length(request: HttpRequest) -> int | None:
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0) or None
+    except ValueError:
+        return None
+
+
+def _storage_error(size: int | None) -> JsonResponse | None:
+    """Допуск по месту для временных файлов (до чтения тела запроса). None — место есть."""
+    try:
+        storage.admit(size)
+    except storage.StorageFull as e:
+        response = JsonResponse({'error': str(e)}, status=503)
+        response['Retry-After'] = str(storage.RETRY_AFTER_SECONDS)
+        return response
+    return None
+
+
+def _busy_response(error: ConversionBusy) -> JsonResponse:
+    """503 с Retry-After: слот конвертера не освободился за CONVERT_POOL_WAIT_TIMEOUT."""
+    response = JsonResponse({'error': str(error)}, status=503)
+    response['Retry-After'] = str(storage.RETRY_AFTER_SECONDS)
+    return response
+
+
+def _place_upload(uploaded) -> tuple[Path, Path]:
+    """
+    Возвращает (папка конвертации, путь к исходнику).
+    Файл от ConvertUploadHandler уже лежит на месте, иначе — копируем.
+    """
+    if isinstance(uploaded, ConvertUploadedFile):
+        uploaded.claimed = True
+        return uploaded.temp_dir, Path(uploaded.temporary_file_path())
+
+    temp_dir = storage.create_dir(uploaded.size)
+    source_path = temp_dir / uploaded.name
+    with open(source_path, 'wb') as f:
+        for chunk in uploaded.chunks():
+            f.write(chunk)
+    return temp_dir, source_path
+
+
+def _video_limits_error(
+    request: HttpRequest,
+    source_path,
+    source_ext: str,
+    size: int,
+    source_hash: str | None = None,
+) -> JsonResponse | None:
+    """Проверка длительности видео (если применимо). None — всё в порядке."""
+    from plans.utils import get_video_duration_seconds
+
+    if not _is_category(source_ext, 'video'):
+        return None
+    return _duration_error(request, size, get_video_duration_seconds(str(source_path), source_hash))
+
+
+def _video_limits_message(
+    request: HttpRequest,
+    source_path,
+    source_ext: str,
+    size: int,
+    source_hash: str | None = None,
+) -> str | None:
+    """_video_limits_error для элемента пакета: текст ошибки или None."""
+    from plans.utils import check_limits, get_video_duration_seconds
+
+    if not _is_category(source_ext, 'video'):
+        return None
+    video_duration = get_video_duration_seconds(str(source_path), source_hash)
+    if video_duration is None:
+        return None
+    ok, err_msg, _ = check_limits(request, size, True, video_duration)
+    return None if ok else err_msg
+
+
+def _is_category(source_ext: str, category: str) -> bool:
+    return get_category(normalize_format(source_ext) or source_ext) == category
 
-    uploaded = request.FILES['file']
-    target_ext = request.POST.get('target', '').strip().lower()
-    source_ext = Path(uploaded.name).suffix.lstrip('.').lower()
 
-    # Проверка целевого формата
+def _duration_error(request: HttpRequest, size: int, video_duration: float | None) -> JsonResponse | None:
+    from plans.utils import check_limits
+
+    if video_duration is None:
+        return None
+    ok, err_msg, limit_exceeded = check_limits(request, size, True, video_duration)
+    if ok:
+        return None
+    return JsonResponse({
+        'error': err_msg,
+        'limit_exceeded': limit_exceeded,
+    }, status=400)
+
+
+def _image_pixels_error(request: HttpRequest, source_path, source_ext: str) -> str | None:
+    """Бюджет пикселей по тарифу — по заголовку, до декодирования. None — всё в порядке."""
+    from plans.utils import get_image_pixels
+
+    if not _is_category(source_ext, 'image'):
+        return None
+    return _pixels_error(request, get_image_pixels(str(source_path)))
+
+
+def _pixels_error(request: HttpRequest, pixels: int | None) -> str | None:
+    from plans.utils import check_image_pixels
+
+    if pixels is None:
+        return None
+    ok, err_msg, _ = check_image_pixels(request, pixels)
+    return None if ok else err_msg
+
+
+def _profile_error(request: HttpRequest) -> JsonResponse | None:
+    """Проверка необязательного поля profile (профиль кодирования видео)."""
+    profile = request.POST.get('profile', '').strip().lower()
+    if profile and profile not in VIDEO_PROFILES:
+        return JsonResponse({
+            'error': f'Неизвестный профиль: {profile}. Доступны: {", ".join(VIDEO_PROFILES)}',
+        }, status=400)
+    return None
+
+
+def _pages_error(request: HttpRequest) -> JsonResponse | None:
+    """Проверка необязательного поля pages (страницы PDF: '1-3,7,10-')."""
+    pages = request.POST.get('pages', '').strip()
+    if not pages:
+        return None
+    try:
+        parse_pages(pages)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return None
+
+
+def _conversion_params(request: HttpRequest, source_ext: str) -> dict | None:
+    """
+    Параметры, влияющие на результат (входят в ключ кеша).
+    Для видео — профиль кодирования: из запроса или по умолчанию для тарифа.
+    Для PDF — страницы (pages), если указаны.
+    """
+    from plans.utils import get_limits_for_request
+
+    if normalize_format(source_ext) == 'pdf':
+        pages = request.POST.get('pages', '').strip()
+        return {'pages': format_pages(parse_pages(pages))} if pages else None
+    if get_category(normalize_format(source_ext) or source_ext) != 'video':
+        return None
+    profile = request.POST.get('profile', '').strip().lower()
+    if profile not in VIDEO_PROFILES:
+        profile = get_limits_for_request(request)['video_profile']
+    return {'video_profile': profile}
+
+
+def _request_error(request: HttpRequest, size: int, source_ext: str, target_ext: str) -> JsonResponse | None:
+    """Проверки запроса конвертации до чтения файла: формат, поля, лимиты тарифа. None — всё в порядке."""
+    from plans.utils import check_limits
+
     if not target_ext:
         return JsonResponse({'error': 'Не указан целевой формат'}, status=400)
 
@@ -80,52 +296,210 @@ def convert_file_view(request: HttpRequest) -> JsonResponse | HttpResponse:
             'error': f'Конвертация из {source_ext} в {target_ext} не поддерживается',
         }, status=400)
 
+    error_response = _profile_error(request)
+    if error_response is not None:
+        return error_response
+    error_response = _pages_error(request)
+    if error_response is not None:
+        return error_response
+
     # Проверка лимитов (количество, размер) — ДО конвертации
-    from plans.utils import check_limits, increment_conversion_count
-    from plans.utils import get_video_duration_seconds
+    ok, err_msg, limit_exceeded = check_limits(request, size, False, None)
+    if not ok:
+        return JsonResponse({
+            'error': err_msg,
+            'limit_exceeded': limit_exceeded,
+        }, status=400)
+    return None
+
+
+def _job_accepted(job_id: str) -> JsonResponse:
+    return JsonResponse({
+        'job_id': job_id,
+        'status': jobs.STATUS_QUEUED,
+        'status_url': reverse('job_status', args=[job_id]),
+        'cancel_url': reverse('job_cancel', args=[job_id]),
+    }, status=202)
+
+
+@require_POST
+def upload_init_view(request: HttpRequest) -> JsonResponse:
+    """
+    Начало возобновляемой загрузки.
+    Form: filename, size, sha256 (необязательно — тогда проверяется только размер).
+    """
+    filename = request.POST.get('filename', '')
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Не указан размер файла'}, status=400)
 
-    ok, err_msg, limit_exceeded = check_limits(request, uploaded.size, False, None)
+    source_ext = get_extension(filename)
+    if not normalize_format(source_ext):
+        return JsonResponse({'error': 'Формат не поддерживается'}, status=400)
+    error_response = _storage_error(size)
+    if error_response is not None:
+        return error_response
+
+    from plans.utils import check_limits
+
+    ok, err_msg, limit_exceeded = check_limits(request, size, False, None)
     if not ok:
         return JsonResponse({
             'error': err_msg,
             'limit_exceeded': limit_exceeded,
         }, status=400)
 
-    # Создаём временную папку для этой конвертации
-    temp_id = str(uuid.uuid4())
-    temp_dir = Path(settings.CONVERT_TEMP_DIR) / temp_id
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        meta = resumable.create_upload(filename, size, request.POST.get('sha256'))
+    except resumable.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    source_path = temp_dir / uploaded.name
+    return JsonResponse({
+        'upload_id': meta['id'],
+        'chunk_size': meta['chunk_size'],
+        'total_chunks': meta['total_chunks'],
+    }, status=201)
+
+
+@require_GET
+def upload_status_view(request: HttpRequest, upload_id) -> JsonResponse:
+    """Какие части уже приняты — клиент досылает остальные."""
+    meta = resumable.get_upload(upload_id)
+    if meta is None:
+        return JsonResponse({'error': 'Загрузка не найдена'}, status=404)
+    return JsonResponse({
+        'upload_id': meta['id'],
+        'chunk_size': meta['chunk_size'],
+        'total_chunks': meta['total_chunks'],
+        'received': resumable.received_chunks(meta),
+    })
+
+
+@require_http_methods(['PUT'])
+def upload_chunk_view(request: HttpRequest, upload_id, index: int) -> JsonResponse:
+    """PUT одной части: тело запроса — сырые байты, заголовок X-Chunk-SHA256 необязателен."""
+    meta = resumable.get_upload(upload_id)
+    if meta is None:
+        return JsonResponse({'error': 'Загрузка не найдена'}, status=404)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+
+    try:
+        # Тело читается потоком: request.body упёрся бы в DATA_UPLOAD_MAX_MEMORY_SIZE
+        resumable.write_chunk(meta, index, request, length, request.headers.get('X-Chunk-SHA256'))
+    except resumable.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'index': index, 'received': True})
+
+
+@require_POST
+def upload_complete_view(request: HttpRequest, upload_id) -> JsonResponse:
+    """
+    Завершение загрузки: сборка частей, проверка размера и хеша,
+    постановка конвертации в очередь (ответ как у mode=job).
+    Form: target, sha256 всего файла (необязательно, если он не передан при init).
+    """
+    meta = resumable.get_upload(upload_id)
+    if meta is None:
+        return JsonResponse({'error': 'Загрузка не найдена'}, status=404)
+
+    target_ext = request.POST.get('target', '').strip().lower()
+    source_ext = get_extension(meta['filename'])
+    if not target_ext:
+        return JsonResponse({'error': 'Не указан целевой формат'}, status=400)
+    if not is_conversion_allowed(source_ext, target_ext):
+        return JsonResponse({
+            'error': f'Конвертация из {source_ext} в {target_ext} не поддерживается',
+        }, status=400)
+    error_response = _profile_error(request)
+    if error_response is not None:
+        return error_response
+    error_response = _pages_error(request)
+    if error_response is not None:
+        return error_response
+
+    # Сборка идёт на месте, место нужно под результат и промежуточные файлы конвертации
+    error_response = _storage_error(meta['size'])
+    if error_response is not None:
+        return error_response
+
+    # Собранный файл переносится в папку конвертации без копирования — она на диске
+    temp_dir = storage.create_dir(meta['size'], disk=True)
+    try:
+        source_path, digest = resumable.assemble(meta, temp_dir, request.POST.get('sha256'))
+    except resumable.UploadError as e:
+        # Не хватает частей — клиент досылает их и повторяет; испорченная загрузка удалена
+        storage.remove(temp_dir)
+        return JsonResponse({'error': str(e)}, status=409)
+
+    error_response = _video_limits_error(request, source_path, source_ext, meta['size'], digest)
+    if error_response is not None:
+        storage.remove(temp_dir)
+        return error_response
+    err_msg = _image_pixels_error(request, source_path, source_ext)
+    if err_msg:
+        storage.remove(temp_dir)
+        return JsonResponse({'error': err_msg, 'limit_exceeded': True}, status=400)
+
+    job_id = jobs.submit_job(
+        temp_dir, str(source_path), source_ext, target_ext,
+        source_hash=digest, params=_conversion_params(request, source_ext),
+    )
+    return _job_accepted(job_id)
+
+
+@csrf_protect
+def _convert_file_view(request: HttpRequest) -> JsonResponse | HttpResponse:
+    if 'file' not in request.FILES:
+        return JsonResponse({'error': 'Файл не загружен'}, status=400)
+
+    uploaded = request.FILES['file']
+    target_ext = request.POST.get('target', '').strip().lower()
+    source_ext = get_extension(uploaded.name)
+
+    temp_dir, source_path = _place_upload(uploaded)
     result_path = None
+    job_mode = request.POST.get('mode', '').strip().lower() == 'job'
+    keep_temp = False
 
     try:
-        # Сохраняем загруженный файл
-        with open(source_path, 'wb') as f:
-            for chunk in uploaded.chunks():
-                f.write(chunk)
-
-        # Проверка длительности видео (если применимо)
-        is_video = get_category(normalize_format(source_ext) or source_ext) == 'video'
-        video_duration = None
-        if is_video:
-            video_duration = get_video_duration_seconds(str(source_path))
-            if video_duration is not None:
-                ok, err_msg, limit_exceeded = check_limits(
-                    request, uploaded.size, True, video_duration
-                )
-                if not ok:
-                    return JsonResponse({
-                        'error': err_msg,
-                        'limit_exceeded': limit_exceeded,
-                    }, status=400)
-
-        # Конвертация (логика конвертера не изменена)
-        result_path = do_convert(
+        error_response = _request_error(request, uploaded.size, source_ext, target_ext)
+        if error_response is not None:
+            return error_response
+        params = _conversion_params(request, source_ext)
+
+        from plans.utils import increment_conversion_count
+
+        error_response = _video_limits_error(
+            request, source_path, source_ext, uploaded.size, getattr(uploaded, 'sha256', None),
+        )
+        if error_response is not None:
+            return error_response
+        err_msg = _image_pixels_error(request, source_path, source_ext)
+        if err_msg:
+            return JsonResponse({'error': err_msg, 'limit_exceeded': True}, status=400)
+
+        if job_mode:
+            # Папка остаётся жить вместе с задачей
+            job_id = jobs.submit_job(
+                temp_dir, str(source_path), source_ext, target_ext,
+                source_hash=getattr(uploaded, 'sha256', None),
+                params=params,
+            )
+            keep_temp = True
+            return _job_accepted(job_id)
+
+        # Конвертация (повторные — из кеша результатов)
+        result_path = convert_cached(
             str(source_path),
             source_ext,
             target_ext,
             temp_dir,
+            source_hash=getattr(uploaded, 'sha256', None),
+            params=params,
         )
 
         if not result_path or not Path(result_path).exists():
@@ -134,31 +508,173 @@ def convert_file_view(request: HttpRequest) -> JsonResponse | HttpResponse:
         # Успешная конвертация — увеличиваем счётчик
         increment_conversion_count(request)
 
-        # Отдаём файл пользователю
-        with open(result_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/octet-stream')
-            out_name = Path(source_path).stem + '.' + target_ext
-            response['Content-Disposition'] = f'attachment; filename="{out_name}"'
-            return response
+        # Отдаём файл потоком; папку удалит сам ответ после отправки
+        out_name = strip_extension(source_path) + '.' + target_ext
+        response = TempDirFileResponse(
+            open(result_path, 'rb'),
+            as_attachment=True,
+            filename=out_name,
+            content_type='application/octet-stream',
+            cleanup_dir=temp_dir,
+        )
+        keep_temp = True
+        return response
 
+    except ConversionBusy as e:
+        return _busy_response(e)
     except ConversionError as e:
         return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Ошибка сервера: {e}'}, status=500)
     finally:
-        # Автоудаление временных файлов
-        try:
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+        # Автоудаление временных файлов при ошибке (в фоне, storage.remove);
+        # при успехе папку удаляет ответ (после отправки) или задача
+        uploaded.close()
+        if not keep_temp:
+            storage.remove(temp_dir)
 
 
-# Убеждаемся, что CONVERT_TEMP_DIR создаётся при старте
-def _ensure_temp_dir():
-    p = Path(settings.CONVERT_TEMP_DIR)
-    p.mkdir(parents=True, exist_ok=True)
+@csrf_exempt
+@require_POST
+def convert_batch_view(request: HttpRequest) -> JsonResponse | StreamingHttpResponse:
+    """
+    Пакетная конвертация: files (несколько файлов) + target (общий)
+    или targets (по одному на файл, в том же порядке).
+    Возвращает ZIP, который пишется по мере готовности файлов, с manifest.json.
+    """
+    error_response = _storage_error(_content_length(request))
+    if error_response is not None:
+        return error_response
+    handler = ConvertUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    try:
+        return _convert_batch_view(request)
+    finally:
+        handler.discard_unclaimed()
+
+
+@csrf_protect
+def _convert_batch_view(request: HttpRequest) -> JsonResponse | StreamingHttpResponse:
+    uploads = request.FILES.getlist('files')
+    if not uploads:
+        return JsonResponse({'error': 'Файлы не загружены'}, status=400)
+    if len(uploads) > settings.CONVERT_BATCH_MAX_FILES:
+        return JsonResponse({
+            'error': f'Слишком много файлов (максимум {settings.CONVERT_BATCH_MAX_FILES})',
+        }, status=400)
+
+    common_target = request.POST.get('target', '').strip().lower()
+    targets = [t.strip().lower() for t in request.POST.getlist('targets')]
+    if targets and len(targets) != len(uploads):
+        return JsonResponse({'error': 'Количество targets не совпадает с количеством файлов'}, status=400)
+    if not targets and not common_target:
+        return JsonResponse({'error': 'Не указан целевой формат'}, status=400)
+    error_response = _profile_error(request)
+    if error_response is not None:
+        return error_response
+    error_response = _pages_error(request)
+    if error_response is not None:
+        return error_response
+
+    from plans.utils import check_limits, increment_conversion_count
 
+    items = []
+    for index, uploaded in enumerate(uploads):
+        temp_dir, source_path = _place_upload(uploaded)
+        uploaded.close()
+        source_ext = get_extension(uploaded.name)
+        target_ext = targets[index] if targets else common_target
+        item = {
+            'name': uploaded.name,
+            'source_path': source_path,
+            'source_ext': source_ext,
+            'target': target_ext,
+            'temp_dir': temp_dir,
+            'source_hash': getattr(uploaded, 'sha256', None),
+            'params': _conversion_params(request, source_ext),
+        }
+        if not is_conversion_allowed(source_ext, target_ext):
+            item['error'] = f'Конвертация из {source_ext} в {target_ext} не поддерживается'
+        else:
+            ok, err_msg, _ = check_limits(request, uploaded.size, False, None)
+            if ok:
+                err_msg = _video_limits_message(
+                    request, source_path, source_ext, uploaded.size, item['source_hash'],
+                ) or _image_pixels_error(request, source_path, source_ext)
+                ok = err_msg is None
+            if not ok:
+                item['error'] = err_msg
+            else:
+                # Счётчик — до начала потока: после отправки заголовков сессию не сохранить
+                increment_conversion_count(request)
+        items.append(item)
+
+    response = StreamingHttpResponse(stream_batch_zip(items), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="converted.zip"'
+    return response
+
+
+@require_GET
+def job_status_view(request: HttpRequest, job_id) -> JsonResponse:
+    """Статус фоновой задачи конвертации."""
+    job = jobs.read_job(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+    data = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'error': job.get('error'),
+        'progress': progress.read_progress(jobs.get_job_dir(job['id'])),
+    }
+    if job['status'] == jobs.STATUS_DONE:
+        data['download_url'] = reverse('job_download', args=[job['id']])
+    return JsonResponse(data)
+
+
+@require_POST
+def job_cancel_view(request: HttpRequest, job_id) -> JsonResponse:
+    """
+    Отмена задачи: процесс конвертации останавливается, файлы удаляются.
+    Клиент вызывает её и при закрытии страницы (sendBeacon).
+    """
+    job = jobs.cancel_job(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+    return JsonResponse({'job_id': job['id'], 'status': job['status']})
+
+
+@require_GET
+def job_download_view(request: HttpRequest, job_id) -> JsonResponse | TempDirFileResponse:
+    """
+    Отдаёт результат завершённой задачи. Папка задачи после отправки остаётся:
+    результат можно скачать повторно, пока его не удалит уборщик (CONVERT_TEMP_RESULT_TTL).
+    """
+    return _job_download(request, job_id, TempDirFileResponse)
+
+
+def _job_download(request: HttpRequest, job_id, response_class) -> JsonResponse | TempDirFileResponse:
+    job = jobs.read_job(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+    if job['status'] != jobs.STATUS_DONE:
+        return JsonResponse({'error': 'Конвертация ещё не завершена'}, status=409)
+
+    result_path = Path(job['result_path'])
+    if not result_path.exists():
+        return JsonResponse({'error': 'Результат больше недоступен'}, status=410)
+
+    job_dir = jobs.get_job_dir(job['id'])
+    # Счётчик увеличиваем один раз — при первой выдаче результата (повтор после обрыва
+    # скачивания не считается); compare-and-set: из двух одновременных скачиваний считает одно
+    if not job.get('counted') and jobs.update_job(job_dir, expect={'counted': None}, counted=True):
+        from plans.utils import increment_conversion_count
+        increment_conversion_count(request)
 
-# Вызов при импорте
-_ensure_temp_dir()
+    out_name = strip_extension(job['source_name']) + '.' + job['target']
+    return response_class(
+        open(result_path, 'rb'),
+        as_attachment=True,
+        filename=out_name,
+        content_type='application/octet-stream',
+    )
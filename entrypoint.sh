@@ -9,6 +9,26 @@ python manage.py migrate --noinput
 echo "Initializing plans..."
 python manage.py init_plans || true
 
-# Запускаем Gunicorn
-echo "Starting Gunicorn..."
-exec gunicorn --bind 0.0.0.0:8000 --workers 4 --timeout 120 --access-logfile - --error-logfile - config.wsgi:application
+# Папки конвертаций, брошенные прошлым запуском (воркер убит посреди запроса)
+echo "Cleaning up temp storage..."
+python manage.py cleanup_temp || true
+
+# Запускаем Gunicorn.
+# --preload: приложение загружается один раз в мастере, воркеры получают его страницы
+# через fork (copy-on-write). Пулы конвертеров и потоки задач создаются лениво — уже в воркерах.
+# Сравнить старт и память воркера: python manage.py benchmark_startup
+# APP_SERVER=asgi: воркеры uvicorn и асинхронные views — пока ffmpeg кодирует, воркер
+# принимает другие запросы (сотни конвертаций одновременно без сотен воркеров)
+GUNICORN_WORKERS=${GUNICORN_WORKERS:-4}
+PRELOAD_ARG=""
+if [ "${GUNICORN_PRELOAD:-true}" = "true" ]; then
+    PRELOAD_ARG="--preload"
+fi
+if [ "${APP_SERVER:-wsgi}" = "asgi" ]; then
+    export CONVERT_ASYNC_VIEWS=true
+    APP_ARGS="--worker-class uvicorn.workers.UvicornWorker config.asgi:application"
+else
+    APP_ARGS="config.wsgi:application"
+fi
+echo "Starting Gunicorn (${APP_SERVER:-wsgi})..."
+exec gunicorn --bind 0.0.0.0:8000 --workers "$GUNICORN_WORKERS" $PRELOAD_ARG --timeout 120 --access-logfile - --error-logfile - $APP_ARGS
@@ -20,6 +20,8 @@ def get_free_plan() -> Plan:
             'limits': {
                 'conversions_per_day': 3,
                 'max_file_size_mb': 25,
+                'video_profile': 'fast',
+                'max_image_megapixels': 50,
                 'available_formats': 'all',  # Все форматы доступны
             }
         }
@@ -39,6 +41,8 @@ def get_pro_plan() -> Plan:
                 # но фактически конвертер сейчас работает без ограничений.
                 'conversions_per_day': 999999,
                 'max_file_size_mb': 999999,
+                'video_profile': 'balanced',
+                'max_image_megapixels': 0,  # только общий предел CONVERT_MAX_IMAGE_PIXELS
                 'available_formats': 'all',
             }
         }
@@ -9,6 +9,8 @@ PLANS_CONFIG = {
         'conversions_per_day': 3,
         'max_file_size_mb': 25,
         'max_video_seconds': 30,
+        'video_profile': 'fast',
+        'max_image_megapixels': 50,
         'is_guest_plan': True,
         'is_available': True,
     },
@@ -17,6 +19,8 @@ PLANS_CONFIG = {
         'conversions_per_day': 20,
         'max_file_size_mb': 200,
         'max_video_seconds': 180,
+        'video_profile': 'balanced',
+        'max_image_megapixels': 100,
         'is_guest_plan': False,
         'is_available': True,
     },
@@ -25,6 +29,8 @@ PLANS_CONFIG = {
         'conversions_per_day': 100,
         'max_file_size_mb': 1024,
         'max_video_seconds': 0,
+        'video_profile': 'balanced',
+        'max_image_megapixels': 0,
         'is_guest_plan': False,
         'is_available': False,
     },
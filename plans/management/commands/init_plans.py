@@ -18,6 +18,8 @@ class Command(BaseCommand):
                 'limits': {
                     'conversions_per_day': 3,
                     'max_file_size_mb': 25,
+                    'video_profile': 'fast',
+                    'max_image_megapixels': 50,
                     'available_formats': 'all',
                 }
             },
@@ -33,6 +35,8 @@ class Command(BaseCommand):
                 'limits': {
                     'conversions_per_day': 100,
                     'max_file_size_mb': 1024,
+                    'video_profile': 'balanced',
+                    'max_image_megapixels': 0,
                     'available_formats': 'all',
                 }
             },
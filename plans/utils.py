@@ -4,7 +4,6 @@
 Конвертер не знает, как работают тарифы — он только спрашивает лимиты.
 """
 
-import subprocess
 from datetime import date
 from pathlib import Path
 
@@ -13,23 +12,34 @@ from django.utils import timezone
 from .billing.services import get_user_plan
 
 
-def get_video_duration_seconds(file_path: str) -> float | None:
-    """Получает длительность видео в секундах через ffprobe. None если не видео или ошибка."""
-    try:
-        result = subprocess.run(
-            [
-                'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1', str(file_path),
-            ],
-            capture_output=True,
-            text=True,
-            timeout=10,
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            return float(result.stdout.strip())
-    except (subprocess.TimeoutExpired, FileNotFoundError, ValueError):
-        pass
-    return None
+def get_video_duration_seconds(file_path: str, source_hash: str | None = None) -> float | None:
+    """
+    Длительность видео в секундах. None если не видео или ошибка.
+    Берётся из общего media-probe (кеш по хешу) — тот же результат потом использует конвертер.
+    """
+    from converter.media_probe import probe_media
+
+    info = probe_media(file_path, source_hash)
+    return info['duration'] if info else None
+
+
+async def aget_video_duration_seconds(file_path: str, source_hash: str | None = None) -> float | None:
+    """get_video_duration_seconds для асинхронных views."""
+    from converter.media_probe import aprobe_media
+
+    info = await aprobe_media(file_path, source_hash)
+    return info['duration'] if info else None
+
+
+def get_image_pixels(file_path: str) -> int | None:
+    """
+    Число пикселей изображения по заголовку. None если не изображение.
+    Без Pillow: его загружают только процессы пула изображений, не веб-воркер.
+    """
+    from converter.image_probe import read_image_size
+
+    size = read_image_size(file_path)
+    return size[0] * size[1] if size else None
 
 
 def get_limits_for_request(request) -> dict:
@@ -59,6 +69,8 @@ def get_limits_for_request(request) -> dict:
         'conversions_per_day': limits.get('conversions_per_day', 3),
         'max_file_size_bytes': max_file_size_mb * 1024 * 1024,
         'max_video_seconds': max_video_seconds,
+        'video_profile': limits.get('video_profile', 'fast'),
+        'max_image_pixels': limits.get('max_image_megapixels', 50) * 1_000_000,
         'plan_code': plan.name.lower(),
     }
 
@@ -152,3 +164,18 @@ def check_limits(
             ), True
 
     return True, '', False
+
+
+def check_image_pixels(request, pixels: int) -> tuple[bool, str, bool]:
+    """
+    Бюджет пикселей изображения по тарифу (0 — без ограничения тарифом).
+    Проверяется всегда, в отличие от check_limits: это защита памяти сервера,
+    а не ограничение тарифа по количеству.
+    """
+    max_pixels = get_limits_for_request(request)['max_image_pixels']
+    if max_pixels and pixels > max_pixels:
+        return False, (
+            f'Изображение слишком большое: {pixels / 1_000_000:.0f} Мп. '
+            f'Максимум для вашего тарифа: {max_pixels // 1_000_000} Мп.'
+        ), True
+    return True, '', False
@@ -27,6 +27,7 @@
     const ERROR_TEXT = document.getElementById('errorText');
 
     let currentFile = null;
+    let batchFiles = [];
     let detectedFormat = null;
     let availableTargets = [];
     let convertedBlob = null;
@@ -67,6 +68,7 @@
 
     function resetState() {
         currentFile = null;
+        batchFiles = [];
         detectedFormat = null;
         availableTargets = [];
         convertedBlob = null;
@@ -100,7 +102,7 @@
         DROP_ZONE.classList.remove('drag-over');
         const files = e.dataTransfer?.files;
         if (files && files.length) {
-            handleFile(files[0]);
+            handleFiles(files);
         }
     }
 
@@ -116,8 +118,7 @@
     });
 
     FILE_INPUT.addEventListener('change', () => {
-        const file = FILE_INPUT.files[0];
-        if (file) handleFile(file);
+        if (FILE_INPUT.files.length) handleFiles(FILE_INPUT.files);
     });
 
     // ----- Detect format -----
@@ -131,7 +132,15 @@
         return data;
     }
 
-    // ----- Handle selected file -----
+    // ----- Handle selected files -----
+    function handleFiles(files) {
+        if (files.length > 1) {
+            handleBatch(Array.from(files));
+        } else {
+            handleFile(files[0]);
+        }
+    }
+
     async function handleFile(file) {
         resetState();
         currentFile = file;
@@ -147,7 +156,36 @@
 
         FILE_NAME.textContent = file.name;
         FILE_FORMAT.textContent = detectedFormat.toUpperCase();
+        fillTargets();
+    }
+
+    // Несколько файлов: общий целевой формат — пересечение доступных
+    async function handleBatch(files) {
+        resetState();
+
+        const detected = await Promise.all(files.map(f => detectFormat(f.name)));
+        if (detected.some(d => !d || !d.detected)) {
+            showError('Формат одного из файлов не поддерживается');
+            return;
+        }
+
+        availableTargets = detected
+            .map(d => d.targets || [])
+            .reduce((common, targets) => common.filter(t => targets.includes(t)));
+        if (!availableTargets.length) {
+            showError('Нет общего формата для выбранных файлов');
+            return;
+        }
+
+        batchFiles = files;
+        currentFile = files[0];
+        const formats = [...new Set(detected.map(d => d.detected.toUpperCase()))];
+        FILE_NAME.textContent = `Файлов: ${files.length}`;
+        FILE_FORMAT.textContent = formats.join(', ');
+        fillTargets();
+    }
 
+    function fillTargets() {
         TARGET_FORMAT.innerHTML = '<option value="">Выберите формат</option>';
         availableTargets.forEach(t => {
             const opt = document.createElement('option');
@@ -175,6 +213,273 @@
     // ----- Convert -----
     CONVERT_BTN.addEventListener('click', doConvert);
 
+    function finishConvert() {
+        hide(PROGRESS_WRAP);
+        CONVERT_BTN.classList.remove('loading');
+        CONVERT_BTN.disabled = false;
+    }
+
+    function handleErrorResponse(data) {
+        if (data && data.limit_exceeded) {
+            showLimitModal(data.error || 'Достигнут лимит');
+        } else {
+            showError((data && data.error) || 'Ошибка конвертации');
+        }
+    }
+
+    // ----- Job polling -----
+    const JOB_POLL_INTERVAL = 1000;
+    // Задача, которую нужно отменить, если пользователь закроет страницу
+    let activeJob = null;
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function showJobProgress(progress) {
+        // Первая половина полосы — загрузка, вторая — конвертация
+        if (typeof progress !== 'number') {
+            PROGRESS_TEXT.textContent = 'Конвертация...';
+            return;
+        }
+        const pct = Math.round(progress * 100);
+        PROGRESS_FILL.style.width = (50 + Math.round(progress * 50)) + '%';
+        PROGRESS_TEXT.textContent = `Конвертация ${pct}%`;
+    }
+
+    async function waitForJob(accepted) {
+        activeJob = accepted;
+        try {
+            while (true) {
+                const resp = await fetch(accepted.status_url);
+                const data = await resp.json();
+                if (!resp.ok || data.status === 'error' || data.status === 'cancelled') {
+                    throw data;
+                }
+                if (data.status === 'done') {
+                    return data;
+                }
+                showJobProgress(data.progress);
+                await sleep(JOB_POLL_INTERVAL);
+            }
+        } finally {
+            activeJob = null;
+        }
+    }
+
+    window.addEventListener('pagehide', () => {
+        if (!activeJob || !activeJob.cancel_url) return;
+        const data = new FormData();
+        data.append('csrfmiddlewaretoken', getCsrfToken());
+        navigator.sendBeacon(activeJob.cancel_url, data);
+    });
+
+    async function downloadJobResult(job, target) {
+        const resp = await fetch(job.download_url);
+        if (!resp.ok) {
+            throw await resp.json().catch(() => null);
+        }
+        const blob = await resp.blob();
+        const disp = resp.headers.get('Content-Disposition');
+        let fname = currentFile.name.replace(/\.(tar\.(gz|xz|zst)|[^.]+)$/i, '') + '.' + target;
+        if (disp) {
+            const m = disp.match(/filename="?([^";\n]+)"?/);
+            if (m) fname = m[1];
+        }
+        convertedBlob = blob;
+        convertedFileName = fname;
+    }
+
+    // ----- Resumable chunked upload -----
+    const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+    const CHUNK_PARALLEL = 4;
+    const CHUNK_MAX_RETRIES = 5;
+
+    function uploadStorageKey(file) {
+        return `upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    async function postForm(url, fields) {
+        const formData = new FormData();
+        Object.entries(fields).forEach(([k, v]) => formData.append(k, v));
+        const resp = await fetch(url, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': getCsrfToken() },
+            body: formData,
+        });
+        const data = await resp.json().catch(() => null);
+        if (!resp.ok) throw data;
+        return data;
+    }
+
+    async function sha256Hex(blob) {
+        // crypto.subtle есть только в secure context (https / localhost)
+        if (!window.crypto || !crypto.subtle) return null;
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Хеш всего файла — в Web Worker (static/sha256-worker.js): потоковый SHA-256
+    // сотен МБ в основном потоке подвешивал бы страницу. Без Worker — null
+    const SHA256_WORKER_URL = '/static/sha256-worker.js';
+
+    function sha256File(file) {
+        if (!window.Worker) return Promise.resolve(null);
+        return new Promise((resolve) => {
+            const worker = new Worker(SHA256_WORKER_URL);
+            const finish = (digest) => {
+                worker.terminate();
+                resolve(digest);
+            };
+            worker.onmessage = (event) => finish(event.data.digest || null);
+            worker.onerror = () => finish(null);
+            worker.postMessage(file);
+        });
+    }
+
+    // Продолжаем прерванную загрузку того же файла, если сервер её ещё помнит
+    async function startOrResumeUpload(file) {
+        const key = uploadStorageKey(file);
+        const savedId = localStorage.getItem(key);
+        if (savedId) {
+            const resp = await fetch(`/api/uploads/${savedId}/`);
+            if (resp.ok) return resp.json();
+            localStorage.removeItem(key);
+        }
+        const data = await postForm('/api/uploads/', { filename: file.name, size: file.size });
+        localStorage.setItem(key, data.upload_id);
+        return { ...data, received: [] };
+    }
+
+    async function putChunk(uploadId, index, blob) {
+        const headers = {
+            'X-CSRFToken': getCsrfToken(),
+            'Content-Type': 'application/octet-stream',
+        };
+        const digest = await sha256Hex(blob);
+        if (digest) headers['X-Chunk-SHA256'] = digest;
+
+        for (let attempt = 1; ; attempt++) {
+            const resp = await fetch(`/api/uploads/${uploadId}/chunks/${index}/`, {
+                method: 'PUT',
+                headers,
+                body: blob,
+            }).catch(() => null);
+            if (resp && resp.ok) return;
+            // 4xx — ошибка протокола, повтор не поможет
+            if (resp && resp.status >= 400 && resp.status < 500) {
+                throw await resp.json().catch(() => null);
+            }
+            if (attempt >= CHUNK_MAX_RETRIES) {
+                throw { error: 'Ошибка сети при загрузке' };
+            }
+            await sleep(1000 * attempt);
+        }
+    }
+
+    async function uploadChunked(file, target) {
+        const upload = await startOrResumeUpload(file);
+        // Хеш всего файла считается параллельно с отправкой частей; сервер сверит его
+        // с собранным файлом (части не перепутаны и не задвоены)
+        const fileDigest = sha256File(file).catch(() => null);
+        const received = new Set(upload.received);
+        const pending = [];
+        for (let i = 0; i < upload.total_chunks; i++) {
+            if (!received.has(i)) pending.push(i);
+        }
+
+        let uploadedBytes = file.size - pending.reduce((sum, i) =>
+            sum + Math.min(upload.chunk_size, file.size - i * upload.chunk_size), 0);
+        let failed = false;
+
+        async function worker() {
+            while (pending.length && !failed) {
+                const index = pending.shift();
+                const start = index * upload.chunk_size;
+                const blob = file.slice(start, Math.min(start + upload.chunk_size, file.size));
+                try {
+                    await putChunk(upload.upload_id, index, blob);
+                } catch (e) {
+                    failed = true;
+                    throw e;
+                }
+                uploadedBytes += blob.size;
+                const pct = Math.round((uploadedBytes / file.size) * 50);
+                PROGRESS_FILL.style.width = pct + '%';
+                PROGRESS_TEXT.textContent = `Загрузка ${pct}%`;
+            }
+        }
+
+        await Promise.all(Array.from({ length: CHUNK_PARALLEL }, worker));
+        const sha256 = await fileDigest;
+        const job = await postForm(
+            `/api/uploads/${upload.upload_id}/complete/`, sha256 ? { target, sha256 } : { target },
+        );
+        localStorage.removeItem(uploadStorageKey(file));
+        return job;
+    }
+
+    async function doChunkedConvert(target) {
+        try {
+            const accepted = await uploadChunked(currentFile, target);
+            PROGRESS_TEXT.textContent = 'Конвертация...';
+            const job = await waitForJob(accepted);
+            await downloadJobResult(job, target);
+            PROGRESS_FILL.style.width = '100%';
+            PROGRESS_TEXT.textContent = 'Готово!';
+            show(RESULT_WRAP);
+        } catch (data) {
+            handleErrorResponse(data);
+        } finally {
+            finishConvert();
+        }
+    }
+
+    function doBatchConvert(target) {
+        const formData = new FormData();
+        batchFiles.forEach(f => formData.append('files', f));
+        formData.append('target', target);
+        formData.append('csrfmiddlewaretoken', getCsrfToken());
+
+        const xhr = new XMLHttpRequest();
+
+        xhr.upload.addEventListener('progress', (e) => {
+            if (e.lengthComputable) {
+                const pct = Math.round((e.loaded / e.total) * 50);
+                PROGRESS_FILL.style.width = pct + '%';
+                PROGRESS_TEXT.textContent = `Загрузка ${pct}%`;
+            }
+        });
+
+        xhr.upload.addEventListener('load', () => {
+            PROGRESS_TEXT.textContent = 'Конвертация...';
+        });
+
+        xhr.addEventListener('load', async () => {
+            if (xhr.status >= 400) {
+                const data = await xhr.response.text().then(JSON.parse).catch(() => null);
+                handleErrorResponse(data);
+            } else {
+                convertedBlob = xhr.response;
+                convertedFileName = 'converted.zip';
+                PROGRESS_FILL.style.width = '100%';
+                PROGRESS_TEXT.textContent = 'Готово!';
+                show(RESULT_WRAP);
+            }
+            finishConvert();
+        });
+
+        xhr.addEventListener('error', () => {
+            showError('Ошибка сети');
+            finishConvert();
+        });
+
+        xhr.open('POST', '/api/convert/batch/');
+        xhr.setRequestHeader('X-CSRFToken', getCsrfToken());
+        xhr.responseType = 'blob';
+        xhr.send(formData);
+    }
+
     async function doConvert() {
         if (!currentFile || !TARGET_FORMAT.value) return;
 
@@ -185,9 +490,19 @@
         CONVERT_BTN.classList.add('loading');
         CONVERT_BTN.disabled = true;
 
+        if (batchFiles.length > 1) {
+            doBatchConvert(target);
+            return;
+        }
+        if (currentFile.size > CHUNKED_UPLOAD_THRESHOLD) {
+            doChunkedConvert(target);
+            return;
+        }
+
         const formData = new FormData();
         formData.append('file', currentFile);
         formData.append('target', target);
+        formData.append('mode', 'job');
         formData.append('csrfmiddlewaretoken', getCsrfToken());
 
         const xhr = new XMLHttpRequest();
@@ -200,69 +515,38 @@
             }
         });
 
-        xhr.addEventListener('load', () => {
-            PROGRESS_FILL.style.width = '100%';
-            PROGRESS_TEXT.textContent = 'Готово!';
+        xhr.upload.addEventListener('load', () => {
+            showJobProgress(null);
+        });
 
-            if (xhr.status >= 400) {
-                try {
-                    const text = new TextDecoder().decode(xhr.response);
-                    const data = JSON.parse(text);
-                    if (data.limit_exceeded) {
-                        showLimitModal(data.error || 'Достигнут лимит');
-                    } else {
-                        showError(data.error || 'Ошибка конвертации');
-                    }
-                } catch {
-                    showError('Ошибка конвертации');
-                }
-                hide(PROGRESS_WRAP);
-                CONVERT_BTN.classList.remove('loading');
-                CONVERT_BTN.disabled = false;
+        xhr.addEventListener('load', async () => {
+            if (xhr.status >= 400 || !xhr.response) {
+                handleErrorResponse(xhr.response);
+                finishConvert();
                 return;
             }
 
-            {
-                const blob = new Blob([xhr.response], { type: 'application/octet-stream' });
-                const disp = xhr.getResponseHeader('Content-Disposition');
-                let fname = currentFile.name.replace(/\.[^.]+$/, '') + '.' + target;
-                if (disp) {
-                    const m = disp.match(/filename="?([^";\n]+)"?/);
-                    if (m) fname = m[1];
-                }
-                convertedBlob = blob;
-                convertedFileName = fname;
+            try {
+                const job = await waitForJob(xhr.response);
+                await downloadJobResult(job, target);
+                PROGRESS_FILL.style.width = '100%';
+                PROGRESS_TEXT.textContent = 'Готово!';
                 show(RESULT_WRAP);
+            } catch (data) {
+                handleErrorResponse(data);
+            } finally {
+                finishConvert();
             }
-
-            hide(PROGRESS_WRAP);
-            CONVERT_BTN.classList.remove('loading');
-            CONVERT_BTN.disabled = false;
         });
 
         xhr.addEventListener('error', () => {
             showError('Ошибка сети');
-            hide(PROGRESS_WRAP);
-            CONVERT_BTN.classList.remove('loading');
-            CONVERT_BTN.disabled = false;
+            finishConvert();
         });
 
         xhr.open('POST', '/api/convert/');
         xhr.setRequestHeader('X-CSRFToken', getCsrfToken());
-        xhr.responseType = 'arraybuffer';
-
-        // Simulate conversion progress (50-95%) while waiting
-        let fakeProgress = 50;
-        const iv = setInterval(() => {
-            if (fakeProgress < 95) {
-                fakeProgress += 5;
-                PROGRESS_FILL.style.width = fakeProgress + '%';
-                PROGRESS_TEXT.textContent = 'Конвертация...';
-            }
-        }, 200);
-
-        xhr.onloadend = () => clearInterval(iv);
-
+        xhr.responseType = 'json';
         xhr.send(formData);
     }
 